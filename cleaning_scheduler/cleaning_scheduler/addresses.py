@@ -0,0 +1,104 @@
+"""
+Public address checks for the requests the scheduler sends.
+
+Webhook URLs are chosen by owners, so without checks an owner could make the
+delivery worker call the loopback interface, the private network or a cloud
+metadata service. ``validate_public_url`` refuses such URLs when an endpoint
+is saved. A name can resolve to another address by the time a batch is sent,
+so ``public_addresses`` checks every address at delivery, and the connection
+is made to an address it returned, never by resolving the name again.
+
+``WEBHOOK_ALLOW_PRIVATE_HOSTS`` turns the host checks off, for receivers on a
+development machine.
+"""
+import ipaddress
+import socket
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+
+SCHEMES = ['http', 'https']
+
+
+class UnsafeURLError(ValueError):
+    """A URL the scheduler must not send requests to."""
+
+
+def is_public(address):
+    """Whether the IP ``address`` belongs to the public internet."""
+    address = ipaddress.ip_address(address)
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def check_host(host):
+    """Raise ``UnsafeURLError`` when ``host`` names a local machine or is a non-public address."""
+    if settings.WEBHOOK_ALLOW_PRIVATE_HOSTS:
+        return
+    host = host.rstrip('.').lower()
+    if host == 'localhost' or host.endswith('.localhost'):
+        raise UnsafeURLError(f'{host} is a local host')
+    try:
+        public = is_public(host)
+    except ValueError:
+        # A name, checked once resolved
+        return
+    if not public:
+        raise UnsafeURLError(f'{host} is not a public address')
+
+
+def check_url(url):
+    """Raise ``UnsafeURLError`` unless ``url`` is an http(s) URL whose host may be public."""
+    parts = urlsplit(url)
+    if parts.scheme not in SCHEMES:
+        raise UnsafeURLError(f'{parts.scheme or "A missing"} scheme is not allowed')
+    if not parts.hostname:
+        raise UnsafeURLError('The URL has no host')
+    check_host(parts.hostname)
+
+
+def public_addresses(host, port):
+    """Addresses of ``host``, raising ``UnsafeURLError`` if any of them is not public.
+
+    A name resolving to both public and private addresses is refused as a
+    whole, as the one used can change between connections.
+    """
+    addresses = list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+    if not settings.WEBHOOK_ALLOW_PRIVATE_HOSTS:
+        for address in addresses:
+            if not is_public(address):
+                raise UnsafeURLError(f'{host} resolves to {address}, which is not a public address')
+    return addresses
+
+
+def create_public_connection(address, timeout, source_address=None):
+    """``socket.create_connection`` to one of the checked public addresses of ``address``'s host."""
+    host, port = address
+    error = None
+    for ip in public_addresses(host, port):
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as exc:
+            error = exc
+    raise error or OSError(f'{host} has no address')
+
+
+def validate_public_url(value):
+    """Model validator refusing URLs with another scheme than http(s), or naming a non-public host.
+
+    Names that do not resolve are accepted; they are checked again at every
+    delivery.
+    """
+    URLValidator(schemes=SCHEMES)(value)
+    try:
+        check_url(value)
+        host = urlsplit(value).hostname
+        try:
+            public_addresses(host, None)
+        except socket.gaierror:
+            pass
+    except UnsafeURLError as error:
+        raise ValidationError(str(error), code='unsafe_url')
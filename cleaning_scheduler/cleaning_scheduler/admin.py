@@ -1,11 +1,97 @@
-from django.conf import settings
-from django.contrib import admin
-from cleaning_scheduler.cleaning_scheduler.models import Apartment
+import json
+from datetime import timedelta
+from functools import cached_property
 
-if settings.DJANGO_ADMIN_FORCE_ALLAUTH:
-    # Force the `admin` sign in process to go through the `django-allauth` workflow:
-    # https://docs.allauth.org/en/latest/common/admin.html#admin
-    admin.site.login = decorators.login_required(admin.site.login)  # type: ignore[method-assign]
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, Q
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from cleaning_scheduler.cleaning_scheduler.models import (
+    Apartment, Booking, CleaningCrew, CleaningSchedule, RequestProfile, WebhookEndpoint,
+)
+from cleaning_scheduler.cleaning_scheduler.utils import request_reschedule
+from cleaning_scheduler.users.models import User
+
+# Below this many estimated rows the exact count is cheap enough
+EXACT_COUNT_LIMIT = 10000
+# Apartments matched by one admin search
+SEARCH_APARTMENT_LIMIT = 1000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator counting large results from planner estimates instead of ``COUNT(*)``.
+
+    Unfiltered lists use the table statistics in ``pg_class``, filtered ones
+    the row estimate of the query plan. Results estimated below
+    ``EXACT_COUNT_LIMIT`` rows are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            estimate = json.loads(queryset.explain(format='json'))[0]['Plan']['Plan Rows']
+        else:
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # reltuples is -1 until the table is first analyzed
+            estimate = row[0] if row else -1
+        if estimate < EXACT_COUNT_LIMIT:
+            return queryset.count()
+        return int(estimate)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Change list of a large booking table, searched by guest name or apartment name prefix."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_help_text = "Start of a guest or apartment name."
+    # Path from the listed model to its booking, None when listing bookings
+    booking_path = None
+    actions = ['reschedule_apartments']
+
+    def booking_lookup(self, lookup):
+        return f'{self.booking_path}__{lookup}' if self.booking_path else lookup
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        # Both prefixes are served by the functional upper(name) indexes; apartments are
+        # matched first, so the bookings are found with two index scans instead of a join
+        apartment_ids = list(Apartment.objects.filter(name__istartswith=search_term).values_list(
+            'id', flat=True)[:SEARCH_APARTMENT_LIMIT])
+        queryset = queryset.filter(
+            Q(**{self.booking_lookup('guest_name__istartswith'): search_term})
+            | Q(**{self.booking_lookup('apartment_id__in'): apartment_ids}))
+        return queryset, False
+
+    @admin.action(description="Re-run scheduling for the selected apartments")
+    def reschedule_apartments(self, request, queryset):
+        apartments = queryset.order_by().values_list(
+            self.booking_lookup('apartment__owner'), self.booking_lookup('apartment'),
+        ).annotate(Min(self.booking_lookup('check_in_date')), Max(self.booking_lookup('check_out_date')))
+        # Apartment ids and date range of each owner
+        ranges = {}
+        for owner_id, apartment_id, first_check_in, last_check_out in apartments:
+            ids, date_min, date_max = ranges.get(owner_id, ([], first_check_in, last_check_out))
+            ids.append(apartment_id)
+            ranges[owner_id] = (ids, min(date_min, first_check_in), max(date_max, last_check_out))
+        owners = User.objects.in_bulk(ranges)
+        for owner_id, (apartment_ids, date_min, date_max) in sorted(ranges.items()):
+            # The same margin as uploads, so the neighbouring windows are recomputed too
+            request_reschedule(owners[owner_id], date_min - timedelta(days=30), date_max + timedelta(days=30),
+                               sorted(apartment_ids))
+        count = sum(len(apartment_ids) for apartment_ids, _, _ in ranges.values())
+        self.message_user(request, f"Rescheduling requested for {count} apartments of {len(ranges)} owners.",
+                          messages.SUCCESS)
 
 
 @admin.register(Apartment)
@@ -23,3 +109,83 @@ class ApartmentAdmin(admin.ModelAdmin):
         ("Location Information", {"fields": ("location",)}),
         # Add more sections as needed
     )
+
+
+@admin.register(Booking)
+class BookingAdmin(LargeTableAdmin):
+    list_display = ['guest_name', 'apartment', 'owner', 'check_in_date', 'check_out_date']
+    list_select_related = ['apartment__owner']
+    date_hierarchy = 'check_in_date'
+    ordering = ['-check_in_date']
+    raw_id_fields = ['apartment']
+    search_fields = ['guest_name', 'apartment__name']
+
+    @admin.display(description="Owner")
+    def owner(self, obj):
+        return obj.apartment.owner
+
+
+@admin.register(CleaningSchedule)
+class CleaningScheduleAdmin(LargeTableAdmin):
+    list_display = ['booking', 'cleaning_date', 'window_start', 'window_end', 'crew', 'owner']
+    list_select_related = ['booking__apartment__owner', 'crew']
+    date_hierarchy = 'cleaning_date'
+    ordering = ['-cleaning_date']
+    raw_id_fields = ['booking', 'crew']
+    search_fields = ['booking__guest_name', 'booking__apartment__name']
+    booking_path = 'booking'
+
+    @admin.display(description="Owner")
+    def owner(self, obj):
+        return obj.booking.apartment.owner
+
+
+@admin.register(CleaningCrew)
+class CleaningCrewAdmin(admin.ModelAdmin):
+    list_display = ['name', 'owner', 'daily_capacity']
+    search_fields = ['name', 'owner__username']
+
+
+@admin.register(WebhookEndpoint)
+class WebhookEndpointAdmin(admin.ModelAdmin):
+    list_display = ['url', 'owner', 'active', 'max_concurrency', 'failures', 'retry_at']
+    list_filter = ['active']
+    search_fields = ['url', 'owner__username']
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = [
+        'created', 'method', 'path', 'status_code', 'mode', 'duration_ms', 'query_count', 'query_time_ms', 'user',
+    ]
+    list_filter = ['mode', 'method', 'status_code']
+    search_fields = ['path', 'user__username']
+    readonly_fields = ['created', 'user', 'method', 'path', 'status_code', 'mode', 'duration_ms', 'query_count',
+                       'query_time_ms', 'download', 'summary', 'sql_timeline']
+    exclude = ['data']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path('<int:profile_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='cleaning_scheduler_requestprofile_download'),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description="Profile file")
+    def download(self, obj):
+        url = reverse('admin:cleaning_scheduler_requestprofile_download', args=[obj.id])
+        return format_html('<a href="{}">{}</a>', url, obj.filename)
+
+    def download_view(self, request, profile_id):
+        profile = get_object_or_404(RequestProfile, id=profile_id)
+        if not self.has_view_permission(request, profile):
+            return HttpResponse(status=403)
+        response = HttpResponse(bytes(profile.data), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{profile.filename}"'
+        return response
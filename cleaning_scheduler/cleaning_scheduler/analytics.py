@@ -0,0 +1,154 @@
+"""
+Occupancy and cleaning-load analytics over a date range.
+
+``get_analytics`` loads the owner's stays overlapping the range and the
+cleanings inside it as int64 day numbers, with ``vectorized.load_arrays``,
+and computes every metric with ``bincount`` and ``cumsum`` over the arrays
+instead of per-booking loops:
+
+* per apartment: nights booked and occupancy, stays checking in, their
+  average length, check-outs (turnovers) and cleanings;
+* per day: apartments occupied that night, check-ins, check-outs and
+  cleanings, and the days with the most cleanings.
+
+A stay occupies the nights from its check-in day up to, but not including,
+its check-out day. Ranges reaching back before the latest archive run also
+read the archived stays and their cleanings, see ``archive``. Reports are
+cached per owner and range under the owner's data version, see
+``versions``, so they are rebuilt after any change.
+"""
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .archive import archived_through
+from .models import Apartment, ArchivedStay, Booking, CleaningSchedule
+from .vectorized import epoch, load_arrays
+from .versions import data_version
+
+# Days listed as peak cleaning days
+PEAK_DAYS = 5
+
+EPOCH = date(1970, 1, 1)
+DAY_US = 86_400_000_000
+
+Report = namedtuple('Report', ['start_date', 'end_date', 'apartments', 'days', 'peak_cleaning_days'])
+ApartmentStats = namedtuple('ApartmentStats', [
+    'id', 'name', 'booked_nights', 'occupancy', 'stays', 'average_stay_nights', 'turnovers', 'cleanings',
+])
+DayStats = namedtuple('DayStats', ['date', 'occupied', 'occupancy', 'check_ins', 'check_outs', 'cleanings'])
+PeakDay = namedtuple('PeakDay', ['date', 'cleanings'])
+
+
+def _cache_key(owner_id, version, start, end):
+    return f'analytics:{owner_id}:{version}:{start:%Y%m%d}:{end:%Y%m%d}'
+
+
+def day_number(day):
+    return (day - EPOCH).days
+
+
+def load_days(owner_id, start, end):
+    """The owner's apartments, and day numbers of their stays and cleanings from ``start`` up to ``end``.
+
+    Returns the ``(id, name)`` pairs of the apartments in id order,
+    ``(apartment_ids, check_ins, check_outs)`` of the stays with a night or
+    a check-out in the range and ``(apartment_ids, cleanings)`` of the
+    cleanings in it, all int64 arrays. Archived stays are included.
+    """
+    first, last = datetime.combine(start, time.min), datetime.combine(end, time.min)
+    # Always read the primary: a lagging replica would be cached under the current version
+    database = DEFAULT_DB_ALIAS
+    apartments = list(Apartment.objects.using(database).filter(owner_id=owner_id).order_by('id').values_list(
+        'id', 'name'))
+    bookings = Booking.objects.using(database).filter(
+        apartment__owner_id=owner_id, check_in_date__lt=last, check_out_date__gte=first)
+    stays = load_arrays(bookings, 'id', 'apartment_id', epoch('check_in_date'), epoch('check_out_date'))
+    cleanings = CleaningSchedule.objects.using(database).filter(
+        booking__apartment__owner_id=owner_id, cleaning_date__gte=first, cleaning_date__lt=last)
+    cleanings = load_arrays(cleanings, 'booking_id', 'booking__apartment_id', epoch('cleaning_date'))
+
+    # Read after the hot rows, as in archive.month_stays, so no stay archived meanwhile is missed
+    if first < archived_through(database):
+        archived = ArchivedStay.objects.using(database).filter(apartment__owner_id=owner_id)
+        archived_stays = load_arrays(archived.filter(check_in_date__lt=last, check_out_date__gte=first),
+                                     'id', 'apartment_id', epoch('check_in_date'), epoch('check_out_date'))
+        archived_cleanings = load_arrays(archived.filter(cleaning_date__gte=first, cleaning_date__lt=last),
+                                         'id', 'apartment_id', epoch('cleaning_date'))
+        # Rows of a chunk archived between the reads are in both; the hot copy is kept
+        stays = np.concatenate([stays, archived_stays[:, ~np.isin(archived_stays[0], stays[0])]], axis=1)
+        cleanings = np.concatenate(
+            [cleanings, archived_cleanings[:, ~np.isin(archived_cleanings[0], cleanings[0])]], axis=1)
+
+    _, booking_apartments, check_ins, check_outs = stays
+    _, cleaning_apartments, cleaning_dates = cleanings
+    return (apartments, (booking_apartments, check_ins // DAY_US, check_outs // DAY_US),
+            (cleaning_apartments, cleaning_dates // DAY_US))
+
+
+def compute_report(start, end, apartments, stays, cleanings):
+    """Report from ``start`` up to ``end`` of the apartments and day number arrays returned by ``load_days``."""
+    ids = np.array([apartment_id for apartment_id, _ in apartments], dtype=np.int64)
+    count, days = len(ids), (end - start).days
+    first = day_number(start)
+
+    stay_apartments, check_ins, check_outs = stays
+    stay_index = np.searchsorted(ids, stay_apartments)
+    # Nights inside the range, as offsets from its first day
+    night_start = np.clip(check_ins - first, 0, days)
+    night_end = np.clip(check_outs - first, 0, days)
+    nights = np.maximum(night_end - night_start, 0)
+    booked = np.bincount(stay_index, weights=nights, minlength=count)
+
+    # Occupied apartments per night: +1 on the first night, -1 after the last
+    changes = np.bincount(night_start, weights=nights > 0, minlength=days + 1) - np.bincount(
+        night_end, weights=nights > 0, minlength=days + 1)
+    occupied = np.cumsum(changes)[:days]
+
+    checking_in = (check_ins >= first) & (check_ins < first + days)
+    checking_out = (check_outs >= first) & (check_outs < first + days)
+    stay_counts = np.bincount(stay_index[checking_in], minlength=count)
+    stay_nights = np.bincount(stay_index[checking_in], weights=(check_outs - check_ins)[checking_in], minlength=count)
+    average_stay = np.divide(stay_nights, stay_counts, out=np.zeros(count), where=stay_counts > 0)
+    turnovers = np.bincount(stay_index[checking_out], minlength=count)
+    check_ins_per_day = np.bincount(check_ins[checking_in] - first, minlength=days)
+    check_outs_per_day = np.bincount(check_outs[checking_out] - first, minlength=days)
+
+    cleaning_apartments, cleaning_days = cleanings
+    cleanings_per_apartment = np.bincount(np.searchsorted(ids, cleaning_apartments), minlength=count)
+    cleanings_per_day = np.bincount(cleaning_days - first, minlength=days)
+    # Busiest days first, earlier days first among equals
+    peaks = np.argsort(-cleanings_per_day, kind='stable')[:PEAK_DAYS]
+    peaks = peaks[cleanings_per_day[peaks] > 0]
+
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    return Report(
+        start, end,
+        [ApartmentStats(apartment_id, name, *values) for (apartment_id, name), values in zip(apartments, zip(
+            booked.astype(int).tolist(), np.round(booked / days, 4).tolist(), stay_counts.tolist(),
+            np.round(average_stay, 2).tolist(), turnovers.tolist(), cleanings_per_apartment.tolist()))],
+        [DayStats(*values) for values in zip(
+            dates, occupied.astype(int).tolist(), np.round(occupied / max(count, 1), 4).tolist(),
+            check_ins_per_day.tolist(), check_outs_per_day.tolist(), cleanings_per_day.tolist())],
+        [PeakDay(dates[offset], int(cleanings_per_day[offset])) for offset in peaks.tolist()],
+    )
+
+
+def get_analytics(owner_id, start, end):
+    """Report of the owner's apartments from ``start`` up to, but not including, ``end``."""
+    key = _cache_key(owner_id, data_version(owner_id), start, end)
+    cached = cache.get(key)
+    if cached is not None:
+        apartments, days, peaks = cached
+        return Report(start, end, [ApartmentStats(*row) for row in apartments], [DayStats(*row) for row in days],
+                      [PeakDay(*row) for row in peaks])
+
+    report = compute_report(start, end, *load_days(owner_id, start, end))
+    # Plain tuples keep the cache entry independent of this module
+    cache.set(key, ([tuple(row) for row in report.apartments], [tuple(row) for row in report.days],
+                    [tuple(row) for row in report.peak_cleaning_days]), settings.ANALYTICS_CACHE_TIMEOUT)
+    return report
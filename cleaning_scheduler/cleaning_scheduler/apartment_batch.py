@@ -0,0 +1,107 @@
+"""
+Batch creation and update of an owner's apartments.
+
+``import_apartments`` takes rows of ``name``, ``location`` and ``size``, with
+an optional ``id``. A row with an id updates that apartment; a row without
+one updates the apartment of the same name, or creates it. Name uniqueness
+is checked for the whole batch against one locking query of the owner's
+apartments, instead of one query per row, and valid rows are written with a
+single ``bulk_create`` and ``bulk_update`` in one transaction.
+
+Invalid rows are reported and skipped; the others are still written. Bulk
+writes skip the Apartment signals, so the directory cache is invalidated
+and pages are notified here, once per batch.
+"""
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+
+from .directory import invalidate_directory
+from .live import BOOKINGS, notify
+from .log import get_logger
+from .models import Apartment
+
+logger = get_logger(__name__)
+
+CREATED = 'created'
+UPDATED = 'updated'
+INVALID = 'invalid'
+ROW_STATUSES = [CREATED, UPDATED, INVALID]
+
+APARTMENT_FIELDS = ['name', 'location', 'size']
+
+# Outcome of one input row, numbered from 1
+RowResult = namedtuple('RowResult', ['row', 'status', 'id', 'errors'])
+
+
+class ApartmentBatchError(Exception):
+    """A batch could not be written; the message is shown to the user."""
+
+
+def import_apartments(user, rows):
+    """Create or update the user's apartments from ``rows`` of validated fields, returning a RowResult per row.
+
+    ``rows`` holds ``(fields, errors)`` pairs; rows with errors are only
+    reported.
+    """
+    results = []
+    created, updated = [], []
+    with transaction.atomic():
+        # Locked in id order, as lock_apartments does, so concurrent batches and uploads wait for each other
+        existing = dict(Apartment.objects.select_for_update().filter(owner=user).order_by('id').values_list('id', 'name'))
+        ids_by_name = {name: apartment_id for apartment_id, name in existing.items()}
+        batch_names = set()
+        batch_ids = set()
+
+        for number, (fields, errors) in enumerate(rows, start=1):
+            if not errors:
+                apartment_id = fields.get('id') or ids_by_name.get(fields['name'])
+                errors = row_errors(fields, apartment_id, existing, ids_by_name, batch_names, batch_ids)
+            if errors:
+                results.append(RowResult(number, INVALID, fields.get('id'), errors))
+                continue
+            batch_names.add(fields['name'])
+            apartment = Apartment(owner=user, **{field: fields[field] for field in APARTMENT_FIELDS})
+            if apartment_id is None:
+                created.append(apartment)
+                results.append(RowResult(number, CREATED, None, {}))
+            else:
+                batch_ids.add(apartment_id)
+                apartment.id = apartment_id
+                updated.append(apartment)
+                results.append(RowResult(number, UPDATED, apartment_id, {}))
+
+        try:
+            with transaction.atomic():
+                Apartment.objects.bulk_create(created)
+                Apartment.objects.bulk_update(updated, APARTMENT_FIELDS)
+        except IntegrityError:
+            # Only an apartment created by a concurrent request can collide
+            raise ApartmentBatchError("Your apartments changed while importing. Please try again.")
+
+        if created or updated:
+            invalidate_directory(user.pk)
+            transaction.on_commit(lambda: invalidate_directory(user.pk))
+            notify(user.pk, BOOKINGS)
+
+    # Ids of created apartments are known once bulk_create returned
+    new_ids = iter(apartment.id for apartment in created)
+    results = [result._replace(id=next(new_ids)) if result.status == CREATED else result for result in results]
+    logger.info("Imported apartments of %s: %s created, %s updated, %s invalid", user, len(created), len(updated),
+                len(results) - len(created) - len(updated))
+    return results
+
+
+def row_errors(fields, apartment_id, existing, ids_by_name, batch_names, batch_ids):
+    """Errors of a row against the stored apartments and the rows before it."""
+    if apartment_id is not None and apartment_id not in existing:
+        return {'id': ["You have no apartment with this id."]}
+    if apartment_id in batch_ids:
+        return {'id': ["This apartment is already changed by another row."]}
+    if fields['name'] in batch_names:
+        return {'name': ["Another row has this name."]}
+    # Renaming onto another stored apartment is refused even if that one is renamed too,
+    # as the unique constraint is checked row by row during the update
+    if ids_by_name.get(fields['name'], apartment_id) != apartment_id:
+        return {'name': ["You already have an apartment with this name."]}
+    return {}
@@ -1,11 +1,14 @@
-from rest_framework import serializers
-from icalendar import Calendar
-from datetime import datetime, time
+import csv
+import io
+from datetime import date, timedelta
 
-from django.db import transaction
+from django.conf import settings
+from rest_framework import serializers
 
-from cleaning_scheduler.cleaning_scheduler.models import Apartment, Booking, CleaningSchedule
-from ..utils import validate_booking_dates
+from cleaning_scheduler.cleaning_scheduler.models import Apartment, Booking, CleaningSchedule, WebhookEndpoint
+from ..apartment_batch import APARTMENT_FIELDS, ROW_STATUSES, ApartmentBatchError, import_apartments
+from ..preview import ADDED, CANCELLED, RESCHEDULED, UPDATED, ProposedBooking, preview_calendar, preview_schedule
+from ..utils import BookingError, CalendarImportError, import_calendar, update_booking
 
 
 class ApartmentSerializer(serializers.ModelSerializer):
@@ -21,11 +24,82 @@ class ApartmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("You already have an apartment with this name.")
         return value
 
+class ApartmentRowSerializer(serializers.ModelSerializer):
+    """One row of an apartment batch; names are checked for the whole batch by import_apartments."""
+    id = serializers.IntegerField(required=False, allow_null=True, help_text="Apartment to update.")
+
+    class Meta:
+        model = Apartment
+        fields = ['id'] + APARTMENT_FIELDS
+
+class ApartmentBatchSerializer(serializers.Serializer):
+    apartments = serializers.ListField(child=serializers.DictField(), required=False,
+                                       help_text="Rows of id (optional), name, location and size.")
+    csv_file = serializers.FileField(required=False, write_only=True,
+                                     help_text="CSV with a header row of id (optional), name, location and size.")
+
+    def validate_csv_file(self, value):
+        if not value.name.endswith('.csv'):
+            raise serializers.ValidationError("Invalid file type. Only .csv files are supported.")
+        try:
+            return list(csv.DictReader(io.StringIO(value.read().decode('utf-8-sig'))))
+        except (UnicodeDecodeError, csv.Error):
+            raise serializers.ValidationError("The file is not a valid UTF-8 CSV file.")
+
+    def validate(self, data):
+        if ('apartments' in data) == ('csv_file' in data):
+            raise serializers.ValidationError("Send either apartments or csv_file.")
+        rows = data.get('apartments', data.get('csv_file'))
+        if len(rows) > settings.APARTMENT_BATCH_MAX_ROWS:
+            raise serializers.ValidationError(f"A batch holds at most {settings.APARTMENT_BATCH_MAX_ROWS} apartments.")
+        return {'rows': rows}
+
+    def create(self, validated_data):
+        rows = []
+        for row in validated_data['rows']:
+            # Empty CSV cells mean no id
+            row = ApartmentRowSerializer(data={key: value for key, value in row.items() if value not in ('', None)})
+            rows.append((row.validated_data, {}) if row.is_valid() else ({}, row.errors))
+        try:
+            return import_apartments(self.context['request'].user, rows)
+        except ApartmentBatchError as error:
+            raise serializers.ValidationError(str(error))
+
+class ApartmentRowResultSerializer(serializers.Serializer):
+    row = serializers.IntegerField(help_text="Position of the row, from 1.")
+    status = serializers.ChoiceField(choices=ROW_STATUSES)
+    id = serializers.IntegerField(allow_null=True)
+    errors = serializers.DictField()
+
 class BookingResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = ['check_in_date', 'check_out_date', 'guest_name', 'apartment']
 
+class BookingUpdateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Booking
+        fields = ['id', 'check_in_date', 'check_out_date', 'guest_name', 'apartment']
+        read_only_fields = ['id']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['apartment'].queryset = Apartment.objects.filter(owner=self.context['request'].user)
+
+    def validate(self, data):
+        check_in_date = data.get('check_in_date', self.instance.check_in_date)
+        if data.get('check_out_date', self.instance.check_out_date) < check_in_date:
+            raise serializers.ValidationError("check_out_date cannot be before check_in_date.")
+        return data
+
+    def update(self, instance, validated_data):
+        if 'apartment' in validated_data:
+            validated_data['apartment_id'] = validated_data.pop('apartment').id
+        try:
+            return update_booking(self.context['request'].user, instance.id, **validated_data)
+        except BookingError as error:
+            raise serializers.ValidationError(str(error))
+
 class BookingSerializer(serializers.Serializer):
     ics_file = serializers.FileField(write_only=True)
 
@@ -38,42 +112,10 @@ class BookingSerializer(serializers.Serializer):
         return value
 
     def create(self, validated_data):
-        ics_file = validated_data['ics_file']
-        cal = Calendar.from_ical(ics_file.read())
-        apartment_name = cal.get('prodid')
         try:
-            apartment = Apartment.objects.get(name=apartment_name, owner=self.context['request'].user)
-        except Apartment.DoesNotExist:
-            raise serializers.ValidationError(f'Apartment with name {apartment_name} does not exist')
-
-        new_bookings = []
-        with transaction.atomic():
-            for component in cal.walk():
-                if component.name == "VEVENT":
-                    dtstart = component.get('dtstart')
-                    dtend = component.get('dtend')
-                    summary = component.get('summary')
-                    if dtstart is None or dtend is None:
-                        raise serializers.ValidationError('Missing or invalid DTSTART or DTEND in one of the events in the calendar file')
-
-                    if not summary:
-                        raise serializers.ValidationError('Missing or invalid SUMMARY in one of the events in the calendar file')
-
-                    check_in_date = datetime.combine(dtstart.dt, time(15, 0))
-                    check_out_date = datetime.combine(dtend.dt, time(11, 0))
-
-                    error = validate_booking_dates(apartment, check_in_date, check_out_date)
-                    if error:
-                        raise serializers.ValidationError(error)
-
-                    new_booking = Booking.objects.create(
-                        check_in_date=check_in_date, 
-                        check_out_date=check_out_date, 
-                        guest_name=summary, 
-                        apartment=apartment
-                    )
-                    new_bookings.append(new_booking)
-        return new_bookings
+            return import_calendar(self.context['request'].user, validated_data['ics_file'].read())
+        except CalendarImportError as error:
+            raise serializers.ValidationError(str(error))
 
 class CleaningScheduleSerializer(serializers.ModelSerializer):
     apartment = serializers.ReadOnlyField(source='booking.apartment.id')
@@ -81,3 +123,159 @@ class CleaningScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = CleaningSchedule
         fields = ['id', 'apartment', 'cleaning_date']
+
+
+class DashboardRowSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    location = serializers.CharField()
+    current_guest = serializers.CharField(allow_null=True)
+    current_check_out = serializers.DateTimeField(allow_null=True)
+    next_guest = serializers.CharField(allow_null=True)
+    next_check_in = serializers.DateTimeField(allow_null=True)
+    next_cleaning = serializers.DateTimeField(allow_null=True)
+    booked_nights = serializers.IntegerField(help_text="Nights booked over the next 30 days.")
+    occupancy = serializers.FloatField(help_text="Share of the next 30 nights that are booked.")
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    start_date = serializers.DateField(help_text="First day of the report.")
+    end_date = serializers.DateField(help_text="Day after the last day of the report.")
+
+    def validate(self, data):
+        if data['end_date'] <= data['start_date']:
+            raise serializers.ValidationError("end_date must be after start_date.")
+        if (data['end_date'] - data['start_date']).days > settings.ANALYTICS_MAX_DAYS:
+            raise serializers.ValidationError(f"A report covers at most {settings.ANALYTICS_MAX_DAYS} days.")
+        return data
+
+class ApartmentStatsSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    booked_nights = serializers.IntegerField()
+    occupancy = serializers.FloatField(help_text="Share of the report's nights that are booked.")
+    stays = serializers.IntegerField(help_text="Stays checking in during the report.")
+    average_stay_nights = serializers.FloatField(help_text="Average length of those stays.")
+    turnovers = serializers.IntegerField(help_text="Check-outs during the report.")
+    cleanings = serializers.IntegerField()
+
+class DayStatsSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    occupied = serializers.IntegerField(help_text="Apartments booked that night.")
+    occupancy = serializers.FloatField()
+    check_ins = serializers.IntegerField()
+    check_outs = serializers.IntegerField()
+    cleanings = serializers.IntegerField()
+
+class PeakDaySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    cleanings = serializers.IntegerField()
+
+class AnalyticsReportSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    apartments = ApartmentStatsSerializer(many=True)
+    days = DayStatsSerializer(many=True)
+    peak_cleaning_days = PeakDaySerializer(many=True)
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    start_date = serializers.DateField(help_text="First night of the stay.")
+    end_date = serializers.DateField(help_text="Check-out day of the stay.")
+
+    def validate(self, data):
+        if data['end_date'] <= data['start_date']:
+            raise serializers.ValidationError("end_date must be after start_date.")
+        if data['start_date'] < date.today():
+            raise serializers.ValidationError("start_date cannot be in the past.")
+        if data['end_date'] > date.today() + timedelta(days=settings.AVAILABILITY_HORIZON_DAYS):
+            raise serializers.ValidationError(
+                f"end_date cannot be more than {settings.AVAILABILITY_HORIZON_DAYS} days ahead.")
+        return data
+
+class AvailableApartmentSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    location = serializers.CharField()
+
+
+class CalendarPreviewSerializer(BookingSerializer):
+    """ICS upload whose schedule changes are previewed instead of imported."""
+
+    def preview(self):
+        try:
+            return preview_calendar(self.context['request'].user, self.validated_data['ics_file'].read())
+        except CalendarImportError as error:
+            raise serializers.ValidationError(str(error))
+
+class BookingPreviewSerializer(serializers.Serializer):
+    booking = serializers.IntegerField(required=False, help_text="Booking to move or cancel; a new booking when omitted.")
+    apartment = serializers.IntegerField(required=False)
+    check_in_date = serializers.DateTimeField(required=False)
+    check_out_date = serializers.DateTimeField(required=False)
+    cancel = serializers.BooleanField(default=False, help_text="Preview cancelling the booking.")
+
+    def validate(self, data):
+        if data['cancel']:
+            if 'booking' not in data:
+                raise serializers.ValidationError("booking is required to cancel.")
+        elif not {'apartment', 'check_in_date', 'check_out_date'} <= data.keys():
+            raise serializers.ValidationError("apartment, check_in_date and check_out_date are required.")
+        return data
+
+    def preview(self):
+        data = self.validated_data
+        user = self.context['request'].user
+        try:
+            if data['cancel']:
+                return preview_schedule(user, cancelled=[data['booking']])
+            proposed = ProposedBooking(data['apartment'], data['check_in_date'], data['check_out_date'])
+            if 'booking' in data:
+                return preview_schedule(user, updated={data['booking']: proposed})
+            return preview_schedule(user, added=[proposed])
+        except CalendarImportError as error:
+            raise serializers.ValidationError(str(error))
+
+class ScheduleChangeSerializer(serializers.Serializer):
+    booking = serializers.IntegerField(source='booking_id', allow_null=True, help_text="None for new bookings.")
+    apartment = serializers.IntegerField(source='apartment_id')
+    check_in_date = serializers.DateTimeField()
+    check_out_date = serializers.DateTimeField()
+    status = serializers.ChoiceField(choices=[ADDED, UPDATED, CANCELLED, RESCHEDULED])
+    window_start = serializers.DateTimeField(allow_null=True)
+    window_end = serializers.DateTimeField(allow_null=True)
+    cleaning_date = serializers.DateTimeField(allow_null=True)
+    crew = serializers.IntegerField(source='crew_id', allow_null=True)
+    previous_window_start = serializers.DateTimeField(allow_null=True)
+    previous_window_end = serializers.DateTimeField(allow_null=True)
+    previous_cleaning_date = serializers.DateTimeField(allow_null=True)
+    previous_crew = serializers.IntegerField(source='previous_crew_id', allow_null=True)
+
+class ChangesQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, default=0,
+                                     help_text="Cursor of the previous response; 0 for a full snapshot.")
+
+class ChangeSetSerializer(serializers.Serializer):
+    cursor = serializers.IntegerField(help_text="Pass as since in the next request.")
+    reset = serializers.BooleanField(help_text="The answer is a full snapshot replacing the client's rows.")
+    more = serializers.BooleanField(help_text="More changes are waiting; request again right away.")
+    inserted = CleaningScheduleSerializer(many=True)
+    updated = CleaningScheduleSerializer(many=True)
+    removed = serializers.ListField(child=serializers.IntegerField())
+
+class WebhookEndpointSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WebhookEndpoint
+        fields = ['id', 'url', 'secret', 'active', 'max_concurrency', 'failures', 'retry_at']
+        read_only_fields = ['id', 'secret', 'failures', 'retry_at']
+
+    def validate_max_concurrency(self, value):
+        if not 1 <= value <= 10:
+            raise serializers.ValidationError("max_concurrency must be between 1 and 10.")
+        return value
+
+    def update(self, instance, validated_data):
+        if validated_data.get('active') and not instance.active:
+            # Reactivated endpoints start over
+            instance.failures, instance.retry_at = 0, None
+        return super().update(instance, validated_data)
@@ -1,12 +1,24 @@
+from django.db import transaction
 from django.urls import path
-from .views import ApartmentListCreateView, ApartmentDetailView, ApartmentUpdateView, ApartmentDeleteView, CalendarAPIView, CleaningScheduleAPIView
+from .views import ApartmentListCreateView, ApartmentBatchView, ApartmentDetailView, ApartmentUpdateView, ApartmentDeleteView, CalendarAPIView, BookingUpdateView, BookingCancelView, CleaningScheduleAPIView, CleaningScheduleChangesAPIView, AvailabilityAPIView, DashboardAPIView, AnalyticsAPIView, CalendarPreviewAPIView, BookingPreviewAPIView, WebhookEndpointListCreateView, WebhookEndpointDetailView
 
 urlpatterns = [
     path('apartments/', ApartmentListCreateView.as_view(), name='apartments_list_create'),
+    path('apartments/batch/', ApartmentBatchView.as_view(), name='apartments_batch'),
     path('apartments/<int:id>/', ApartmentDetailView.as_view(), name='apartment_detail'),
     path('apartments/<int:id>/update/', ApartmentUpdateView.as_view(), name='apartment_update'),
     path('apartments/<int:id>/delete/', ApartmentDeleteView.as_view(), name='apartment_delete'),
-    path('calendar/bookings/', CalendarAPIView.as_view(), name='calendar_bookings'),
+    path('calendar/bookings/', transaction.non_atomic_requests(CalendarAPIView.as_view()), name='calendar_bookings'),
+    path('calendar/bookings/<int:id>/update/', BookingUpdateView.as_view(), name='booking_update'),
+    path('calendar/bookings/<int:id>/cancel/', BookingCancelView.as_view(), name='booking_cancel'),
     path('calendar/cleaning/', CleaningScheduleAPIView.as_view(), name='calendar_cleaning'),
+    path('calendar/cleaning/changes/', CleaningScheduleChangesAPIView.as_view(), name='calendar_cleaning_changes'),
+    path('analytics/', AnalyticsAPIView.as_view(), name='analytics'),
+    path('dashboard/', DashboardAPIView.as_view(), name='dashboard'),
+    path('calendar/availability/', AvailabilityAPIView.as_view(), name='calendar_availability'),
+    path('calendar/preview/', CalendarPreviewAPIView.as_view(), name='calendar_preview'),
+    path('calendar/preview/booking/', BookingPreviewAPIView.as_view(), name='calendar_preview_booking'),
+    path('webhooks/', WebhookEndpointListCreateView.as_view(), name='webhooks_list_create'),
+    path('webhooks/<int:id>/', WebhookEndpointDetailView.as_view(), name='webhook_detail'),
 
 ]
@@ -5,13 +5,27 @@ from django.db.models import Q
 from django.utils.dateparse import parse_date
 
 
-from ..models import Apartment, Booking, CleaningSchedule
-from .serializers import ApartmentSerializer, BookingSerializer, BookingResponseSerializer, CleaningScheduleSerializer
-from ..utils import update_cleaning_schedule
-
-
-
-class ApartmentListCreateView(generics.ListCreateAPIView):
+from drf_spectacular.utils import extend_schema
+
+from ..analytics import get_analytics
+from ..availability import free_apartments
+from ..changelog import changes_since
+from ..dashboard import get_dashboard
+from ..directory import get_directory
+from ..models import Apartment, Booking, CleaningSchedule, WebhookEndpoint
+from ..routers import ReplicaReadMixin
+from ..utils import cancel_booking
+from .serializers import (
+    AnalyticsQuerySerializer, AnalyticsReportSerializer, ApartmentBatchSerializer, ApartmentRowResultSerializer,
+    ApartmentSerializer, AvailabilityQuerySerializer, AvailableApartmentSerializer, BookingPreviewSerializer,
+    BookingSerializer, BookingResponseSerializer, BookingUpdateSerializer, CalendarPreviewSerializer, ChangeSetSerializer,
+    ChangesQuerySerializer, CleaningScheduleSerializer, DashboardRowSerializer, ScheduleChangeSerializer,
+    WebhookEndpointSerializer,
+)
+
+
+
+class ApartmentListCreateView(ReplicaReadMixin, generics.ListCreateAPIView):
     queryset = Apartment.objects.all()
     serializer_class = ApartmentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -23,6 +37,18 @@ class ApartmentListCreateView(generics.ListCreateAPIView):
         serializer.save(owner=self.request.user)
 
 
+class ApartmentBatchView(generics.GenericAPIView):
+    """Create or update many apartments from a JSON list or a CSV file, with a result per row."""
+    serializer_class = ApartmentBatchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(responses=ApartmentRowResultSerializer(many=True))
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(ApartmentRowResultSerializer(serializer.save(), many=True).data)
+
+
 class ApartmentDetailView(generics.RetrieveAPIView):
     queryset = Apartment.objects.all()
     serializer_class = ApartmentSerializer
@@ -52,7 +78,7 @@ class ApartmentDeleteView(generics.DestroyAPIView):
     def get_queryset(self):
         return self.queryset.filter(owner=self.request.user)
 
-class CalendarAPIView(generics.ListCreateAPIView):
+class CalendarAPIView(ReplicaReadMixin, generics.ListCreateAPIView):
     serializer_class = BookingResponseSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -60,8 +86,6 @@ class CalendarAPIView(generics.ListCreateAPIView):
         serializer = BookingSerializer(data=request.data, context={'request': request})
         if serializer.is_valid(raise_exception=True):
             new_bookings = serializer.save()
-            if new_bookings:
-                update_cleaning_schedule(request.user, new_bookings)
             new_bookings_serializer = BookingResponseSerializer(new_bookings, many=True)
             return Response(new_bookings_serializer.data, status=status.HTTP_201_CREATED)
 
@@ -77,7 +101,31 @@ class CalendarAPIView(generics.ListCreateAPIView):
 
         return queryset
 
-class CleaningScheduleAPIView(generics.ListAPIView):
+class BookingUpdateView(generics.UpdateAPIView):
+    """Move a booking or change its guest; only the neighbouring cleaning windows are rescheduled."""
+    queryset = Booking.objects.all()
+    serializer_class = BookingUpdateSerializer
+    lookup_url_kwarg = 'id'
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(apartment__owner=self.request.user)
+
+
+class BookingCancelView(generics.DestroyAPIView):
+    """Cancel a booking; the previous stay's cleaning window is extended to the next check-in."""
+    queryset = Booking.objects.all()
+    serializer_class = BookingResponseSerializer
+    lookup_url_kwarg = 'id'
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(apartment__owner=self.request.user)
+
+    def perform_destroy(self, instance):
+        cancel_booking(self.request.user, instance.id)
+
+class CleaningScheduleAPIView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = CleaningScheduleSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -94,3 +142,95 @@ class CleaningScheduleAPIView(generics.ListAPIView):
             queryset = CleaningSchedule.objects.filter(booking__apartment__owner=self.request.user)
 
         return queryset
+
+
+class CleaningScheduleChangesAPIView(ReplicaReadMixin, generics.GenericAPIView):
+    """Cleaning entries inserted, updated and removed since the cursor of the previous request."""
+    serializer_class = ChangeSetSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(parameters=[ChangesQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        query = ChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(self.get_serializer(changes_since(request.user, query.validated_data['since'])).data)
+
+
+class DashboardAPIView(generics.GenericAPIView):
+    """Current and next stay, next cleaning and occupancy of each of the user's apartments."""
+    serializer_class = DashboardRowSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(responses=DashboardRowSerializer(many=True))
+    def get(self, request, *args, **kwargs):
+        return Response(self.get_serializer([row._asdict() for row in get_dashboard(request.user.pk)], many=True).data)
+
+
+class AnalyticsAPIView(generics.GenericAPIView):
+    """Occupancy, stays, turnovers and cleaning load of the user's apartments per apartment and per day."""
+    serializer_class = AnalyticsReportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(parameters=[AnalyticsQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        query = AnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        report = get_analytics(request.user.pk, query.validated_data['start_date'], query.validated_data['end_date'])
+        return Response(self.get_serializer(report).data)
+
+
+class AvailabilityAPIView(generics.GenericAPIView):
+    """Apartments of the user that are free for every night from start_date up to end_date."""
+    serializer_class = AvailableApartmentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(parameters=[AvailabilityQuerySerializer], responses=AvailableApartmentSerializer(many=True))
+    def get(self, request, *args, **kwargs):
+        query = AvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        directory = get_directory(request.user.pk)
+        free = free_apartments([entry.id for entry in directory], query.validated_data['start_date'],
+                               query.validated_data['end_date'])
+        serializer = self.get_serializer([directory.by_id[apartment_id]._asdict() for apartment_id in free], many=True)
+        return Response(serializer.data)
+
+
+class CalendarPreviewAPIView(generics.GenericAPIView):
+    """Schedule changes an ICS upload would cause, without importing it."""
+    serializer_class = CalendarPreviewSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(responses=ScheduleChangeSerializer(many=True))
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(ScheduleChangeSerializer(serializer.preview(), many=True).data)
+
+
+class BookingPreviewAPIView(CalendarPreviewAPIView):
+    """Schedule changes that adding, moving or cancelling one booking would cause, without saving it."""
+    serializer_class = BookingPreviewSerializer
+
+
+class WebhookEndpointListCreateView(generics.ListCreateAPIView):
+    """Webhook endpoints sent the user's cleaning schedule changes."""
+    queryset = WebhookEndpoint.objects.all()
+    serializer_class = WebhookEndpointSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+
+class WebhookEndpointDetailView(generics.RetrieveUpdateDestroyAPIView):
+    queryset = WebhookEndpoint.objects.all()
+    serializer_class = WebhookEndpointSerializer
+    lookup_url_kwarg = 'id'
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(owner=self.request.user)
+
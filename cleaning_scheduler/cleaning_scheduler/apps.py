@@ -5,5 +5,11 @@ class SchedulerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "cleaning_scheduler"
 
+    def ready(self):
+        # The app module is the outer package, so admin autodiscovery does not
+        # find the models' admin module on its own.
+        import cleaning_scheduler.cleaning_scheduler.admin  # noqa: F401
+        import cleaning_scheduler.cleaning_scheduler.signals  # noqa: F401
+
 
    
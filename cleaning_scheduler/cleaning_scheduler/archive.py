@@ -0,0 +1,113 @@
+"""
+Hot/cold archival of past stays.
+
+``archive_stays`` moves bookings whose cleaning window closed before a
+cutoff, together with their CleaningSchedule rows, into ArchivedStay, one
+chunk per transaction. Such stays can no longer change the schedule: new and
+moved bookings must start in the future, and a closed window only depends on
+the stay's own check-out and the next check-in, both before the cutoff. The
+hot tables and their indexes then only hold recent and future stays.
+
+The calendar pages read months with ``month_stays``, which adds archived
+stays to months starting before the latest cutoff, so archived months look
+as they did. A chunk can commit between the reads of the hot and archived
+rows, so readers take the hot rows first, then the cutoff, which is
+recorded before any chunk, then the archived rows, all from one database,
+and drop archived rows whose booking they already read.
+
+Archived rows are deleted without signals, so they are not reported as
+removed by delta sync, webhooks or live updates; clients keep them as
+history. Their change log entries are dropped with them.
+"""
+from datetime import datetime
+
+from django.db import connection, router, transaction
+from django.db.models import F, Max, Q
+
+from .log import get_logger
+from .models import ArchivedStay, ArchiveRun, Booking, ChangeLogEntry, CleaningSchedule
+
+logger = get_logger(__name__)
+
+# ArchivedStay fields and the Booking lookups they are copied from
+STAY_FIELDS = {
+    'id': 'id',
+    'apartment_id': 'apartment_id',
+    'guest_name': 'guest_name',
+    'check_in_date': 'check_in_date',
+    'check_out_date': 'check_out_date',
+    'cleaning_date': 'cleaningschedule__cleaning_date',
+    'window_start': 'cleaningschedule__window_start',
+    'window_end': 'cleaningschedule__window_end',
+    'crew_id': 'cleaningschedule__crew_id',
+}
+
+
+def archivable(cutoff):
+    """Bookings whose cleaning window closed before ``cutoff``."""
+    return Booking.objects.filter(check_out_date__lt=cutoff, cleaningschedule__window_end__lt=cutoff)
+
+
+def archive_chunk(cutoff, chunk_size):
+    """Move up to ``chunk_size`` archivable bookings into ArchivedStay, returning how many were moved."""
+    with transaction.atomic():
+        booking_ids = list(archivable(cutoff).select_for_update(of=('self',), skip_locked=True).order_by('id')
+                           .values_list('id', flat=True)[:chunk_size])
+        if not booking_ids:
+            return 0
+        stays = {}
+        schedule_ids = []
+        owners = set()
+        rows = Booking.objects.filter(id__in=booking_ids).order_by('id', 'cleaningschedule__id').values_list(
+            *STAY_FIELDS.values(), 'cleaningschedule__id', 'apartment__owner_id')
+        for *fields, schedule_id, owner_id in rows:
+            # Duplicate schedule rows left for the consistency check are dropped
+            stays.setdefault(fields[0], ArchivedStay(**dict(zip(STAY_FIELDS, fields))))
+            schedule_ids.append(schedule_id)
+            owners.add(owner_id)
+        ArchivedStay.objects.bulk_create(stays.values(), ignore_conflicts=True)
+
+        # Plain deletes: per-row delete signals would cost queries per booking and report history as removed
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {CleaningSchedule._meta.db_table} WHERE booking_id = ANY(%s)', [booking_ids])
+            cursor.execute(f'DELETE FROM {Booking._meta.db_table} WHERE id = ANY(%s)', [booking_ids])
+        ChangeLogEntry.objects.filter(owner_id__in=owners, entity=ChangeLogEntry.ENTITY_CLEANING,
+                                      entity_id__in=schedule_ids).delete()
+    return len(booking_ids)
+
+
+def archive_stays(cutoff, chunk_size=1000):
+    """Archive every booking whose cleaning window closed before ``cutoff``, returning the ArchiveRun."""
+    # Recorded first, so pages read the archive before the first chunk commits
+    run = ArchiveRun.objects.create(cutoff=cutoff)
+    while moved := archive_chunk(cutoff, chunk_size):
+        run.stays += moved
+        run.save(update_fields=['stays'])
+        logger.info("Archived %s stays before %s", run.stays, cutoff)
+    return run
+
+
+def archived_through(database=None):
+    """Cutoff of the latest archive run, ``datetime.min`` when nothing was archived."""
+    return ArchiveRun.objects.using(database).aggregate(cutoff=Max('cutoff'))['cutoff'] or datetime.min
+
+
+def month_stays(user, year, month):
+    """``(apartment_id, apartment_name, check_in_date, check_out_date, cleaning_date)`` of the user's stays in a month.
+
+    Stays starting or ending in the month are listed.
+    """
+    in_month = (Q(check_in_date__year=year, check_in_date__month=month)
+                | Q(check_out_date__year=year, check_out_date__month=month))
+    # One database for every read, as replicas may lag by different amounts
+    database = router.db_for_read(Booking)
+    stays = list(Booking.objects.using(database).filter(in_month, apartment__owner=user).annotate(
+        cleaning_date=F('cleaningschedule__cleaning_date')
+    ).values_list('id', 'apartment_id', 'apartment__name', 'check_in_date', 'check_out_date', 'cleaning_date'))
+    if datetime(year, month, 1) < archived_through(database):
+        # Stays of a chunk archived since the first read are already listed
+        hot = {stay[0] for stay in stays}
+        stays += [stay for stay in ArchivedStay.objects.using(database).filter(in_month, apartment__owner=user)
+                  .values_list('id', 'apartment_id', 'apartment__name', 'check_in_date', 'check_out_date',
+                               'cleaning_date') if stay[0] not in hot]
+    return [stay[1:] for stay in stays]
@@ -0,0 +1,103 @@
+"""
+Per-apartment occupancy bitsets for availability searches.
+
+Bit ``n`` of an apartment's bitset is set when the night starting ``n`` days
+after the bitset's base day is booked; a stay occupies the nights from its
+check-in day up to, but not including, its check-out day. Bitsets cover
+``AVAILABILITY_HORIZON_DAYS`` from the day they are built and are cached per
+apartment in the default cache, keyed by the apartment's generation. Booking
+signals replace the generation of the apartment they touch, once when the
+booking is written and again when it commits, and the next search rebuilds
+the bitset with one query for all the apartments that missed.
+
+A search reads the generations before it queries the bookings, so a bitset
+built from a read that raced a booking's commit is stored under the
+generation that commit replaced, where no later search looks. Generations are
+random for the same reason as the data versions in ``versions``.
+"""
+import uuid
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Booking
+
+Occupancy = namedtuple('Occupancy', ['base', 'end', 'bits'])
+
+
+def _cache_key(apartment_id, generation):
+    return f'availability:{apartment_id}:{generation}'
+
+
+def _generation_key(apartment_id):
+    return f'availability-generation:{apartment_id}'
+
+
+def generations(apartment_ids):
+    """Current occupancy generation of each of ``apartment_ids``."""
+    keys = {_generation_key(apartment_id): apartment_id for apartment_id in apartment_ids}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # Concurrent first readers agree on the generation one of them adds
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: generation for key, generation in found.items()}
+
+
+def night_mask(base, start, end):
+    """Bits of the nights from ``start`` up to ``end`` in a bitset starting on ``base``."""
+    nights = (end - start).days
+    return ((1 << nights) - 1) << (start - base).days if nights > 0 else 0
+
+
+def build_occupancy(apartment_ids, base):
+    """Occupancy bitsets of ``apartment_ids`` from ``base`` over the horizon, from the primary database."""
+    end = base + timedelta(days=settings.AVAILABILITY_HORIZON_DAYS)
+    bits = dict.fromkeys(apartment_ids, 0)
+    bookings = Booking.objects.using(DEFAULT_DB_ALIAS).filter(
+        apartment_id__in=apartment_ids,
+        check_out_date__gt=datetime.combine(base, time.min),
+        check_in_date__lt=datetime.combine(end, time.min),
+    ).values_list('apartment_id', 'check_in_date', 'check_out_date')
+    for apartment_id, check_in_date, check_out_date in bookings.iterator(chunk_size=2000):
+        bits[apartment_id] |= night_mask(base, max(check_in_date.date(), base), min(check_out_date.date(), end))
+    return {apartment_id: Occupancy(base, end, value) for apartment_id, value in bits.items()}
+
+
+def get_occupancy(apartment_ids, start, end):
+    """Occupancy bitsets of ``apartment_ids`` covering ``start``..``end``, rebuilding stale or missing ones."""
+    current = generations(apartment_ids)
+    keys = {_cache_key(apartment_id, current[apartment_id]): apartment_id for apartment_id in apartment_ids}
+    occupancy = {}
+    for key, value in cache.get_many(keys).items():
+        value = Occupancy(*value)
+        if value.base <= start and end <= value.end:
+            occupancy[keys[key]] = value
+
+    missing = [apartment_id for apartment_id in apartment_ids if apartment_id not in occupancy]
+    if missing:
+        built = build_occupancy(missing, date.today())
+        cache.set_many({
+            _cache_key(apartment_id, current[apartment_id]): tuple(value) for apartment_id, value in built.items()
+        }, settings.AVAILABILITY_CACHE_TIMEOUT)
+        occupancy.update(built)
+    return occupancy
+
+
+def free_apartments(apartment_ids, start, end):
+    """Ids of the apartments in ``apartment_ids`` with no booked night from ``start`` up to ``end``."""
+    occupancy = get_occupancy(apartment_ids, start, end)
+    return [
+        apartment_id for apartment_id in apartment_ids
+        if not occupancy[apartment_id].bits & night_mask(occupancy[apartment_id].base, start, end)
+    ]
+
+
+def invalidate_occupancy(apartment_id):
+    # Bitsets of older generations are never read again and expire with AVAILABILITY_CACHE_TIMEOUT
+    cache.set(_generation_key(apartment_id), uuid.uuid4().hex, None)
@@ -0,0 +1,36 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+
+from .metrics import CACHE_REQUESTS
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """Count cache hits and misses of ``get`` in Prometheus."""
+
+    metrics_backend = None
+
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, _MISSING, version=version, **kwargs)
+        if value is _MISSING:
+            CACHE_REQUESTS.labels(backend=self.metrics_backend, result='miss').inc()
+            return default
+        CACHE_REQUESTS.labels(backend=self.metrics_backend, result='hit').inc()
+        return value
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    metrics_backend = 'redis'
+
+    def get_many(self, keys, version=None, **kwargs):
+        # django-redis fetches all keys in one MGET instead of going through get().
+        keys = list(keys)
+        values = super().get_many(keys, version=version, **kwargs)
+        CACHE_REQUESTS.labels(backend=self.metrics_backend, result='hit').inc(len(values))
+        CACHE_REQUESTS.labels(backend=self.metrics_backend, result='miss').inc(len(keys) - len(values))
+        return values
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    metrics_backend = 'locmem'
@@ -0,0 +1,125 @@
+"""
+Capacity-aware cleaning assignment.
+
+Each booking must be cleaned on a day of its window, from the check-out day
+to the next check-in day. ``plan_cleanings`` walks the days in order and
+cleans, every day, as many of the released bookings as the owner's crews can
+take, earliest next check-in first (earliest deadline first, with a heap).
+Cleanings therefore happen as soon after check-out as capacity allows, which
+keeps the most slack before the next guest arrives. A booking that reaches
+its last possible day without a free slot is still cleaned that day and
+counted as overbooked.
+"""
+import heapq
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+from .changelog import UPDATE, record_changes
+from .log import get_logger
+from .models import CleaningCrew, CleaningSchedule
+
+logger = get_logger(__name__)
+
+
+def plan_cleanings(windows, crews, used=None):
+    """Assign a cleaning day and crew to every window.
+
+    ``windows`` are ``(booking_id, window_start, window_end)`` tuples, with
+    ``window_end`` None for open windows. ``crews`` are ``(crew_id,
+    daily_capacity)`` tuples; without crews capacity is unlimited. ``used``
+    maps days to cleanings already planned outside ``windows``. Returns
+    ``({booking_id: (cleaning_date, crew_id)}, overbooked)``.
+    """
+    used = used or {}
+    # Crews that take no cleanings count as no crews; with no capacity at all an
+    # open window would otherwise only be cleaned at its deadline, date.max
+    crews = [(crew_id, daily_capacity) for crew_id, daily_capacity in crews if daily_capacity > 0]
+    capacity = sum(daily_capacity for _, daily_capacity in crews)
+    # Crew of each slot of a day, in crew order
+    slots = [crew_id for crew_id, daily_capacity in crews for _ in range(daily_capacity)]
+
+    released = defaultdict(list)
+    for booking_id, start, end in windows:
+        released[start.date().toordinal()].append((date.max.toordinal() if end is None else end.date().toordinal(),
+                                                   booking_id, start))
+    release_days = sorted(released, reverse=True)
+
+    plan = {}
+    overbooked = 0
+    heap = []
+    while heap or release_days:
+        if not heap:
+            # Nothing is waiting, skip ahead to the next check-out
+            day = release_days[-1]
+        while release_days and release_days[-1] <= day:
+            for job in released.pop(release_days.pop()):
+                heapq.heappush(heap, job)
+
+        day_date = date.fromordinal(day)
+        taken = used.get(day_date, 0)
+        while heap and (not crews or taken < capacity or heap[0][0] <= day):
+            deadline, booking_id, start = heapq.heappop(heap)
+            if crews and taken >= capacity:
+                overbooked += 1
+            crew_id = (slots[taken] if taken < capacity else crews[taken % len(crews)][0]) if crews else None
+            plan[booking_id] = (datetime.combine(day_date, start.time()), crew_id)
+            taken += 1
+        day += 1
+
+    return plan, overbooked
+
+
+def assign_with_capacity(user, date_min, date_max):
+    """Plan the user's cleanings in a date range within crew capacity, returning the number of rows changed."""
+    schedules = CleaningSchedule.objects.filter(
+        Q(window_end__gte=date_min) | Q(window_end__isnull=True),
+        booking__apartment__owner=user,
+        window_start__lte=date_max,
+    ).values_list('booking_id', 'window_start', 'window_end')
+    windows = list(schedules)
+    if not windows:
+        return 0
+    crews, used = load_capacity(user, windows)
+    plan, overbooked = plan_cleanings(windows, crews, used)
+    if overbooked:
+        logger.warning("%s cleanings of user %s exceed crew capacity", overbooked, user)
+    return save_cleaning_plan(plan)
+
+
+def load_capacity(user, windows, exclude=()):
+    """The user's ``(crew_id, daily_capacity)`` crews and the cleanings already planned outside ``windows``.
+
+    Cleanings of the bookings in ``windows`` and ``exclude`` are not counted.
+    Returns the ``crews`` and ``used`` arguments of ``plan_cleanings``.
+    """
+    crews = list(CleaningCrew.objects.filter(owner=user).order_by('id').values_list('id', 'daily_capacity'))
+    if not crews or not windows:
+        return crews, {}
+
+    # Capacity already taken on these days by cleanings outside the planned windows
+    first_day = min(start for _, start, _ in windows)
+    last_day = max(end or start for _, start, end in windows)
+    used = dict(
+        CleaningSchedule.objects.filter(
+            booking__apartment__owner=user, cleaning_date__gte=first_day, cleaning_date__lte=last_day,
+        ).exclude(booking_id__in=[booking_id for booking_id, _, _ in windows] + list(exclude))
+        .annotate(day=TruncDate('cleaning_date')).values('day').annotate(count=Count('id')).values_list('day', 'count')
+    )
+    return crews, used
+
+
+def save_cleaning_plan(plan):
+    """Write ``{booking_id: (cleaning_date, crew_id)}``, returning the number of rows changed."""
+    changed = []
+    current = CleaningSchedule.objects.filter(booking_id__in=plan.keys()).only('id', 'booking_id', 'cleaning_date', 'crew_id')
+    for schedule in current:
+        cleaning_date, crew_id = plan[schedule.booking_id]
+        if (schedule.cleaning_date, schedule.crew_id) != (cleaning_date, crew_id):
+            schedule.cleaning_date, schedule.crew_id = cleaning_date, crew_id
+            changed.append(schedule)
+    CleaningSchedule.objects.bulk_update(changed, ['cleaning_date', 'crew'], batch_size=500)
+    record_changes(UPDATE, [schedule.id for schedule in changed])
+    return len(changed)
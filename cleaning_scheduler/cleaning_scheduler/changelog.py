@@ -0,0 +1,163 @@
+"""
+Change log of cleaning schedules, read by delta sync.
+
+Every write to a CleaningSchedule row is recorded as a ChangeLogEntry of the
+row's owner. ``changes_since`` returns the rows inserted, updated and removed
+after a client's cursor, the id of the last entry it has seen, so a client
+stays in sync with one small request.
+
+Entry ids come from a sequence and are allocated before commit, so an entry
+could become visible below an id a client has already read. Entries are
+therefore written under the owner's schedule lock, which is held until
+commit: an owner's entries become visible in id order. The scheduler takes
+that lock only after its apartment locks, so writes made while apartments
+are still being locked are buffered with ``deferred_changes`` and logged at
+the end of the block.
+
+Entries also fill the webhook outbox, see ``webhooks``, and notify the
+owner's open calendar pages, see ``live``.
+
+``compact_change_log`` keeps only the latest entry of each row and drops
+removals older than ``CHANGE_LOG_RETENTION_DAYS``. Clients whose cursor is
+below a dropped removal get a full snapshot instead.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+
+from .live import CLEANING, notify
+from .models import ChangeLogCompaction, ChangeLogEntry, CleaningSchedule
+from .webhooks import enqueue_events
+
+INSERT = ChangeLogEntry.OPERATION_INSERT
+UPDATE = ChangeLogEntry.OPERATION_UPDATE
+DELETE = ChangeLogEntry.OPERATION_DELETE
+
+# Answer of changes_since; inserted and updated are CleaningSchedule rows, removed their ids
+ChangeSet = namedtuple('ChangeSet', ['cursor', 'reset', 'more', 'inserted', 'updated', 'removed'])
+
+# (operation, schedule_ids, owner_id) buffered by deferred_changes
+_deferred = ContextVar('deferred_changes', default=None)
+
+
+def record_changes(operation, schedule_ids, owner_id=None):
+    """Log ``operation`` on CleaningSchedule rows and take the schedule lock of their owners.
+
+    The owners are looked up from the rows unless ``owner_id`` is given,
+    which deleted rows need.
+    """
+    schedule_ids = list(schedule_ids)
+    if not schedule_ids:
+        return
+    deferred = _deferred.get()
+    if deferred is not None:
+        deferred.append((operation, schedule_ids, owner_id))
+        return
+    write_entries([(operation, schedule_ids, owner_id)])
+
+
+@contextmanager
+def deferred_changes():
+    """Buffer ``record_changes`` calls until the block exits, then log them.
+
+    Nested blocks log with the outermost one. Nothing is logged when the
+    block raises, as its transaction is rolled back.
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+    buffer = []
+    token = _deferred.set(buffer)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    write_entries(buffer)
+
+
+def write_entries(changes):
+    """Create the ChangeLogEntry rows of ``(operation, schedule_ids, owner_id)`` changes, in order."""
+    from .utils import lock_owner_schedule
+
+    lookup = [schedule_id for _, schedule_ids, owner_id in changes if owner_id is None for schedule_id in schedule_ids]
+    owners = dict(CleaningSchedule.objects.filter(id__in=lookup).values_list('id', 'booking__apartment__owner_id'))
+    entries = []
+    for operation, schedule_ids, owner_id in changes:
+        for schedule_id in schedule_ids:
+            # Rows inserted and deleted in the same block are only logged as deleted
+            entry_owner = owner_id or owners.get(schedule_id)
+            if entry_owner is not None:
+                entries.append(ChangeLogEntry(owner_id=entry_owner, entity_id=schedule_id, operation=operation))
+    if not entries:
+        return
+    for owner_id in sorted({entry.owner_id for entry in entries}):
+        lock_owner_schedule(owner_id)
+    ChangeLogEntry.objects.bulk_create(entries, batch_size=500)
+    enqueue_events(entries)
+    for owner_id in {entry.owner_id for entry in entries}:
+        notify(owner_id, CLEANING)
+
+
+def changes_since(owner, since, limit=None):
+    """The owner's cleaning schedule changes after the ``since`` cursor, as a ChangeSet.
+
+    At most ``limit`` entries (``CHANGE_LOG_PAGE_SIZE`` by default) are read;
+    ``more`` tells whether newer ones are left. Rows changed several times
+    are returned once, in their current state. A cursor of 0, or one below
+    the compacted entries, gets every row of the owner with ``reset`` set.
+    """
+    limit = limit or settings.CHANGE_LOG_PAGE_SIZE
+    floor = ChangeLogCompaction.objects.aggregate(floor=Max('compacted_through'))['floor'] or 0
+    entries = ChangeLogEntry.objects.filter(owner=owner)
+    schedules = CleaningSchedule.objects.filter(booking__apartment__owner=owner).select_related(
+        'booking__apartment').order_by('id')
+    if since <= 0 or since < floor:
+        # The cursor is read first, so changes made meanwhile are sent again rather than missed
+        cursor = max(entries.aggregate(cursor=Max('id'))['cursor'] or 0, floor)
+        return ChangeSet(cursor, True, False, list(schedules), [], [])
+
+    page = list(entries.filter(id__gt=since).order_by('id').values_list('id', 'entity_id', 'operation')[:limit + 1])
+    more = len(page) > limit
+    page = page[:limit]
+    if not page:
+        return ChangeSet(since, False, False, [], [], [])
+    inserted_ids = {entity_id for _, entity_id, operation in page if operation == INSERT}
+    touched = {entity_id for _, entity_id, _ in page}
+    rows = list(schedules.filter(id__in=touched))
+    return ChangeSet(
+        page[-1][0], False, more,
+        [row for row in rows if row.id in inserted_ids],
+        [row for row in rows if row.id not in inserted_ids],
+        sorted(touched - {row.id for row in rows}),
+    )
+
+
+def compact_change_log(retention=None):
+    """Drop superseded entries and removals older than ``retention``, returning the number of entries dropped.
+
+    ``retention`` defaults to ``CHANGE_LOG_RETENTION_DAYS``. An entry is
+    superseded once a later entry of the same row exists; the latest entry
+    of a row whose insert is dropped becomes the insert, so clients behind
+    it still see the row as new.
+    """
+    if retention is None:
+        retention = timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS)
+    same_row = {'owner_id': OuterRef('owner_id'), 'entity': OuterRef('entity'), 'entity_id': OuterRef('entity_id')}
+    later = ChangeLogEntry.objects.filter(id__gt=OuterRef('id'), **same_row)
+    earlier_insert = ChangeLogEntry.objects.filter(id__lt=OuterRef('id'), operation=INSERT, **same_row)
+    with transaction.atomic():
+        ChangeLogEntry.objects.filter(~Exists(later), Exists(earlier_insert), operation=UPDATE).update(operation=INSERT)
+        dropped, _ = ChangeLogEntry.objects.filter(Exists(later)).delete()
+
+        expired = ChangeLogEntry.objects.filter(operation=DELETE, created__lt=datetime.now() - retention)
+        through = expired.aggregate(through=Max('id'))['through']
+        if through is not None:
+            ChangeLogCompaction.objects.create(compacted_through=through)
+            removed, _ = expired.filter(id__lte=through).delete()
+            dropped += removed
+    return dropped
@@ -0,0 +1,68 @@
+"""
+Minimum-trip cleaning days.
+
+Cleaning windows are treated as intervals of days, from the check-out day
+to the next check-in day. ``stab_windows`` picks the fewest days such that
+every window contains one of them, with the classic greedy: sorted by last
+day, each window not yet covered adds its own last day. Every cleaning
+therefore lands inside its own window, and bookings sharing a day are
+cleaned in one visit. Windows can be grouped by apartment location so each
+building gets its own set of visits.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.db.models import Q
+
+from .models import CleaningSchedule
+
+
+def stab_windows(windows):
+    """Fewest cleaning days hitting every window.
+
+    ``windows`` are ``(booking_id, window_start, window_end)`` tuples, with
+    ``window_end`` None for open windows. Returns ``{booking_id:
+    cleaning_date}``, each cleaning at the check-out time on its day.
+    """
+    closed = sorted(
+        ((end.date().toordinal(), start.date().toordinal(), booking_id, start)
+         for booking_id, start, end in windows if end is not None),
+        key=lambda window: window[0],
+    )
+    open_windows = [(start.date().toordinal(), booking_id, start) for booking_id, start, end in windows if end is None]
+
+    days = {}
+    day = None
+    for last_day, first_day, booking_id, start in closed:
+        if day is None or first_day > day:
+            day = last_day
+        days[booking_id] = (day, start)
+
+    # Open windows end after every closed one; the last visit covers those
+    # starting before it, the rest share one visit on the latest check-out.
+    tail_day = max((first_day for first_day, _, _ in open_windows if day is None or first_day > day), default=None)
+    for first_day, booking_id, start in open_windows:
+        days[booking_id] = (day if day is not None and first_day <= day else tail_day, start)
+
+    return {
+        booking_id: datetime.combine(date.fromordinal(day), start.time())
+        for booking_id, (day, start) in days.items()
+    }
+
+
+def assign_clustered(user, date_min, date_max, by_location=False):
+    """Minimum-trip cleaning dates of the user's windows in a date range, as ``{booking_id: cleaning_date}``."""
+    schedules = CleaningSchedule.objects.filter(
+        Q(window_end__gte=date_min) | Q(window_end__isnull=True),
+        booking__apartment__owner=user,
+        window_start__lte=date_max,
+    ).values_list('booking__apartment__location', 'booking_id', 'window_start', 'window_end')
+
+    groups = defaultdict(list)
+    for location, booking_id, start, end in schedules:
+        groups[location if by_location else None].append((booking_id, start, end))
+
+    cleaning_dates = {}
+    for windows in groups.values():
+        cleaning_dates.update(stab_windows(windows))
+    return cleaning_dates
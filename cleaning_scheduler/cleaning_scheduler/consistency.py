@@ -0,0 +1,160 @@
+"""
+Consistency checks between bookings and their CleaningSchedule rows.
+
+For every apartment the expected windows are recomputed in memory from its
+bookings, sorted by check-out, and hashed. The database hashes the stored
+rows of the same apartments in one aggregate query, so only apartments whose
+digests differ have their schedule rows loaded and compared row by row.
+"""
+import hashlib
+import math
+from collections import Counter
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.db import transaction
+from django.db.models import BigIntegerField, CharField, Value
+from django.db.models.functions import MD5, Cast, Coalesce, Concat, Extract, Floor
+
+from .changelog import DELETE, INSERT, UPDATE, record_changes
+from .log import get_logger
+from .models import Apartment, Booking, CleaningSchedule
+from .utils import compute_cleaning_windows, lock_apartments, reassign_cleaning_dates
+
+logger = get_logger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch_text(value):
+    return '-' if value is None else str(math.floor((value - EPOCH).total_seconds()))
+
+
+def _epoch_text_sql(field):
+    epoch = Cast(Floor(Extract(field, 'epoch')), output_field=BigIntegerField())
+    return Coalesce(Cast(epoch, output_field=CharField()), Value('-'))
+
+
+def window_digest(windows):
+    """Digest of ``{booking_id: (window_start, window_end)}``, as computed by ``stored_digests``."""
+    text = ';'.join(
+        f"{booking_id}:{_epoch_text(start)}:{_epoch_text(end)}" for booking_id, (start, end) in sorted(windows.items())
+    )
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def stored_digests(apartment_ids):
+    """Digest of the stored schedule rows of each apartment, computed by the database."""
+    row_text = Concat(
+        Cast('booking_id', output_field=CharField()), Value(':'),
+        _epoch_text_sql('window_start'), Value(':'),
+        _epoch_text_sql('window_end'),
+        output_field=CharField(),
+    )
+    digests = CleaningSchedule.objects.filter(booking__apartment_id__in=apartment_ids).values(
+        'booking__apartment_id').annotate(digest=MD5(StringAgg(row_text, delimiter=';', ordering=('booking_id', 'id'))))
+    return {row['booking__apartment_id']: row['digest'] for row in digests}
+
+
+class ConsistencyReport:
+    """Differences between expected and stored cleaning windows."""
+
+    def __init__(self):
+        self.counts = Counter()
+        # ids of the apartments whose stored windows differ
+        self.apartments = []
+        # booking id -> expected window, for bookings without a schedule row
+        self.missing = {}
+        # schedule id -> expected window, for rows with a stale window
+        self.mismatched = {}
+        # ids of extra schedule rows of bookings that have more than one
+        self.duplicates = []
+        # owner id -> (earliest, latest) affected time, to reassign cleaning dates
+        self.owner_spans = {}
+
+    def __bool__(self):
+        return bool(self.missing or self.mismatched or self.duplicates)
+
+    def add_span(self, owner_id, window):
+        start, end = window
+        end = end or start
+        earliest, latest = self.owner_spans.get(owner_id, (start, end))
+        self.owner_spans[owner_id] = (min(earliest, start), max(latest, end))
+
+
+def check_apartments(apartment_ids):
+    """Compare the stored windows of ``apartment_ids`` with windows recomputed from bookings."""
+    report = ConsistencyReport()
+    bookings = Booking.objects.filter(apartment_id__in=apartment_ids).order_by(
+        'apartment_id', 'check_out_date').values_list('id', 'apartment_id', 'check_in_date', 'check_out_date')
+    expected = {
+        apartment_id: compute_cleaning_windows(rows)
+        for apartment_id, rows in groupby(bookings.iterator(chunk_size=2000), key=itemgetter(1))
+    }
+    stored = stored_digests(apartment_ids)
+    report.counts['apartments'] = len(apartment_ids)
+    report.counts['bookings'] = sum(len(windows) for windows in expected.values())
+
+    dirty = [
+        apartment_id for apartment_id in apartment_ids
+        if stored.get(apartment_id) != (window_digest(expected[apartment_id]) if apartment_id in expected else None)
+    ]
+    if not dirty:
+        return report
+    report.apartments = dirty
+    report.counts['inconsistent_apartments'] = len(dirty)
+
+    owners = dict(Apartment.objects.filter(id__in=dirty).values_list('id', 'owner_id'))
+    windows = {booking_id: window for apartment_id in dirty for booking_id, window in expected.get(apartment_id, {}).items()}
+    booking_owners = {
+        booking_id: owners[apartment_id] for apartment_id in dirty for booking_id in expected.get(apartment_id, {})
+    }
+    seen = set()
+    rows = CleaningSchedule.objects.filter(booking__apartment_id__in=dirty).order_by('booking_id', 'id').values_list(
+        'id', 'booking_id', 'window_start', 'window_end')
+    for schedule_id, booking_id, window_start, window_end in rows:
+        if booking_id in seen:
+            report.duplicates.append(schedule_id)
+            continue
+        seen.add(booking_id)
+        if (window_start, window_end) != windows[booking_id]:
+            report.mismatched[schedule_id] = windows[booking_id]
+            report.add_span(booking_owners[booking_id], windows[booking_id])
+    for booking_id, window in windows.items():
+        if booking_id not in seen:
+            report.missing[booking_id] = window
+            report.add_span(booking_owners[booking_id], window)
+
+    report.counts['missing'] = len(report.missing)
+    report.counts['mismatched'] = len(report.mismatched)
+    report.counts['duplicates'] = len(report.duplicates)
+    logger.info("Checked %s apartments, %s inconsistent", len(apartment_ids), len(dirty))
+    return report
+
+
+def repair(report):
+    """Fix the rows listed in ``report`` in bulk and reassign the affected cleaning dates."""
+    with transaction.atomic():
+        lock_apartments(report.apartments)
+        created = CleaningSchedule.objects.bulk_create([
+            CleaningSchedule(booking_id=booking_id, window_start=start, window_end=end)
+            for booking_id, (start, end) in report.missing.items()
+        ], batch_size=500)
+        CleaningSchedule.objects.bulk_update([
+            CleaningSchedule(id=schedule_id, window_start=start, window_end=end)
+            for schedule_id, (start, end) in report.mismatched.items()
+        ], ['window_start', 'window_end'], batch_size=500)
+        record_changes(INSERT, [schedule.id for schedule in created])
+        record_changes(UPDATE, report.mismatched.keys())
+        # Logged while the rows still exist to look up their owners
+        record_changes(DELETE, report.duplicates)
+        CleaningSchedule.objects.filter(id__in=report.duplicates).delete()
+
+        cleaning_dates_updated = 0
+        owners = get_user_model().objects.in_bulk(report.owner_spans.keys())
+        for owner_id, (date_min, date_max) in report.owner_spans.items():
+            cleaning_dates_updated += reassign_cleaning_dates(owners[owner_id], date_min, date_max)
+    return cleaning_dates_updated
@@ -0,0 +1,91 @@
+"""
+Portfolio dashboard of an owner's apartments.
+
+For every apartment, ``build_dashboard`` reads the current and next stay, the
+next cleaning and the nights booked over the next ``OCCUPANCY_DAYS`` in a
+single query, with one correlated subquery per value. The booking
+subqueries are served by the ``(apartment, check_in_date)`` and
+``(apartment, check_out_date)`` indexes.
+
+``get_dashboard`` caches the rows under the owner's data version, so any
+change to the owner's data is seen on the next request. A cached dashboard
+also stops being valid once time moves past the first check-in, check-out
+or cleaning it shows, or past midnight, when the occupancy window moves.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DurationField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Greatest, Least, TruncDate
+
+from .models import Apartment, Booking, CleaningSchedule
+from .versions import data_version
+
+# Days ahead the occupancy is computed over, from today
+OCCUPANCY_DAYS = 30
+
+DashboardRow = namedtuple('DashboardRow', [
+    'id', 'name', 'location', 'current_guest', 'current_check_out', 'next_guest', 'next_check_in', 'next_cleaning',
+    'booked_nights', 'occupancy',
+])
+
+
+def _cache_key(owner_id, version):
+    return f'dashboard:{owner_id}:{version}'
+
+
+def build_dashboard(owner_id, now):
+    """Dashboard rows of the owner's apartments at ``now``, in id order."""
+    today = now.date()
+    end = today + timedelta(days=OCCUPANCY_DAYS)
+    stays = Booking.objects.filter(apartment=OuterRef('pk'))
+    current = stays.filter(check_in_date__lte=now, check_out_date__gt=now).order_by('check_in_date')
+    upcoming = stays.filter(check_in_date__gt=now).order_by('check_in_date')
+    # A stay occupies the nights from its check-in day up to, but not including, its check-out day
+    booked = stays.filter(check_in_date__lt=datetime.combine(end, time.min),
+                          check_out_date__gte=datetime.combine(today + timedelta(days=1), time.min)).annotate(
+        nights=Least(TruncDate('check_out_date'), Value(end)) - Greatest(TruncDate('check_in_date'), Value(today)),
+    ).values('apartment').annotate(total=Sum('nights', output_field=DurationField())).values('total')
+    cleanings = CleaningSchedule.objects.filter(booking__apartment=OuterRef('pk'), cleaning_date__gte=now).order_by(
+        'cleaning_date')
+
+    # Always read the primary: a lagging replica would be cached under the current version
+    rows = Apartment.objects.using(DEFAULT_DB_ALIAS).filter(owner_id=owner_id).order_by('id').annotate(
+        current_guest=Subquery(current.values('guest_name')[:1]),
+        current_check_out=Subquery(current.values('check_out_date')[:1]),
+        next_guest=Subquery(upcoming.values('guest_name')[:1]),
+        next_check_in=Subquery(upcoming.values('check_in_date')[:1]),
+        next_cleaning=Subquery(cleanings.values('cleaning_date')[:1]),
+        booked=Subquery(booked, output_field=DurationField()),
+    ).values_list('id', 'name', 'location', 'current_guest', 'current_check_out', 'next_guest', 'next_check_in',
+                  'next_cleaning', 'booked')
+    dashboard = []
+    for *fields, booked_nights in rows:
+        nights = booked_nights.days if booked_nights else 0
+        dashboard.append(DashboardRow(*fields, nights, round(nights / OCCUPANCY_DAYS, 4)))
+    return dashboard
+
+
+def valid_until(dashboard, now):
+    """First moment the rows built at ``now`` stop being current."""
+    moments = [datetime.combine(now.date() + timedelta(days=1), time.min)]
+    for row in dashboard:
+        moments += [moment for moment in (row.current_check_out, row.next_check_in, row.next_cleaning) if moment]
+    return min(moments)
+
+
+def get_dashboard(owner_id):
+    """Dashboard rows of ``owner_id``, from the cache while the owner's data and the shown stays are unchanged."""
+    now = datetime.now()
+    key = _cache_key(owner_id, data_version(owner_id))
+    cached = cache.get(key)
+    if cached is not None and now < cached[0]:
+        return [DashboardRow(*row) for row in cached[1]]
+
+    dashboard = build_dashboard(owner_id, now)
+    # Plain tuples keep the cache entry independent of this module
+    cache.set(key, (valid_until(dashboard, now), [tuple(row) for row in dashboard]), settings.DASHBOARD_CACHE_TIMEOUT)
+    return dashboard
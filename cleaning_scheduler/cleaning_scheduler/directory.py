@@ -0,0 +1,146 @@
+"""
+Per-owner apartment directory.
+
+The directory lists the ``(id, name, location)`` of an owner's apartments in
+id order. It is cached in the default cache (Redis in production) and, in
+front of it, in a small in-process LRU whose entries expire after
+``APARTMENT_DIRECTORY_LOCAL_TTL`` seconds. Saving or deleting an apartment
+drops the owner's entry from both tiers; other processes notice the change
+once their local entry expires.
+
+The directory answers lookups on hot paths without a database round trip.
+Writes still go through queries filtered by owner, so a stale entry can
+never grant access to another owner's apartment. A stale entry can however
+miss an apartment another process just created or renamed, so
+``find_apartment`` and ``has_apartment`` confirm a miss against the
+database, re-caching the directory, before the caller rejects the request.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .metrics import CACHE_REQUESTS
+from .models import Apartment
+
+ApartmentEntry = namedtuple('ApartmentEntry', ['id', 'name', 'location'])
+
+
+class ApartmentDirectory:
+    def __init__(self, entries):
+        self.entries = [ApartmentEntry(*entry) for entry in entries]
+        self.by_id = {entry.id: entry for entry in self.entries}
+        self.by_name = {entry.name: entry for entry in self.entries}
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, apartment_id):
+        return apartment_id in self.by_id
+
+    def find(self, name):
+        """Entry of the apartment called ``name``, or None."""
+        return self.by_name.get(name)
+
+
+class LocalLRU:
+    """Thread-safe LRU of ``key -> value`` with a time to live."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + settings.APARTMENT_DIRECTORY_LOCAL_TTL)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.APARTMENT_DIRECTORY_LOCAL_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_local = LocalLRU()
+
+
+def _cache_key(owner_id):
+    return f'apartment-directory:{owner_id}'
+
+
+def get_directory(owner_id):
+    """Apartment directory of ``owner_id``, loaded from the database on a miss of both tiers."""
+    return _lookup(owner_id)[0]
+
+
+def _lookup(owner_id):
+    """Directory of ``owner_id`` and whether it was just loaded from the database."""
+    directory = _local.get(owner_id)
+    if directory is not None:
+        CACHE_REQUESTS.labels(backend='local', result='hit').inc()
+        return directory, False
+    CACHE_REQUESTS.labels(backend='local', result='miss').inc()
+
+    # Plain tuples keep the shared cache entry small and independent of this module
+    entries = cache.get(_cache_key(owner_id))
+    if entries is None:
+        return reload_directory(owner_id), True
+    directory = ApartmentDirectory(entries)
+    _local.set(owner_id, directory)
+    return directory, False
+
+
+def reload_directory(owner_id):
+    """Load the directory of ``owner_id`` from the database into both tiers."""
+    # Always load from the primary: a lagging replica would be cached for the whole timeout
+    entries = list(Apartment.objects.using(DEFAULT_DB_ALIAS).filter(owner_id=owner_id).order_by('id').values_list(
+        'id', 'name', 'location'))
+    cache.set(_cache_key(owner_id), entries, settings.APARTMENT_DIRECTORY_CACHE_TIMEOUT)
+    directory = ApartmentDirectory(entries)
+    _local.set(owner_id, directory)
+    return directory
+
+
+def find_apartment(owner_id, name):
+    """Entry of the owner's apartment called ``name``, or None once the database confirms there is none."""
+    directory, fresh = _lookup(owner_id)
+    entry = directory.find(name)
+    if entry is None and not fresh:
+        entry = reload_directory(owner_id).find(name)
+    return entry
+
+
+def has_apartment(owner_id, apartment_id):
+    """Whether ``owner_id`` owns ``apartment_id``, confirming a miss against the database."""
+    directory, fresh = _lookup(owner_id)
+    if apartment_id in directory:
+        return True
+    return not fresh and apartment_id in reload_directory(owner_id)
+
+
+def invalidate_directory(owner_id):
+    _local.delete(owner_id)
+    cache.delete(_cache_key(owner_id))
@@ -0,0 +1,156 @@
+"""
+Live updates of the calendar pages over Server-Sent Events.
+
+Writes call ``notify(owner_id, kind)``; the kinds of one transaction are
+merged and published once per owner after commit, so a large import sends a
+single ``{"kinds": ["bookings", "cleaning"]}`` message instead of one per
+booking. Pages subscribed to the owner's stream then fetch their month as
+JSON and patch only the cells that differ. The same callback bumps the
+owner's data version, see ``versions``.
+
+Messages go through Redis pub/sub when ``LIVE_UPDATES_REDIS_URL`` is set,
+so every web process hears writes made in any other. Each process holds a
+single pattern subscription, started with its first stream, and fans
+messages out in memory to its open streams. Without Redis the in-memory
+broker is used directly, which only reaches streams of the same process.
+
+A stream holds a worker thread for up to ``LIVE_STREAM_SECONDS``; browsers
+reconnect on their own when it ends. ``config/gunicorn.py`` serves them with
+threaded workers whose timeout is above the stream length.
+"""
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import cache, partial
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from .log import get_logger
+from .versions import bump_data_version
+
+logger = get_logger(__name__)
+
+# Kinds of change
+BOOKINGS = 'bookings'
+CLEANING = 'cleaning'
+
+CHANNEL_PREFIX = 'cleaning_scheduler:live:'
+
+# Messages kept for a slow stream; the next one tells it to refetch anyway
+QUEUE_SIZE = 16
+
+# Kinds noted in the current thread's transaction, by owner id
+_pending = threading.local()
+
+
+class LocalBroker:
+    """In-memory fan-out of messages to the streams of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def publish(self, owner_id, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(owner_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                pass
+
+    @contextmanager
+    def subscribe(self, owner_id):
+        subscriber = queue.Queue(maxsize=QUEUE_SIZE)
+        with self.lock:
+            self.subscribers[owner_id].add(subscriber)
+        try:
+            yield subscriber
+        finally:
+            with self.lock:
+                self.subscribers[owner_id].discard(subscriber)
+                if not self.subscribers[owner_id]:
+                    del self.subscribers[owner_id]
+
+
+broker = LocalBroker()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+@cache
+def redis_client():
+    return redis.Redis.from_url(settings.LIVE_UPDATES_REDIS_URL)
+
+
+def listen():
+    """Forward the messages of every owner from Redis to ``broker``, reconnecting after errors."""
+    while True:
+        try:
+            pubsub = redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+            for message in pubsub.listen():
+                owner_id = int(message['channel'].decode().removeprefix(CHANNEL_PREFIX))
+                broker.publish(owner_id, message['data'].decode())
+        except redis.RedisError as error:
+            logger.warning("Live update subscription failed, reconnecting: %s", error)
+            time.sleep(1)
+
+
+def ensure_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=listen, name='live-updates', daemon=True)
+            _listener.start()
+
+
+def publish(owner_id, message):
+    if settings.LIVE_UPDATES_REDIS_URL:
+        try:
+            redis_client().publish(f'{CHANNEL_PREFIX}{owner_id}', message)
+        except redis.RedisError as error:
+            # Pages miss this update but catch up with the next one
+            logger.warning("Could not publish live update of owner %s: %s", owner_id, error)
+    else:
+        broker.publish(owner_id, message)
+
+
+def notify(owner_id, kind):
+    """Publish a ``kind`` change of the owner's data once the current transaction commits."""
+    pending = getattr(_pending, 'owners', None)
+    if pending is None:
+        pending = _pending.owners = {}
+    pending.setdefault(owner_id, set()).add(kind)
+    transaction.on_commit(partial(flush, owner_id))
+
+
+def flush(owner_id):
+    # The first callback of a transaction publishes every kind noted for the owner
+    kinds = _pending.owners.pop(owner_id, None)
+    if kinds:
+        bump_data_version(owner_id)
+        publish(owner_id, json.dumps({'kinds': sorted(kinds)}))
+
+
+def stream(owner_id):
+    """Server-Sent Events of the owner's changes, ending after ``LIVE_STREAM_SECONDS``."""
+    if settings.LIVE_UPDATES_REDIS_URL:
+        ensure_listener()
+    deadline = time.monotonic() + settings.LIVE_STREAM_SECONDS
+    with broker.subscribe(owner_id) as subscriber:
+        # Browsers wait this long before reconnecting once the stream ends
+        yield 'retry: 1000\n\n'
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                message = subscriber.get(timeout=min(remaining, settings.LIVE_HEARTBEAT_SECONDS))
+            except queue.Empty:
+                # Comment lines keep proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+                continue
+            yield f'event: change\ndata: {message}\n\n'
@@ -0,0 +1,46 @@
+"""
+Logging helpers for the scheduler and calendar hot paths.
+
+Messages use ``%`` arguments so nothing is formatted unless a handler emits
+the record. Collections are logged through ``summarize`` which only renders
+their size, and per-item debug records go through ``sampled_debug`` which is
+skipped entirely unless DEBUG is enabled and is thinned out by
+``SCHEDULER_LOG_SAMPLE_RATE``.
+"""
+import logging
+import random
+
+from django.conf import settings
+
+
+class Summary:
+    """Lazy ``len`` of a collection for use as a logging argument."""
+
+    __slots__ = ('collection',)
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __str__(self):
+        return str(len(self.collection))
+
+
+def summarize(collection):
+    return Summary(collection)
+
+
+class SchedulerLogger(logging.LoggerAdapter):
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def sampled_debug(self, msg, *args):
+        """Emit a per-item DEBUG record for a sampled fraction of calls."""
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        rate = settings.SCHEDULER_LOG_SAMPLE_RATE
+        if rate >= 1 or random.random() < rate:
+            self.logger.debug(msg, *args, stacklevel=2)
+
+
+def get_logger(name):
+    return SchedulerLogger(logging.getLogger(name))
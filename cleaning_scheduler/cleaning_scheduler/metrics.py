@@ -0,0 +1,153 @@
+"""
+Prometheus metrics for the cleaning scheduler.
+
+Collectors are module level and shared by the whole process. Under gunicorn,
+set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory before the workers
+start; prometheus_client then keeps the values in per-process files and
+``metrics_view`` aggregates them across workers on every scrape.
+"""
+import os
+import secrets
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+REQUEST_LATENCY = Histogram(
+    'cleaning_scheduler_request_duration_seconds',
+    'Request latency by URL name.',
+    ['url_name', 'method'],
+)
+REQUEST_DB_QUERIES = Histogram(
+    'cleaning_scheduler_request_db_queries',
+    'Number of database queries per request.',
+    ['url_name'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+REQUEST_DB_DURATION = Histogram(
+    'cleaning_scheduler_request_db_duration_seconds',
+    'Time spent in database queries per request.',
+    ['url_name'],
+)
+CACHE_REQUESTS = Counter(
+    'cleaning_scheduler_cache_requests_total',
+    'Cache lookups by backend and result.',
+    ['backend', 'result'],
+)
+ICS_IMPORT_BYTES = Histogram(
+    'cleaning_scheduler_ics_import_bytes',
+    'Size of uploaded ICS files.',
+    buckets=(1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000),
+)
+ICS_IMPORT_EVENTS = Histogram(
+    'cleaning_scheduler_ics_import_events',
+    'Number of VEVENTs in uploaded ICS files.',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+SCHEDULER_STAGE_DURATION = Histogram(
+    'cleaning_scheduler_scheduler_stage_duration_seconds',
+    'Duration of each update_cleaning_schedule stage.',
+    ['stage'],
+)
+RESCHEDULE_REQUESTS = Counter(
+    'cleaning_scheduler_reschedule_requests_total',
+    'Reschedule requests by outcome: run immediately, queued, or coalesced into a queued run.',
+    ['result'],
+)
+RESCHEDULE_QUEUE_DELAY = Histogram(
+    'cleaning_scheduler_reschedule_queue_delay_seconds',
+    'Time from the first request of a queued reschedule to the start of its run.',
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+SCHEDULER_RUNS = Counter(
+    'cleaning_scheduler_scheduler_runs_total',
+    'Finished reschedules, by whether they changed any window or cleaning date.',
+    ['result'],
+)
+RESCHEDULE_FAILURES = Counter(
+    'cleaning_scheduler_reschedule_failures_total',
+    'Queued reschedules that raised; resume_rescheduling finishes their checkpoints once stale.',
+)
+
+WEBHOOK_DELIVERIES = Counter(
+    'cleaning_scheduler_webhook_deliveries_total',
+    'Webhook batch deliveries by result.',
+    ['result'],
+)
+WEBHOOK_BATCH_EVENTS = Histogram(
+    'cleaning_scheduler_webhook_batch_events',
+    'Outbox events sent per webhook request.',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+
+def observe_scheduler_run(changes):
+    changed = changes['windows_created'] or changes['windows_updated'] or changes['cleaning_dates_updated']
+    SCHEDULER_RUNS.labels(result='changed' if changed else 'unchanged').inc()
+
+
+def observe_ics_import(size, events):
+    ICS_IMPORT_BYTES.observe(size)
+    ICS_IMPORT_EVENTS.observe(events)
+
+
+def scheduler_stage(stage):
+    """Context manager timing one stage of the scheduler."""
+    return SCHEDULER_STAGE_DURATION.labels(stage=stage).time()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """Record latency and database usage of every request by URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        url_name = match.view_name if match else '<unresolved>'
+        REQUEST_LATENCY.labels(url_name=url_name, method=request.method).observe(duration)
+        REQUEST_DB_QUERIES.labels(url_name=url_name).observe(queries.count)
+        REQUEST_DB_DURATION.labels(url_name=url_name).observe(queries.duration)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, open to staff or to ``METRICS_TOKEN`` bearers."""
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    has_token = bool(token) and secrets.compare_digest(authorization, f"Bearer {token}")
+    if not has_token and not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
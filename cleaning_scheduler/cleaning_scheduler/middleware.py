@@ -0,0 +1,156 @@
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .routers import pin_to_primary
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SQLTimeline:
+    """Execute wrapper recording every query with its offset and duration."""
+
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'offset_ms': round((start - self.started) * 1000, 3),
+                'duration_ms': round((end - start) * 1000, 3),
+                'sql': sql,
+                'many': many,
+            })
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread and aggregates it as folded stacks.
+
+    The output is the ``frame;frame;frame count`` format understood by
+    flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfilerMiddleware:
+    """Profile a single request on demand for staff users.
+
+    A request is profiled when it carries the ``REQUEST_PROFILER_HEADER`` header
+    or the ``REQUEST_PROFILER_QUERY_PARAM`` query flag and the user is staff.
+    The flag value selects the profiler: ``sample`` runs a sampling profiler,
+    anything else runs cProfile. Results are stored as ``RequestProfile`` rows
+    and the row id is returned in the ``X-Request-Profile`` response header.
+    Untriggered requests only pay for two dictionary lookups.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = settings.REQUEST_PROFILER_HEADER
+        self.query_param = settings.REQUEST_PROFILER_QUERY_PARAM
+
+    def __call__(self, request):
+        flag = request.META.get(self.header) or request.GET.get(self.query_param)
+        if not flag or not request.user.is_staff:
+            return self.get_response(request)
+        return self.profile(request, flag)
+
+    def profile(self, request, flag):
+        from .models import RequestProfile
+
+        mode = RequestProfile.MODE_SAMPLE if flag == RequestProfile.MODE_SAMPLE else RequestProfile.MODE_CPROFILE
+        started = time.perf_counter()
+        timeline = SQLTimeline(started)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timeline))
+            if mode == RequestProfile.MODE_SAMPLE:
+                sampler = StackSampler(threading.get_ident(), settings.REQUEST_PROFILER_SAMPLE_INTERVAL)
+                sampler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    sampler.stop()
+                data = sampler.folded().encode()
+                summary = ''.join(f"{count:>6} {stack.rsplit(';', 1)[-1]}\n" for stack, count in sampler.stacks.most_common(50))
+            else:
+                profiler = cProfile.Profile()
+                try:
+                    response = profiler.runcall(self.get_response, request)
+                finally:
+                    profiler.create_stats()
+                data = marshal.dumps(profiler.stats)
+                output = io.StringIO()
+                pstats.Stats(profiler, stream=output).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+                summary = output.getvalue()
+        duration = time.perf_counter() - started
+
+        profile = RequestProfile.objects.create(
+            user=request.user,
+            method=request.method,
+            path=request.get_full_path()[:2048],
+            status_code=response.status_code,
+            mode=mode,
+            duration_ms=duration * 1000,
+            query_count=len(timeline.queries),
+            query_time_ms=sum(query['duration_ms'] for query in timeline.queries),
+            sql_timeline=timeline.queries,
+            summary=summary,
+            data=data,
+        )
+        logger.info("Stored %s profile %s for %s %s", mode, profile.id, request.method, request.path)
+        response['X-Request-Profile'] = str(profile.id)
+        return response
+
+
+class ReplicaPinMiddleware:
+    """Pin users to the primary database for a while after a successful write request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and request.user.is_authenticated:
+            pin_to_primary(request.user)
+        return response
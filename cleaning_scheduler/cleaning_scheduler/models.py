@@ -1,8 +1,15 @@
+import secrets
+
+from django.contrib.postgres.indexes import OpClass
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Upper
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 
+from .addresses import validate_public_url
+
 User = get_user_model()
 
 class Apartment(models.Model):
@@ -19,6 +26,11 @@ class Apartment(models.Model):
     class Meta:
         app_label = 'cleaning_scheduler'
         unique_together = ('name', 'owner',)
+        indexes = [
+            # Case-insensitive name prefix search in the admin
+            models.Index(OpClass(Upper('name'), name='text_pattern_ops'),
+                         name='apartment_name_prefix_idx'),
+        ]
 
     def get_absolute_url(self) -> str:
         """Get URL for apartment's detail view.
@@ -45,18 +57,273 @@ class Booking(models.Model):
     
     class Meta:
         app_label = 'cleaning_scheduler'   
+        # Ordered lookups of an apartment's previous stay and next check-in
+        indexes = [
+            models.Index(fields=['apartment', 'check_in_date']),
+            models.Index(fields=['apartment', 'check_out_date']),
+            # Admin date drill-down and case-insensitive guest prefix search
+            models.Index(fields=['check_in_date']),
+            models.Index(OpClass(Upper('guest_name'), name='text_pattern_ops'),
+                         name='booking_guest_name_prefix_idx'),
+        ]
 
     def __str__(self):
         return f"{self.guest_name} - {self.apartment.name}"
 
+class CleaningCrew(models.Model):
+    """
+    A cleaning crew of an owner, able to do ``daily_capacity`` cleanings a day.
+    Crews are used by the capacity-aware scheduling mode.
+    """
+
+    owner = models.ForeignKey(User, related_name='crews', on_delete=models.CASCADE)
+    name = models.CharField(_("Name of Crew"), max_length=255)
+    daily_capacity = models.PositiveSmallIntegerField(_("Cleanings per day"), default=4,
+                                                      validators=[MinValueValidator(1)])
+
+    class Meta:
+        app_label = 'cleaning_scheduler'
+        unique_together = ('name', 'owner',)
+
+    def __str__(self):
+        return self.name
+
 class CleaningSchedule(models.Model):
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE)
     cleaning_date = models.DateTimeField(null=True, blank=True)
     window_start = models.DateTimeField(null=True, blank=True)
     window_end = models.DateTimeField(null=True, blank=True)
+    crew = models.ForeignKey(CleaningCrew, related_name='cleanings', null=True, blank=True, on_delete=models.SET_NULL)
     
     class Meta:
         app_label = 'cleaning_scheduler'   
-        
+        # Admin date drill-down
+        indexes = [
+            models.Index(fields=['cleaning_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.booking.apartment.name} - {self.cleaning_date}"
+
+class RequestProfile(models.Model):
+    """
+    Profile of a single request captured by RequestProfilerMiddleware.
+    ``data`` holds the downloadable profile: a marshalled pstats dump for
+    cProfile runs, or folded stacks for sampling runs.
+    """
+
+    MODE_CPROFILE = 'cprofile'
+    MODE_SAMPLE = 'sample'
+    MODE_CHOICES = [
+        (MODE_CPROFILE, _("cProfile")),
+        (MODE_SAMPLE, _("Sampling")),
+    ]
+
+    user = models.ForeignKey(User, related_name='+', null=True, on_delete=models.SET_NULL)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    status_code = models.PositiveSmallIntegerField()
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_time_ms = models.FloatField()
+    sql_timeline = models.JSONField(default=list)
+    summary = models.TextField(blank=True)
+    data = models.BinaryField()
+
+    class Meta:
+        app_label = 'cleaning_scheduler'
+        ordering = ['-created']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+    @property
+    def filename(self):
+        extension = 'prof' if self.mode == self.MODE_CPROFILE else 'folded'
+        return f"request-profile-{self.id}.{extension}"
+
+class RescheduleCheckpoint(models.Model):
+    """
+    Progress of a chunked reschedule of one owner's bookings.
+    ``apartment_ids`` lists the apartments whose cleaning windows are still to
+    be recalculated; cleaning dates over ``date_min``..``date_max`` are
+    reassigned once it is empty, and the checkpoint is then deleted. Rows left
+    behind by an interrupted run are picked up by ``resume_rescheduling``.
+    Checkpoints with a ``due`` time are queued: later requests of the owner
+    are merged into them until ``process_reschedule_queue`` runs them.
+    """
+
+    owner = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    date_min = models.DateTimeField()
+    date_max = models.DateTimeField()
+    apartment_ids = models.JSONField(default=list)
+    # Cleaning date assignment mode, blank for SCHEDULER_ASSIGNMENT_MODE
+    mode = models.CharField(max_length=20, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+    # When a queued checkpoint may run, None once it has started
+    due = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        app_label = 'cleaning_scheduler'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'mode'], condition=models.Q(due__isnull=False),
+                                    name='one_queued_checkpoint_per_owner'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} {self.date_min} - {self.date_max} ({len(self.apartment_ids)} apartments left)"
+
+class ChangeLogEntry(models.Model):
+    """
+    Change to one of an owner's CleaningSchedule rows, read by delta sync.
+    Entry ids are the sync cursor. Entries of an owner are written under the
+    owner's schedule lock, so their ids follow commit order and a client
+    never moves its cursor past an entry that commits later.
+    """
+
+    ENTITY_CLEANING = 'cleaning'
+    ENTITY_CHOICES = [
+        (ENTITY_CLEANING, _("Cleaning")),
+    ]
+    OPERATION_INSERT = 'insert'
+    OPERATION_UPDATE = 'update'
+    OPERATION_DELETE = 'delete'
+    OPERATION_CHOICES = [
+        (OPERATION_INSERT, _("Insert")),
+        (OPERATION_UPDATE, _("Update")),
+        (OPERATION_DELETE, _("Delete")),
+    ]
+
+    owner = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE, db_index=False)
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES, default=ENTITY_CLEANING)
+    entity_id = models.BigIntegerField()
+    operation = models.CharField(max_length=10, choices=OPERATION_CHOICES)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        app_label = 'cleaning_scheduler'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['owner', 'id']),
+            models.Index(fields=['owner', 'entity', 'entity_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.id}: {self.operation} {self.entity} {self.entity_id}"
+
+class ChangeLogCompaction(models.Model):
+    """
+    A ``compact_change_log`` run that dropped old entries. Clients whose
+    cursor is below ``compacted_through`` may have missed changes and are
+    sent a full snapshot instead.
+    """
+
+    compacted_through = models.BigIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'cleaning_scheduler'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Compacted through {self.compacted_through}"
+
+def webhook_secret():
+    return secrets.token_hex(32)
+
+class WebhookEndpoint(models.Model):
+    """
+    URL of an owner's cleaning vendor, sent the owner's schedule changes in
+    signed batches by ``deliver_webhooks``. After a failed delivery the
+    endpoint is not tried again before ``retry_at``; it is deactivated after
+    ``WEBHOOK_MAX_FAILURES`` failures in a row.
+    """
+
+    owner = models.ForeignKey(User, related_name='webhook_endpoints', on_delete=models.CASCADE)
+    # Only http(s) URLs of public hosts, see addresses
+    url = models.URLField(_("URL"), max_length=500, validators=[validate_public_url])
+    secret = models.CharField(max_length=64, default=webhook_secret, editable=False)
+    active = models.BooleanField(default=True)
+    # Batches of this endpoint delivered at the same time
+    max_concurrency = models.PositiveSmallIntegerField(default=1)
+    failures = models.PositiveIntegerField(default=0)
+    retry_at = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'cleaning_scheduler'
+        ordering = ['id']
+
+    def __str__(self):
+        return self.url
+
+class WebhookEvent(models.Model):
+    """
+    Outbox row: a change to a CleaningSchedule row still to be sent to an
+    endpoint. Events are leased in batches by a delivery worker and deleted
+    once the endpoint accepted them; a lease that runs out frees them again.
+    """
+
+    endpoint = models.ForeignKey(WebhookEndpoint, related_name='events', on_delete=models.CASCADE, db_index=False)
+    schedule_id = models.BigIntegerField()
+    operation = models.CharField(max_length=10, choices=ChangeLogEntry.OPERATION_CHOICES)
+    created = models.DateTimeField(auto_now_add=True)
+    batch = models.UUIDField(null=True, blank=True, db_index=True)
+    leased_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'cleaning_scheduler'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['endpoint', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.operation} cleaning {self.schedule_id} for {self.endpoint}"
+
+class ArchivedStay(models.Model):
+    """
+    A past booking and its cleaning, moved out of the Booking and
+    CleaningSchedule tables by ``archive_stays``. The id is the booking's.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    apartment = models.ForeignKey(Apartment, related_name='+', on_delete=models.CASCADE, db_index=False)
+    guest_name = models.CharField(max_length=100)
+    check_in_date = models.DateTimeField()
+    check_out_date = models.DateTimeField()
+    cleaning_date = models.DateTimeField(null=True, blank=True)
+    window_start = models.DateTimeField(null=True, blank=True)
+    window_end = models.DateTimeField(null=True, blank=True)
+    # Crews may be deleted after the stay was archived
+    crew_id = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'cleaning_scheduler'
+        indexes = [
+            models.Index(fields=['apartment', 'check_in_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.guest_name} - {self.check_in_date:%Y-%m-%d} (archived)"
+
+class ArchiveRun(models.Model):
+    """
+    A run of ``archive_stays``. Months before the latest ``cutoff`` are read
+    from the archive as well; a run is recorded before it moves any stay.
+    """
+
+    cutoff = models.DateTimeField()
+    stays = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'cleaning_scheduler'
+        ordering = ['-cutoff']
+
     def __str__(self):
-        return f"{self.apartment.name} - {self.cleaning_date}"
+        return f"Archived {self.stays} stays before {self.cutoff:%Y-%m-%d}"
@@ -0,0 +1,193 @@
+"""
+What-if scheduling.
+
+``preview_schedule`` answers how adding, moving or cancelling bookings would
+change an owner's cleaning windows and dates, without writing anything. It
+reads once what rescheduling would read around the changes: the bookings of
+the affected apartments and the owner's stored schedule rows in the same
+band of 30 days around them that ``update_cleaning_schedule`` uses. The
+changes are applied in memory and the windows and cleaning dates recomputed
+with the scheduler's own functions, so the preview is what the change would
+store. The result is a diff against the stored rows.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+
+from .capacity import load_capacity, plan_cleanings
+from .clustering import stab_windows
+from .directory import find_apartment, get_directory, has_apartment
+from .models import Booking, CleaningSchedule
+from .utils import (
+    MODE_CAPACITY,
+    MODE_CLUSTER,
+    CalendarImportError,
+    check_booking_dates,
+    cleaning_dates_from_overlaps,
+    compute_cleaning_windows,
+    load_bookings,
+    overlapping_windows,
+    parse_calendar,
+)
+
+ProposedBooking = namedtuple('ProposedBooking', ['apartment_id', 'check_in_date', 'check_out_date'])
+
+ScheduleChange = namedtuple('ScheduleChange', [
+    'booking_id', 'apartment_id', 'check_in_date', 'check_out_date', 'status',
+    'window_start', 'window_end', 'cleaning_date', 'crew_id',
+    'previous_window_start', 'previous_window_end', 'previous_cleaning_date', 'previous_crew_id',
+])
+
+# Status of a ScheduleChange
+ADDED = 'added'
+UPDATED = 'updated'
+CANCELLED = 'cancelled'
+RESCHEDULED = 'rescheduled'
+
+# Fields of a schedule row in the preview state
+Row = namedtuple('Row', ['apartment_id', 'check_in_date', 'check_out_date', 'window_start', 'window_end',
+                         'cleaning_date', 'crew_id'])
+
+
+def preview_schedule(user, added=(), updated=None, cancelled=(), mode=None):
+    """Schedule changes that adding, updating and cancelling the user's bookings would cause.
+
+    ``added`` are ProposedBooking tuples, ``updated`` maps booking ids to their
+    new ProposedBooking and ``cancelled`` lists booking ids. Returns the
+    ScheduleChange of every booking whose window, cleaning date or crew would
+    change, and of every booking named in the arguments; added bookings have
+    no ``booking_id``. Raises ``CalendarImportError`` for invalid changes.
+    """
+    updated = updated or {}
+    for proposed in [*added, *updated.values()]:
+        if not has_apartment(user.pk, proposed.apartment_id):
+            raise CalendarImportError(f'Apartment {proposed.apartment_id} does not exist')
+        error = check_booking_dates(proposed.check_in_date, proposed.check_out_date)
+        if error is not None:
+            raise CalendarImportError(error)
+
+    removed = set(updated).union(cancelled)
+    touched = {}
+    if removed:
+        touched = {
+            booking_id: ProposedBooking(apartment_id, check_in_date, check_out_date)
+            for booking_id, apartment_id, check_in_date, check_out_date in Booking.objects.filter(
+                apartment__owner=user, id__in=removed).values_list('id', 'apartment_id', 'check_in_date', 'check_out_date')
+        }
+        if removed - touched.keys():
+            raise CalendarImportError(f'Booking {min(removed - touched.keys())} does not exist')
+
+    stays = [*added, *updated.values(), *touched.values()]
+    if not stays:
+        return []
+    date_min = min(stay.check_in_date for stay in stays) - timedelta(days=30)
+    date_max = max(stay.check_out_date for stay in stays) + timedelta(days=30)
+
+    # Bookings of the affected apartments with the changes applied; added bookings get negative ids
+    all_bookings, next_check_ins = load_bookings(user, date_min, date_max, {stay.apartment_id for stay in stays})
+    bookings = [row for row in all_bookings if row[0] not in removed]
+    new_rows = [(booking_id, *proposed) for booking_id, proposed in updated.items()]
+    new_rows += [(-index, *proposed) for index, proposed in enumerate(added, 1)]
+    check_overlaps(bookings, new_rows)
+    bookings = sorted(bookings + new_rows, key=lambda row: (row[1], row[3]))
+    windows = compute_cleaning_windows(bookings, next_check_ins)
+
+    current = {
+        booking_id: Row(*fields) for booking_id, *fields in CleaningSchedule.objects.filter(
+            (Q(window_end__gte=date_min) | Q(window_end__isnull=True)) & Q(window_start__lte=date_max)
+            | Q(booking_id__in=[booking_id for booking_id in windows if booking_id > 0])
+            | Q(booking_id__in=removed),
+            booking__apartment__owner=user,
+        ).values_list('booking_id', 'booking__apartment_id', 'booking__check_in_date', 'booking__check_out_date',
+                      'window_start', 'window_end', 'cleaning_date', 'crew_id')
+    }
+    for booking_id, stay in touched.items():
+        current.setdefault(booking_id, Row(*stay, None, None, None, None))
+    proposed = {booking_id: row for booking_id, row in current.items() if booking_id not in removed}
+    for booking_id, apartment_id, check_in_date, check_out_date in bookings:
+        previous = current.get(booking_id)
+        proposed[booking_id] = Row(apartment_id, check_in_date, check_out_date, *windows[booking_id],
+                                   previous and previous.cleaning_date, previous and previous.crew_id)
+
+    assign(user, proposed, date_min, date_max, mode or settings.SCHEDULER_ASSIGNMENT_MODE, get_directory(user.pk),
+           removed)
+    return diff(current, proposed, updated, cancelled)
+
+
+def preview_calendar(user, ics_content, mode=None):
+    """``preview_schedule`` of importing an ICS calendar."""
+    apartment_name, stays = parse_calendar(ics_content)
+    entry = find_apartment(user.pk, apartment_name)
+    if entry is None:
+        raise CalendarImportError(f'Apartment with name {apartment_name} does not exist')
+    added = [ProposedBooking(entry.id, check_in_date, check_out_date) for check_in_date, check_out_date, _ in stays]
+    return preview_schedule(user, added=added, mode=mode)
+
+
+def check_overlaps(bookings, new_rows):
+    """Raise ``CalendarImportError`` when a new row overlaps another booking of its apartment."""
+    new_ids = {row[0] for row in new_rows}
+    latest = {}
+    for row in sorted(bookings + new_rows, key=lambda row: (row[1], row[2])):
+        booking_id, apartment_id, check_in_date, check_out_date = row
+        previous = latest.get(apartment_id)
+        if previous is not None and check_in_date < previous[3] and (booking_id in new_ids or previous[0] in new_ids):
+            stay = row if booking_id in new_ids else previous
+            raise CalendarImportError(f'Booking from {stay[2]} to {stay[3]} overlaps with an existing booking')
+        if previous is None or check_out_date > previous[3]:
+            latest[apartment_id] = row
+
+
+def assign(user, rows, date_min, date_max, mode, directory, removed):
+    """Assign cleaning dates in ``rows`` in place, as ``reassign_cleaning_dates`` would."""
+    windows = [
+        (booking_id, row.window_start, row.window_end) for booking_id, row in rows.items()
+        if row.window_start <= date_max and (row.window_end is None or row.window_end >= date_min)
+    ]
+    if mode == MODE_CAPACITY:
+        crews, used = load_capacity(user, windows, exclude=removed)
+        plan, _ = plan_cleanings(windows, crews, used)
+        for booking_id, (cleaning_date, crew_id) in plan.items():
+            rows[booking_id] = rows[booking_id]._replace(cleaning_date=cleaning_date, crew_id=crew_id)
+        return
+
+    if mode == MODE_CLUSTER:
+        groups = {}
+        for window in windows:
+            location = directory.by_id[rows[window[0]].apartment_id].location
+            groups.setdefault(location if settings.SCHEDULER_CLUSTER_BY_LOCATION else None, []).append(window)
+        cleaning_dates = {}
+        for group in groups.values():
+            cleaning_dates.update(stab_windows(group))
+    else:
+        overlaps = overlapping_windows([window for window in windows if window[2] is not None])
+        cleaning_dates = cleaning_dates_from_overlaps(windows, overlaps)
+    for booking_id, cleaning_date in cleaning_dates.items():
+        rows[booking_id] = rows[booking_id]._replace(cleaning_date=cleaning_date)
+
+
+def diff(current, proposed, updated, cancelled):
+    """ScheduleChange tuples between the stored and proposed rows, ordered by apartment and check-in."""
+    changes = []
+    for booking_id in current.keys() | proposed.keys():
+        before, after = current.get(booking_id), proposed.get(booking_id)
+        if booking_id < 0:
+            status = ADDED
+        elif booking_id in cancelled:
+            status = CANCELLED
+        elif booking_id in updated:
+            status = UPDATED
+        elif before is None or before[3:] != after[3:]:
+            # A booking whose rescheduling is queued or pending has no stored window yet
+            status = RESCHEDULED
+        else:
+            continue
+        row = after or before
+        changes.append(ScheduleChange(
+            booking_id if booking_id > 0 else None, row.apartment_id, row.check_in_date, row.check_out_date, status,
+            *(after[3:] if after else (None,) * 4),
+            *(before[3:] if before else (None,) * 4),
+        ))
+    return sorted(changes, key=lambda change: (change.apartment_id, change.check_in_date))
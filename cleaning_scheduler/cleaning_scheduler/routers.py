@@ -0,0 +1,119 @@
+"""
+Read-replica routing.
+
+Every database alias other than ``default`` is treated as a read replica.
+Reads go to a replica only inside ``replica_reads()``, which views opt into
+with ``read_from_replica``, or ``ReplicaReadMixin`` for DRF views;
+everything else, and every write, uses ``default``. After a user changes
+data, ``ReplicaPinMiddleware`` pins them to ``default`` for
+``SCHEDULER_REPLICA_PIN_SECONDS`` so they read their own writes while the
+replicas catch up.
+
+DRF authenticates inside the view, so a decorator around a DRF view only
+sees the session user and would send token-authenticated users to a
+replica even while they are pinned. ``ReplicaReadMixin`` decides in
+``initial()``, once authentication has run on ``default``.
+"""
+import contextvars
+import functools
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+@contextmanager
+def replica_reads():
+    """Route the reads of the enclosed block to a replica."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+def pin_to_primary(user):
+    """Send the user's reads to ``default`` until the replicas have caught up with their writes."""
+    cache.set(_pin_key(user), True, settings.SCHEDULER_REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(_pin_key(user), False)
+
+
+def _reads_replica(request):
+    return request.method in ('GET', 'HEAD') and replica_aliases() and not is_pinned(request.user)
+
+
+def read_from_replica(view):
+    """Serve safe requests of ``view`` from a replica unless the user is pinned to ``default``.
+
+    The user must be known before the view runs, as with session
+    authentication; DRF views use ``ReplicaReadMixin`` instead.
+    """
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not _reads_replica(request):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            response = view(request, *args, **kwargs)
+            # Lazy responses query while rendering, so render them on the replica too
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
+    return wrapped
+
+
+class ReplicaReadMixin:
+    """Serve safe requests of a DRF view from a replica unless the authenticated user is pinned to ``default``."""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _replica_reads.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication, permissions and throttles read the primary
+        super().initial(request, *args, **kwargs)
+        if _reads_replica(request):
+            _replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # Lazy responses query while rendering, so render them on the replica too
+        if _replica_reads.get() and not response.is_rendered:
+            response.render()
+        return response
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            replicas = replica_aliases()
+            if replicas:
+                return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .availability import invalidate_occupancy
+from .changelog import DELETE, record_changes
+from .directory import invalidate_directory
+from .live import BOOKINGS, notify
+from .models import Apartment, Booking, CleaningSchedule
+
+
+@receiver([post_save, post_delete], sender=Apartment)
+def apartment_changed(sender, instance, **kwargs):
+    invalidate_directory(instance.owner_id)
+    # Drop it again once committed, in case another request cached the old rows meanwhile
+    transaction.on_commit(lambda: invalidate_directory(instance.owner_id))
+    notify(instance.owner_id, BOOKINGS)
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed(sender, instance, origin=None, **kwargs):
+    invalidate_occupancy(instance.apartment_id)
+    transaction.on_commit(lambda: invalidate_occupancy(instance.apartment_id))
+    # Pages of a deleted apartment's owner are notified by apartment_changed
+    if origin is None or deleted_directly(sender, origin):
+        if Booking.apartment.is_cached(instance):
+            owner_id = instance.apartment.owner_id
+        else:
+            owner_id = Apartment.objects.filter(id=instance.apartment_id).values_list('owner_id', flat=True).first()
+        if owner_id is not None:
+            notify(owner_id, BOOKINGS)
+
+
+def deleted_directly(sender, origin):
+    """Whether ``origin`` deletes ``sender`` rows itself, rather than by cascade from another model."""
+    return isinstance(origin, sender) or getattr(origin, 'model', None) is sender
+
+
+@receiver(pre_delete, sender=Apartment)
+@receiver(pre_delete, sender=Booking)
+def collect_deleted_schedules(sender, instance, origin=None, **kwargs):
+    # The cascade deletes the schedule rows without signals, so they are listed beforehand
+    if deleted_directly(sender, origin):
+        lookup = 'booking__apartment' if sender is Apartment else 'booking'
+        instance._deleted_schedules = list(
+            CleaningSchedule.objects.filter(**{lookup: instance}).values_list('id', 'booking__apartment__owner_id'))
+
+
+@receiver(post_delete, sender=Apartment)
+@receiver(post_delete, sender=Booking)
+def log_deleted_schedules(sender, instance, **kwargs):
+    # Logged once the rows are gone, as the owner's schedule lock comes after apartment locks
+    deleted = getattr(instance, '_deleted_schedules', None)
+    if deleted:
+        record_changes(DELETE, [schedule_id for schedule_id, _ in deleted], owner_id=deleted[0][1])
@@ -0,0 +1,51 @@
+from datetime import datetime, time, timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from factory import Faker, LazyAttribute, Sequence, SubFactory
+from factory.django import DjangoModelFactory
+
+from cleaning_scheduler.cleaning_scheduler.models import Apartment, Booking
+from cleaning_scheduler.users.tests.factories import UserFactory
+
+
+class ApartmentFactory(DjangoModelFactory):
+    owner = SubFactory(UserFactory)
+    name = Sequence(lambda n: f"Apartment {n}")
+    location = Faker("city")
+    size = "2BR"
+
+    class Meta:
+        model = Apartment
+
+
+def check_in(days_from_today):
+    """Usual check-in time ``days_from_today`` days from today."""
+    return datetime.combine(datetime.now().date() + timedelta(days=days_from_today), time(15, 0))
+
+
+class BookingFactory(DjangoModelFactory):
+    apartment = SubFactory(ApartmentFactory)
+    guest_name = Faker("name")
+    check_in_date = LazyAttribute(lambda o: check_in(7))
+    check_out_date = LazyAttribute(lambda o: datetime.combine(o.check_in_date.date() + timedelta(days=o.nights), time(11, 0)))
+
+    class Params:
+        nights = 3
+
+    class Meta:
+        model = Booking
+
+
+def ics_file(prodid, stays, name="feed.ics"):
+    """Build an uploadable ICS file with one VEVENT per ``(check_in, check_out, guest)``."""
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{prodid}"]
+    for check_in, check_out, guest in stays:
+        lines += [
+            "BEGIN:VEVENT",
+            f"DTSTART;VALUE=DATE:{check_in:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{check_out:%Y%m%d}",
+            f"SUMMARY:{guest}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return SimpleUploadedFile(name, ("\r\n".join(lines) + "\r\n").encode(), content_type="text/calendar")
@@ -0,0 +1,114 @@
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler.admin import EstimatedCountPaginator
+from cleaning_scheduler.cleaning_scheduler.models import Booking, CleaningSchedule
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.cleaning_scheduler.utils import reschedule
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def bookings():
+    beach, city = ApartmentFactory(name="Beach House"), ApartmentFactory(name="City Loft")
+    stays = [
+        BookingFactory(apartment=beach, guest_name="Ada Lovelace", check_in_date=check_in(3)),
+        BookingFactory(apartment=beach, guest_name="Alan Turing", check_in_date=check_in(10)),
+        BookingFactory(apartment=city, guest_name="Grace Hopper", check_in_date=check_in(3)),
+    ]
+    for apartment in (beach, city):
+        reschedule(apartment.owner, check_in(-30), check_in(60))
+    return stays
+
+
+def listed(response):
+    return {str(obj) for obj in response.context["cl"].result_list}
+
+
+@pytest.mark.parametrize("model", ["booking", "cleaningschedule"])
+def test_change_list_queries_do_not_grow_with_rows(admin_client: Client, bookings, model: str):
+    url = reverse(f"admin:cleaning_scheduler_{model}_changelist")
+    admin_client.get(url)
+    with CaptureQueriesContext(connection) as few:
+        admin_client.get(url)
+
+    BookingFactory.create_batch(5, apartment=bookings[0].apartment)
+    reschedule(bookings[0].apartment.owner, check_in(-30), check_in(60))
+    with CaptureQueriesContext(connection) as more:
+        response = admin_client.get(url)
+
+    assert response.status_code == 200
+    assert len(more) == len(few)
+
+
+@pytest.mark.parametrize("term, guests", [
+    ("ada", {"Ada Lovelace"}),
+    ("beach", {"Ada Lovelace", "Alan Turing"}),
+    ("CITY", {"Grace Hopper"}),
+    ("lovelace", set()),
+])
+def test_search_by_guest_or_apartment_prefix(admin_client: Client, bookings, term: str, guests: set):
+    response = admin_client.get(reverse("admin:cleaning_scheduler_booking_changelist"), {"q": term})
+    schedules = admin_client.get(reverse("admin:cleaning_scheduler_cleaningschedule_changelist"), {"q": term})
+
+    assert {booking.guest_name for booking in response.context["cl"].result_list} == guests
+    assert {schedule.booking.guest_name for schedule in schedules.context["cl"].result_list} == guests
+
+
+def test_guest_search_uses_the_prefix_index():
+    queryset = Booking.objects.filter(guest_name__istartswith="ada")
+
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+
+    assert "booking_guest_name_prefix_idx" in plan
+
+
+def test_paginator_estimates_large_results(bookings, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("cleaning_scheduler.cleaning_scheduler.admin.EXACT_COUNT_LIMIT", 0)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE cleaning_scheduler_booking")
+
+    with CaptureQueriesContext(connection) as queries:
+        count = EstimatedCountPaginator(Booking.objects.order_by("-check_in_date"), 100).count
+
+    assert count >= 0
+    assert not any("COUNT(" in query["sql"] for query in queries.captured_queries)
+    ada = Booking.objects.filter(guest_name="Ada Lovelace").order_by("-check_in_date")
+    assert EstimatedCountPaginator(ada, 100).count >= 0
+
+
+def test_small_results_are_counted_exactly(bookings):
+    assert EstimatedCountPaginator(Booking.objects.order_by("-check_in_date"), 100).count == 3
+    guests_a = Booking.objects.filter(guest_name__startswith="A").order_by("-check_in_date")
+    assert EstimatedCountPaginator(guests_a, 100).count == 2
+
+
+def test_reschedule_action(admin_client: Client, bookings):
+    CleaningSchedule.objects.all().delete()
+
+    response = admin_client.post(reverse("admin:cleaning_scheduler_booking_changelist"), {
+        "action": "reschedule_apartments",
+        "_selected_action": [bookings[0].id, bookings[2].id],
+    })
+
+    assert response.status_code == 302
+    assert set(CleaningSchedule.objects.values_list("booking_id", flat=True)) == {booking.id for booking in bookings}
+
+
+def test_cleaning_schedule_str(bookings):
+    schedule = CleaningSchedule.objects.get(booking=bookings[2])
+
+    assert str(schedule) == f"City Loft - {schedule.cleaning_date}"
+
+
+def test_apartment_admin(admin_client: Client, bookings):
+    response = admin_client.get(reverse("admin:cleaning_scheduler_apartment_changelist"), {"q": "Beach"})
+
+    assert response.status_code == 200
+    assert listed(response) == {"Beach House"}
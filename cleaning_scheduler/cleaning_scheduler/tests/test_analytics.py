@@ -0,0 +1,110 @@
+import random
+from collections import Counter
+from datetime import date, timedelta
+
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler.analytics import get_analytics
+from cleaning_scheduler.cleaning_scheduler.models import Booking, CleaningSchedule
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.cleaning_scheduler.utils import reschedule
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def portfolio(user: User):
+    rng = random.Random(7)
+    apartments = [ApartmentFactory(owner=user) for _ in range(4)]
+    for apartment in apartments[:3]:
+        day = rng.randint(-20, -5)
+        while day < 40:
+            nights = rng.randint(1, 6)
+            BookingFactory(apartment=apartment, check_in_date=check_in(day), nights=nights)
+            day += nights + rng.randint(0, 3)
+    reschedule(user, check_in(-30), check_in(60))
+    return apartments
+
+
+def expected_report(user, start, end):
+    """The report's metrics computed booking by booking."""
+    days = [start + timedelta(days=offset) for offset in range((end - start).days)]
+    nights, check_ins, check_outs, cleanings = Counter(), Counter(), Counter(), Counter()
+    per_apartment = {}
+    for booking in Booking.objects.filter(apartment__owner=user):
+        stats = per_apartment.setdefault(booking.apartment_id, Counter())
+        first, last = booking.check_in_date.date(), booking.check_out_date.date()
+        for day in days:
+            if first <= day < last:
+                nights[day] += 1
+                stats["booked_nights"] += 1
+        if start <= first < end:
+            check_ins[first] += 1
+            stats["stays"] += 1
+            stats["stay_nights"] += (last - first).days
+        if start <= last < end:
+            check_outs[last] += 1
+            stats["turnovers"] += 1
+    for schedule in CleaningSchedule.objects.filter(booking__apartment__owner=user, cleaning_date__isnull=False):
+        if start <= schedule.cleaning_date.date() < end:
+            cleanings[schedule.cleaning_date.date()] += 1
+            per_apartment[schedule.booking.apartment_id]["cleanings"] += 1
+    return per_apartment, [(day, nights[day], check_ins[day], check_outs[day], cleanings[day]) for day in days]
+
+
+@pytest.mark.parametrize("offsets", [(-10, 20), (0, 1), (-60, 90)])
+def test_report_matches_booking_by_booking_counts(user: User, portfolio, offsets):
+    start, end = (date.today() + timedelta(days=offset) for offset in offsets)
+
+    report = get_analytics(user.pk, start, end)
+
+    per_apartment, per_day = expected_report(user, start, end)
+    assert [row.id for row in report.apartments] == [apartment.id for apartment in portfolio]
+    for row in report.apartments:
+        stats = per_apartment.get(row.id, Counter())
+        assert (row.booked_nights, row.stays, row.turnovers, row.cleanings) == (
+            stats["booked_nights"], stats["stays"], stats["turnovers"], stats["cleanings"])
+        assert row.occupancy == round(stats["booked_nights"] / (end - start).days, 4)
+        assert row.average_stay_nights == (round(stats["stay_nights"] / stats["stays"], 2) if stats["stays"] else 0)
+    assert [(day.date, day.occupied, day.check_ins, day.check_outs, day.cleanings) for day in report.days] == per_day
+    busiest = sorted((row for row in per_day if row[4]), key=lambda row: -row[4])[:5]
+    assert [(peak.date, peak.cleanings) for peak in report.peak_cleaning_days] == [(row[0], row[4]) for row in busiest]
+
+
+def test_report_is_cached_until_the_data_changes(user: User, portfolio, django_capture_on_commit_callbacks):
+    start, end = date.today(), date.today() + timedelta(days=30)
+    before = get_analytics(user.pk, start, end)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert get_analytics(user.pk, start, end) == before
+    assert len(queries) == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        BookingFactory(apartment=portfolio[3], check_in_date=check_in(2), nights=3)
+    assert get_analytics(user.pk, start, end).apartments[3].booked_nights == 3
+
+
+class TestAnalyticsAPIView:
+    def test_report(self, client: Client, user: User, portfolio):
+        client.force_login(user)
+        start, end = date.today(), date.today() + timedelta(days=7)
+
+        response = client.get(reverse("analytics"), {"start_date": start, "end_date": end})
+
+        assert response.status_code == 200
+        assert len(response.json()["apartments"]) == len(portfolio)
+        assert [day["date"] for day in response.json()["days"]][0] == start.isoformat()
+
+    @pytest.mark.parametrize("days", [0, 1000])
+    def test_invalid_range(self, client: Client, user: User, days: int):
+        client.force_login(user)
+
+        response = client.get(reverse("analytics"), {"start_date": date.today(),
+                                                     "end_date": date.today() + timedelta(days=days)})
+
+        assert response.status_code == 400
@@ -0,0 +1,107 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler.apartment_batch import import_apartments
+from cleaning_scheduler.cleaning_scheduler.directory import get_directory
+from cleaning_scheduler.cleaning_scheduler.models import Apartment
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+def row(name, **fields):
+    return {"name": name, "location": "Lisbon", "size": "2BR", **fields}, {}
+
+
+def test_batch_uses_a_fixed_number_of_queries(user: User):
+    ApartmentFactory(owner=user, name="Existing")
+    rows = [row(f"Apartment {n}") for n in range(200)] + [row("Existing", size="3BR")]
+
+    with CaptureQueriesContext(connection) as queries:
+        results = import_apartments(user, rows)
+
+    assert [result.status for result in results] == ["created"] * 200 + ["updated"]
+    assert len(queries) <= 8
+    assert Apartment.objects.filter(owner=user).count() == 201
+    assert Apartment.objects.get(owner=user, name="Existing").size == "3BR"
+    assert results[0].id == Apartment.objects.get(owner=user, name="Apartment 0").id
+
+
+def test_names_are_checked_for_the_whole_batch(user: User):
+    first, second = ApartmentFactory(owner=user, name="First"), ApartmentFactory(owner=user, name="Second")
+    other = ApartmentFactory(name="Elsewhere")
+
+    results = import_apartments(user, [
+        row("New"),
+        row("New"),
+        row("Second", id=first.id),
+        row("Renamed", id=other.id),
+        row("Renamed", id=second.id),
+        row("Again", id=second.id),
+    ])
+
+    assert [(result.status, list(result.errors)) for result in results] == [
+        ("created", []), ("invalid", ["name"]), ("invalid", ["name"]), ("invalid", ["id"]), ("updated", []),
+        ("invalid", ["id"]),
+    ]
+    assert sorted(Apartment.objects.filter(owner=user).values_list("name", flat=True)) == ["First", "New", "Renamed"]
+    assert Apartment.objects.get(id=other.id).name == "Elsewhere"
+
+
+def test_batch_refreshes_the_directory(user: User):
+    assert len(get_directory(user.pk)) == 0
+
+    import_apartments(user, [row("Loft")])
+
+    assert [entry.name for entry in get_directory(user.pk)] == ["Loft"]
+
+
+class TestApartmentBatchView:
+    def test_json(self, client: Client, user: User):
+        client.force_login(user)
+
+        response = client.post(reverse("apartments_batch"), {"apartments": [
+            {"name": "Loft", "location": "Porto", "size": "1BR"},
+            {"name": "Studio", "location": "Porto"},
+        ]}, content_type="application/json")
+
+        assert response.status_code == 200
+        assert [(result["row"], result["status"]) for result in response.json()] == [(1, "created"), (2, "invalid")]
+        assert response.json()[1]["errors"] == {"size": ["This field is required."]}
+
+    def test_csv(self, client: Client, user: User):
+        client.force_login(user)
+        loft = ApartmentFactory(owner=user, name="Loft")
+        upload = SimpleUploadedFile("apartments.csv", (
+            "id,name,location,size\r\n"
+            f"{loft.id},Loft,Porto,3BR\r\n"
+            ",Studio,Porto,1BR\r\n"
+        ).encode(), content_type="text/csv")
+
+        response = client.post(reverse("apartments_batch"), {"csv_file": upload})
+
+        assert [result["status"] for result in response.json()] == ["updated", "created"]
+        loft.refresh_from_db()
+        assert (loft.location, loft.size) == ("Porto", "3BR")
+
+    def test_requires_one_source(self, client: Client, user: User):
+        client.force_login(user)
+
+        response = client.post(reverse("apartments_batch"), {}, content_type="application/json")
+
+        assert response.status_code == 400
+
+    def test_row_limit(self, client: Client, user: User, settings):
+        settings.APARTMENT_BATCH_MAX_ROWS = 1
+        client.force_login(user)
+
+        response = client.post(reverse("apartments_batch"), {"apartments": [row("A")[0], row("B")[0]]},
+                               content_type="application/json")
+
+        assert response.status_code == 400
+        assert not Apartment.objects.exists()
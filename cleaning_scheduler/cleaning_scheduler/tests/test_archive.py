@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.test import Client
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler.analytics import compute_report, load_days
+from cleaning_scheduler.cleaning_scheduler import analytics, archive
+from cleaning_scheduler.cleaning_scheduler.archive import archive_stays, month_stays
+from cleaning_scheduler.cleaning_scheduler.models import ArchivedStay, Booking, ChangeLogEntry, CleaningSchedule
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.cleaning_scheduler.utils import reschedule
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def stays(user: User):
+    apartment = ApartmentFactory(owner=user)
+    old = [BookingFactory(apartment=apartment, check_in_date=check_in(-420 + 5 * n), nights=2) for n in range(4)]
+    recent = [BookingFactory(apartment=apartment, check_in_date=check_in(-10 + 5 * n), nights=2) for n in range(4)]
+    reschedule(user, check_in(-500), check_in(60))
+    return old, recent
+
+
+def month_json(client, view, day):
+    return client.get(reverse(view), {"year": day.year, "month": day.month, "format": "json"}).json()
+
+
+def test_only_closed_stays_are_archived(user: User, stays):
+    old, recent = stays
+
+    run = archive_stays(datetime.now() - timedelta(days=365), chunk_size=2)
+
+    # The last old stay's window runs until the next check-in, which is recent
+    assert run.stays == 3
+    assert sorted(ArchivedStay.objects.values_list("id", flat=True)) == [booking.id for booking in old[:3]]
+    assert sorted(Booking.objects.values_list("id", flat=True)) == [booking.id for booking in old[3:] + recent]
+    schedule_ids = set(CleaningSchedule.objects.values_list("id", flat=True))
+    assert len(schedule_ids) == 5
+    assert set(ChangeLogEntry.objects.values_list("entity_id", flat=True)) == schedule_ids
+    archived = ArchivedStay.objects.get(id=old[0].id)
+    assert archived.guest_name == old[0].guest_name and archived.cleaning_date is not None
+
+
+@pytest.mark.parametrize("view", ["scheduler:calendar", "scheduler:cleaning_schedule"])
+def test_archived_months_look_the_same(client: Client, user: User, stays, view):
+    client.force_login(user)
+    day = stays[0][0].check_in_date
+    before = month_json(client, view, day)
+
+    archive_stays(datetime.now() - timedelta(days=365))
+
+    assert ArchivedStay.objects.exists()
+    assert month_json(client, view, day) == before
+
+
+def test_archived_stays_count_in_analytics(user: User, stays):
+    start, end = check_in(-430).date(), check_in(30).date()
+    before = compute_report(start, end, *load_days(user.pk, start, end))
+    assert sum(day.check_ins for day in before.days) == 8
+
+    archive_stays(datetime.now() - timedelta(days=365))
+
+    assert ArchivedStay.objects.exists()
+    assert compute_report(start, end, *load_days(user.pk, start, end)) == before
+
+
+def archive_during_reads(monkeypatch):
+    """Archive the old stays once the hot rows were read, as a concurrent archive_stays could."""
+    archived_through = archive.archived_through
+
+    def archive_then_read(database=None):
+        archive_stays(datetime.now() - timedelta(days=365))
+        return archived_through(database)
+
+    monkeypatch.setattr(archive, "archived_through", archive_then_read)
+    monkeypatch.setattr(analytics, "archived_through", archive_then_read)
+
+
+def test_stays_archived_between_reads_are_listed_once(user: User, stays, monkeypatch):
+    day = stays[0][0].check_in_date
+    before = sorted(month_stays(user, day.year, day.month))
+
+    archive_during_reads(monkeypatch)
+
+    assert sorted(month_stays(user, day.year, day.month)) == before
+    assert ArchivedStay.objects.exists()
+
+
+def test_analytics_count_stays_archived_between_reads_once(user: User, stays, monkeypatch):
+    start, end = check_in(-430).date(), check_in(30).date()
+    before = compute_report(start, end, *load_days(user.pk, start, end))
+
+    archive_during_reads(monkeypatch)
+
+    assert compute_report(start, end, *load_days(user.pk, start, end)) == before
+    assert ArchivedStay.objects.exists()
+
+
+def test_dry_run(user: User, stays, capsys):
+    call_command("archive_stays", "--dry-run")
+
+    assert capsys.readouterr().out.startswith("3 stays")
+    assert not ArchivedStay.objects.exists()
+
+
+def test_horizon_must_cover_rescheduling():
+    with pytest.raises(CommandError):
+        call_command("archive_stays", "--horizon-days", "7")
@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler import availability
+from cleaning_scheduler.cleaning_scheduler.availability import build_occupancy, free_apartments, night_mask
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+def day(days_from_today):
+    return date.today() + timedelta(days=days_from_today)
+
+
+def test_night_mask():
+    base = date(2030, 1, 1)
+
+    assert night_mask(base, date(2030, 1, 3), date(2030, 1, 6)) == 0b11100
+    assert night_mask(base, date(2030, 1, 3), date(2030, 1, 3)) == 0
+
+
+def test_build_occupancy_marks_booked_nights():
+    booking = BookingFactory(check_in_date=check_in(2), nights=3)
+
+    occupancy = build_occupancy([booking.apartment_id], day(0))
+
+    assert occupancy[booking.apartment_id].bits == 0b11100
+
+
+class TestFreeApartments:
+    def test_check_out_day_is_free(self, user: User):
+        booked = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(2), nights=3).apartment
+        empty = ApartmentFactory(owner=user)
+
+        assert free_apartments([booked.id, empty.id], day(0), day(2)) == [booked.id, empty.id]
+        assert free_apartments([booked.id, empty.id], day(4), day(6)) == [empty.id]
+        assert free_apartments([booked.id, empty.id], day(5), day(8)) == [booked.id, empty.id]
+
+    def test_new_bookings_invalidate_the_cached_bitset(self, user: User):
+        apartment = ApartmentFactory(owner=user)
+        assert free_apartments([apartment.id], day(1), day(3)) == [apartment.id]
+
+        BookingFactory(apartment=apartment, check_in_date=check_in(2))
+
+        assert free_apartments([apartment.id], day(1), day(3)) == []
+
+    def test_rebuild_racing_a_commit_is_not_served(self, user: User, monkeypatch, django_capture_on_commit_callbacks):
+        apartment = ApartmentFactory(owner=user)
+        build = availability.build_occupancy
+
+        def build_then_commit(apartment_ids, base):
+            # The rebuild reads before a concurrent booking commits, and stores its bitset after the commit
+            built = build(apartment_ids, base)
+            with django_capture_on_commit_callbacks(execute=True):
+                BookingFactory(apartment=apartment, check_in_date=check_in(2))
+            return built
+
+        monkeypatch.setattr(availability, "build_occupancy", build_then_commit)
+        assert free_apartments([apartment.id], day(1), day(3)) == [apartment.id]
+        monkeypatch.undo()
+
+        assert free_apartments([apartment.id], day(1), day(3)) == []
+
+
+class TestAvailabilityAPI:
+    def test_lists_free_apartments(self, client: Client, user: User):
+        client.force_login(user)
+        booked = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(2)).apartment
+        free = ApartmentFactory(owner=user)
+        ApartmentFactory()
+
+        response = client.get(reverse("calendar_availability"), {"start_date": day(1), "end_date": day(4)})
+
+        assert response.status_code == 200
+        assert response.json() == [{"id": free.id, "name": free.name, "location": free.location}]
+        assert booked.id not in [apartment["id"] for apartment in response.json()]
+
+    @pytest.mark.parametrize("start, end", [(3, 1), (-1, 2), (1, 5000)])
+    def test_invalid_ranges(self, client: Client, user: User, start: int, end: int):
+        client.force_login(user)
+
+        response = client.get(reverse("calendar_availability"), {"start_date": day(start), "end_date": day(end)})
+
+        assert response.status_code == 400
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from cleaning_scheduler.cleaning_scheduler.capacity import plan_cleanings
+from cleaning_scheduler.cleaning_scheduler.models import CleaningCrew, CleaningSchedule
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.cleaning_scheduler.utils import MODE_CAPACITY, reassign_cleaning_dates, reschedule
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+def at(day, hour):
+    return datetime(2030, 1, day, hour)
+
+
+class TestPlanCleanings:
+    def test_earliest_next_check_in_first(self):
+        windows = [
+            (1, at(1, 11), at(5, 15)),
+            (2, at(1, 11), at(2, 15)),
+            (3, at(1, 11), None),
+        ]
+
+        plan, overbooked = plan_cleanings(windows, [(10, 1)])
+
+        assert plan == {2: (at(1, 11), 10), 1: (at(2, 11), 10), 3: (at(3, 11), 10)}
+        assert overbooked == 0
+
+    def test_fills_crews_in_order(self):
+        windows = [(booking_id, at(1, 11), at(9, 15)) for booking_id in range(3)]
+
+        plan, _ = plan_cleanings(windows, [(10, 2), (20, 1)])
+
+        assert sorted(crew_id for _, crew_id in plan.values()) == [10, 10, 20]
+        assert {cleaning_date for cleaning_date, _ in plan.values()} == {at(1, 11)}
+
+    def test_last_day_is_overbooked_rather_than_missed(self):
+        windows = [(1, at(1, 11), at(1, 15)), (2, at(1, 11), at(1, 15))]
+
+        plan, overbooked = plan_cleanings(windows, [(10, 1)])
+
+        assert {cleaning_date for cleaning_date, _ in plan.values()} == {at(1, 11)}
+        assert overbooked == 1
+
+    def test_counts_cleanings_already_planned(self):
+        plan, _ = plan_cleanings([(1, at(1, 11), at(3, 15))], [(10, 1)], used={at(1, 0).date(): 1})
+
+        assert plan == {1: (at(2, 11), 10)}
+
+    def test_unlimited_without_crews(self):
+        windows = [(booking_id, at(1, 11), at(9, 15)) for booking_id in range(3)]
+
+        plan, overbooked = plan_cleanings(windows, [])
+
+        assert set(plan.values()) == {(at(1, 11), None)}
+        assert overbooked == 0
+
+    def test_crews_without_capacity_count_as_no_crews(self):
+        windows = [(1, at(1, 11), None), (2, at(1, 11), at(3, 15))]
+
+        plan, overbooked = plan_cleanings(windows, [(10, 0)])
+
+        assert plan == {1: (at(1, 11), None), 2: (at(1, 11), None)}
+        assert overbooked == 0
+
+
+def test_zero_daily_capacity_is_invalid(user: User):
+    with pytest.raises(ValidationError):
+        CleaningCrew(owner=user, name="Idle", daily_capacity=0).full_clean()
+
+
+def test_capacity_mode(user: User):
+    crew = CleaningCrew.objects.create(owner=user, name="Crew", daily_capacity=1)
+    first = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(2), nights=2)
+    second = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(2), nights=2)
+    BookingFactory(apartment=first.apartment, check_in_date=check_in(10))
+    BookingFactory(apartment=second.apartment, check_in_date=check_in(8))
+    reschedule(user, check_in(-30), check_in(60))
+
+    with transaction.atomic():
+        reassign_cleaning_dates(user, check_in(-30), check_in(60), mode=MODE_CAPACITY)
+
+    first_schedule = CleaningSchedule.objects.get(booking=first)
+    second_schedule = CleaningSchedule.objects.get(booking=second)
+    assert second_schedule.cleaning_date == second.check_out_date
+    assert first_schedule.cleaning_date.date() == check_in(5).date()
+    assert first_schedule.crew == second_schedule.crew == crew
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler.changelog import DELETE, INSERT, UPDATE, changes_since, compact_change_log
+from cleaning_scheduler.cleaning_scheduler.models import Booking, ChangeLogEntry, CleaningSchedule
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.cleaning_scheduler.utils import cancel_booking, reschedule, update_booking
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+def synced(user, since=0, rows=None):
+    """Rows of a client holding ``rows`` that syncs from ``since`` until nothing is left, and its last cursor."""
+    rows = dict(rows or {})
+    while True:
+        changes = changes_since(user, since, limit=2)
+        if changes.reset:
+            rows = {}
+        for row in changes.inserted + changes.updated:
+            rows[row.id] = (row.booking_id, row.cleaning_date)
+        for schedule_id in changes.removed:
+            rows.pop(schedule_id, None)
+        since = changes.cursor
+        if not changes.more:
+            return rows, since
+
+
+def stored(user):
+    return {
+        schedule.id: (schedule.booking_id, schedule.cleaning_date)
+        for schedule in CleaningSchedule.objects.filter(booking__apartment__owner=user)
+    }
+
+
+@pytest.fixture
+def apartment(user: User):
+    apartment = ApartmentFactory(owner=user)
+    for days in (3, 7, 12):
+        BookingFactory(apartment=apartment, check_in_date=check_in(days), nights=2)
+    reschedule(user, check_in(-30), check_in(60))
+    return apartment
+
+
+def test_scheduler_runs_are_logged(user: User, apartment):
+    rows, cursor = synced(user)
+    assert rows == stored(user)
+    assert set(ChangeLogEntry.objects.values_list("operation", flat=True)) == {INSERT, UPDATE}
+
+    booking = BookingFactory(apartment=apartment, check_in_date=check_in(20), nights=2)
+    reschedule(user, check_in(-30), check_in(60))
+    changes = changes_since(user, cursor)
+
+    assert [row.booking_id for row in changes.inserted] == [booking.id]
+    assert not changes.reset and not changes.more and changes.cursor > cursor
+    assert changes_since(user, changes.cursor) == (changes.cursor, False, False, [], [], [])
+
+
+def test_moves_and_cancellations(user: User, apartment):
+    rows, cursor = synced(user)
+    _, moved, last = Booking.objects.filter(apartment=apartment).order_by("check_in_date")
+    cancelled = CleaningSchedule.objects.get(booking=last).id
+
+    update_booking(user, moved.id, check_in_date=check_in(16), check_out_date=check_in(18) - timedelta(hours=4))
+    cancel_booking(user, last.id)
+    changes = changes_since(user, cursor)
+
+    assert changes.removed == [cancelled]
+    assert not changes.inserted
+    assert synced(user, cursor, rows)[0] == stored(user)
+
+
+def test_other_owners_are_not_sent(user: User, apartment):
+    other = ApartmentFactory()
+    BookingFactory(apartment=other, check_in_date=check_in(5))
+    reschedule(other.owner, check_in(-30), check_in(60))
+
+    rows, _ = synced(user)
+
+    assert rows == stored(user)
+
+
+def test_deleting_an_apartment(user: User, apartment):
+    _, cursor = synced(user)
+    removed = set(stored(user))
+
+    apartment.delete()
+
+    assert set(changes_since(user, cursor).removed) == removed
+
+
+def test_log_is_written_after_apartment_locks(user: User, apartment):
+    ApartmentFactory(owner=user)
+    BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(4))
+
+    with CaptureQueriesContext(connection) as queries:
+        reschedule(user, check_in(-30), check_in(60), apartment_chunk_size=1)
+
+    statements = [query["sql"] for query in queries.captured_queries]
+    first_lock = next(index for index, sql in enumerate(statements) if "pg_advisory_xact_lock" in sql)
+    assert not any("FOR UPDATE" in sql for sql in statements[first_lock:])
+    assert any("cleaning_scheduler_changelogentry" in sql for sql in statements[first_lock:])
+
+
+def test_compaction(user: User, apartment):
+    rows, cursor = synced(user)
+    first = Booking.objects.filter(apartment=apartment).order_by("check_in_date").first()
+    cancel_booking(user, first.id)
+    added = BookingFactory(apartment=apartment, check_in_date=check_in(20), nights=2)
+    reschedule(user, check_in(-30), check_in(60))
+    BookingFactory(apartment=apartment, check_in_date=check_in(23), nights=2)
+    reschedule(user, check_in(-30), check_in(60))
+
+    assert compact_change_log() > 0
+
+    # One entry per row is left, and a row inserted after a cursor is still new to it
+    assert ChangeLogEntry.objects.count() == len(stored(user)) + 1
+    assert added.id in [row.booking_id for row in changes_since(user, cursor).inserted]
+    assert synced(user, cursor, rows)[0] == stored(user)
+
+    ChangeLogEntry.objects.filter(operation=DELETE).update(created=datetime.now() - timedelta(days=31))
+    call_command("compact_change_log", "--retention-days", "30")
+
+    assert not ChangeLogEntry.objects.filter(operation=DELETE).exists()
+    changes = changes_since(user, cursor)
+    assert changes.reset
+    assert {row.id for row in changes.inserted} == set(stored(user))
+
+
+class TestChangesAPI:
+    def test_sync(self, client: Client, user: User, apartment):
+        client.force_login(user)
+
+        snapshot = client.get(reverse("calendar_cleaning_changes")).json()
+        delta = client.get(reverse("calendar_cleaning_changes"), {"since": snapshot["cursor"]}).json()
+
+        assert snapshot["reset"] and len(snapshot["inserted"]) == 3
+        assert delta == {"cursor": snapshot["cursor"], "reset": False, "more": False, "inserted": [], "updated": [],
+                         "removed": []}
+
+    def test_invalid_cursor(self, client: Client, user: User):
+        client.force_login(user)
+
+        response = client.get(reverse("calendar_cleaning_changes"), {"since": "-1"})
+
+        assert response.status_code == 400
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from cleaning_scheduler.cleaning_scheduler.clustering import stab_windows
+from cleaning_scheduler.cleaning_scheduler.models import CleaningSchedule
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.cleaning_scheduler.utils import MODE_CLUSTER, update_cleaning_schedule
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+def at(day, hour):
+    return datetime(2030, 1, day, hour)
+
+
+class TestStabWindows:
+    def test_fewest_days_inside_every_window(self):
+        windows = [
+            (1, at(1, 11), at(4, 15)),
+            (2, at(3, 11), at(8, 15)),
+            (3, at(5, 11), at(6, 15)),
+            (4, at(7, 11), at(9, 15)),
+        ]
+
+        cleaning_dates = stab_windows(windows)
+
+        assert cleaning_dates == {1: at(4, 11), 2: at(6, 11), 3: at(6, 11), 4: at(9, 11)}
+        for booking_id, start, end in windows:
+            assert start <= cleaning_dates[booking_id] <= end
+
+    def test_open_windows(self):
+        windows = [
+            (1, at(1, 11), at(4, 15)),
+            (2, at(2, 11), None),
+            (3, at(6, 11), None),
+            (4, at(8, 11), None),
+        ]
+
+        assert stab_windows(windows) == {1: at(4, 11), 2: at(4, 11), 3: at(8, 11), 4: at(8, 11)}
+
+
+class TestClusterMode:
+    def test_update_cleaning_schedule_selects_cluster_mode(self, user: User):
+        first = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(2), nights=2)
+        second = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(3), nights=2)
+        BookingFactory(apartment=first.apartment, check_in_date=check_in(9))
+        BookingFactory(apartment=second.apartment, check_in_date=check_in(7))
+
+        update_cleaning_schedule(user, [first, second], mode=MODE_CLUSTER)
+
+        # One visit on the day the second apartment's next guest arrives cleans both
+        cleaning_dates = {schedule.cleaning_date for schedule in CleaningSchedule.objects.filter(booking__in=[first, second])}
+        assert cleaning_dates == {datetime.combine(check_in(7).date(), first.check_out_date.time())}
+
+    def test_grouped_by_location(self, user: User, settings):
+        settings.SCHEDULER_CLUSTER_BY_LOCATION = True
+        first = BookingFactory(apartment=ApartmentFactory(owner=user, location="North"), check_in_date=check_in(2), nights=2)
+        second = BookingFactory(apartment=ApartmentFactory(owner=user, location="South"), check_in_date=check_in(3), nights=2)
+        BookingFactory(apartment=first.apartment, check_in_date=check_in(9))
+        BookingFactory(apartment=second.apartment, check_in_date=check_in(7))
+
+        update_cleaning_schedule(user, [first, second], mode=MODE_CLUSTER)
+
+        assert CleaningSchedule.objects.get(booking=first).cleaning_date.date() == check_in(9).date()
+        assert CleaningSchedule.objects.get(booking=second).cleaning_date.date() == check_in(7).date()
@@ -0,0 +1,119 @@
+from datetime import datetime
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from prometheus_client import REGISTRY
+
+from cleaning_scheduler.management.commands import process_reschedule_queue
+from cleaning_scheduler.cleaning_scheduler.models import CleaningSchedule, RescheduleCheckpoint
+from cleaning_scheduler.cleaning_scheduler.tests.factories import BookingFactory
+from cleaning_scheduler.cleaning_scheduler.utils import update_cleaning_schedule
+
+pytestmark = pytest.mark.django_db
+
+
+class TestRebuildCleaningSchedules:
+    def test_rebuild(self):
+        bookings = BookingFactory.create_batch(3)
+        out = StringIO()
+
+        call_command("rebuild_cleaning_schedules", "--workers", "0", stdout=out)
+
+        assert "rebuilt 3 owners and 3 bookings" in out.getvalue()
+        assert "windows created: 3" in out.getvalue()
+        assert CleaningSchedule.objects.filter(booking__in=bookings).count() == 3
+
+    def test_dry_run_rolls_back(self):
+        BookingFactory()
+        out = StringIO()
+
+        call_command("rebuild_cleaning_schedules", "--workers", "0", "--dry-run", stdout=out)
+
+        assert "Dry run" in out.getvalue()
+        assert "windows created: 1" in out.getvalue()
+        assert not CleaningSchedule.objects.exists()
+
+    def test_owner_filter(self):
+        booking, _ = BookingFactory.create_batch(2)
+
+        call_command("rebuild_cleaning_schedules", "--workers", "0", "--owner", booking.apartment.owner.username,
+                     stdout=StringIO())
+
+        assert list(CleaningSchedule.objects.values_list("booking_id", flat=True)) == [booking.id]
+
+
+class TestCheckCleaningSchedules:
+    def test_check_and_repair(self):
+        booking = BookingFactory()
+        out = StringIO()
+
+        call_command("check_cleaning_schedules", stdout=out)
+        assert "missing rows: 1" in out.getvalue()
+        assert not CleaningSchedule.objects.exists()
+
+        call_command("check_cleaning_schedules", "--repair", stdout=out)
+        assert CleaningSchedule.objects.get(booking=booking).cleaning_date == booking.check_out_date
+
+        out = StringIO()
+        call_command("check_cleaning_schedules", stdout=out)
+        assert "inconsistent apartments: 0" in out.getvalue()
+
+
+class TestResumeRescheduling:
+    def test_resumes_stale_checkpoint(self):
+        booking = BookingFactory()
+        RescheduleCheckpoint.objects.create(
+            owner=booking.apartment.owner,
+            date_min=booking.check_in_date,
+            date_max=booking.check_out_date,
+            apartment_ids=[booking.apartment_id],
+        )
+        out = StringIO()
+
+        call_command("resume_rescheduling", "--stale-after", "-1", stdout=out)
+
+        assert "resumed 1 checkpoints" in out.getvalue()
+        assert not RescheduleCheckpoint.objects.exists()
+        assert CleaningSchedule.objects.get(booking=booking).cleaning_date == booking.check_out_date
+
+
+class TestProcessRescheduleQueue:
+    def test_runs_due_checkpoints(self, settings):
+        settings.SCHEDULER_DEBOUNCE_SECONDS = 5
+        booking = BookingFactory()
+        update_cleaning_schedule(booking.apartment.owner, [booking])
+        RescheduleCheckpoint.objects.update(due=datetime.now())
+        out = StringIO()
+
+        call_command("process_reschedule_queue", "--workers", "0", "--once", stdout=out)
+
+        assert "ran 1 queued reschedules" in out.getvalue()
+        assert not RescheduleCheckpoint.objects.exists()
+        assert CleaningSchedule.objects.get(booking=booking).cleaning_date == booking.check_out_date
+
+    def test_failed_owner_does_not_stop_the_others(self, settings, monkeypatch):
+        settings.SCHEDULER_DEBOUNCE_SECONDS = 5
+        failing, other = BookingFactory(), BookingFactory()
+        update_cleaning_schedule(failing.apartment.owner, [failing])
+        update_cleaning_schedule(other.apartment.owner, [other])
+        RescheduleCheckpoint.objects.update(due=datetime.now())
+        broken = RescheduleCheckpoint.objects.get(owner=failing.apartment.owner)
+        run_queued = process_reschedule_queue.run_queued
+
+        def run(checkpoint_id):
+            if checkpoint_id == broken.id:
+                raise RuntimeError("scheduler bug")
+            return run_queued(checkpoint_id)
+
+        monkeypatch.setattr(process_reschedule_queue, "run_queued", run)
+        failures = REGISTRY.get_sample_value("cleaning_scheduler_reschedule_failures_total") or 0
+        out = StringIO()
+
+        call_command("process_reschedule_queue", "--workers", "0", "--once", stdout=out)
+
+        assert "ran 1 queued reschedules, 1 failed" in out.getvalue()
+        assert REGISTRY.get_sample_value("cleaning_scheduler_reschedule_failures_total") == failures + 1
+        assert CleaningSchedule.objects.get(booking=other).cleaning_date == other.check_out_date
+        # Left claimed for resume_rescheduling
+        assert RescheduleCheckpoint.objects.get().due is None
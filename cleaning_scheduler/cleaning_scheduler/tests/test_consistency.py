@@ -0,0 +1,59 @@
+import pytest
+
+from cleaning_scheduler.cleaning_scheduler.consistency import check_apartments, repair, stored_digests, window_digest
+from cleaning_scheduler.cleaning_scheduler.models import CleaningSchedule
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.cleaning_scheduler.utils import reschedule
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def scheduled(user: User):
+    apartment = ApartmentFactory(owner=user)
+    bookings = [
+        BookingFactory(apartment=apartment, check_in_date=check_in(days), nights=2) for days in (5, 10, 20)
+    ]
+    reschedule(user, check_in(-30), check_in(60))
+    return apartment, bookings
+
+
+def test_stored_digest_matches_python_digest(scheduled):
+    apartment, bookings = scheduled
+    windows = {
+        booking_id: (start, end)
+        for booking_id, start, end in CleaningSchedule.objects.values_list("booking_id", "window_start", "window_end")
+    }
+
+    assert stored_digests([apartment.id]) == {apartment.id: window_digest(windows)}
+
+
+def test_consistent_apartment_is_skipped(scheduled):
+    apartment, _ = scheduled
+
+    report = check_apartments([apartment.id])
+
+    assert not report
+    assert report.counts["inconsistent_apartments"] == 0
+    assert report.counts["bookings"] == 3
+
+
+def test_detects_and_repairs_differences(scheduled):
+    apartment, (first, second, third) = scheduled
+    CleaningSchedule.objects.filter(booking=first).update(window_end=None)
+    CleaningSchedule.objects.filter(booking=second).delete()
+    duplicate = CleaningSchedule.objects.create(booking=third, window_start=third.check_out_date)
+
+    report = check_apartments([apartment.id])
+
+    assert report.counts["inconsistent_apartments"] == 1
+    assert list(report.missing) == [second.id]
+    assert list(report.mismatched) == [CleaningSchedule.objects.get(booking=first).id]
+    assert report.duplicates == [duplicate.id]
+
+    repair(report)
+
+    assert not check_apartments([apartment.id])
+    assert CleaningSchedule.objects.get(booking=first).cleaning_date == second.check_in_date
+    assert CleaningSchedule.objects.get(booking=second).cleaning_date == third.check_in_date
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler import dashboard
+from cleaning_scheduler.cleaning_scheduler.dashboard import build_dashboard, get_dashboard
+from cleaning_scheduler.cleaning_scheduler.models import Booking
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.cleaning_scheduler.utils import reschedule
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+class Clock(datetime):
+    """Stand-in for datetime whose now() is ``moment``."""
+    moment = None
+
+    @classmethod
+    def now(cls):
+        return cls.moment
+
+
+@pytest.fixture
+def portfolio(user: User):
+    busy, empty = ApartmentFactory(owner=user), ApartmentFactory(owner=user)
+    current = BookingFactory(apartment=busy, check_in_date=check_in(-2), nights=4)
+    upcoming = BookingFactory(apartment=busy, check_in_date=check_in(5), nights=3)
+    # Only the first 5 nights fall within the next 30 days
+    BookingFactory(apartment=busy, check_in_date=check_in(25), nights=10)
+    reschedule(user, check_in(-30), check_in(60))
+    return busy, empty, current, upcoming
+
+
+def test_dashboard_rows(user: User, portfolio):
+    busy, empty, current, upcoming = portfolio
+
+    with CaptureQueriesContext(connection) as queries:
+        rows = build_dashboard(user.pk, datetime.now())
+
+    assert len(queries) == 1
+    assert [row.id for row in rows] == [busy.id, empty.id]
+    assert (rows[0].current_guest, rows[0].current_check_out) == (current.guest_name, current.check_out_date)
+    assert (rows[0].next_guest, rows[0].next_check_in) == (upcoming.guest_name, upcoming.check_in_date)
+    assert current.check_out_date <= rows[0].next_cleaning <= upcoming.check_in_date
+    assert (rows[0].booked_nights, rows[0].occupancy) == (2 + 3 + 5, round(10 / 30, 4))
+    assert rows[1][3:] == (None, None, None, None, None, 0, 0)
+
+
+def test_dashboard_is_cached_until_the_data_changes(user: User, portfolio, django_capture_on_commit_callbacks):
+    busy, empty, current, upcoming = portfolio
+    get_dashboard(user.pk)
+
+    with CaptureQueriesContext(connection) as queries:
+        get_dashboard(user.pk)
+    assert len(queries) == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Booking.objects.get(id=upcoming.id).delete()
+    assert get_dashboard(user.pk)[0].next_check_in == check_in(25)
+
+
+def test_cached_dashboard_expires_at_the_next_check_in(user: User, portfolio, monkeypatch: pytest.MonkeyPatch):
+    busy, empty, current, upcoming = portfolio
+    get_dashboard(user.pk)
+
+    monkeypatch.setattr(dashboard, "datetime", Clock)
+    monkeypatch.setattr(Clock, "moment", upcoming.check_in_date + timedelta(minutes=1))
+
+    assert get_dashboard(user.pk)[0].current_guest == upcoming.guest_name
+
+
+class TestDashboardViews:
+    def test_api(self, client: Client, user: User, portfolio):
+        client.force_login(user)
+
+        response = client.get(reverse("dashboard"))
+
+        assert [row["id"] for row in response.json()] == [apartment.id for apartment in portfolio[:2]]
+        assert response.json()[0]["booked_nights"] == 10
+
+    def test_page(self, client: Client, user: User, portfolio):
+        client.force_login(user)
+
+        response = client.get(reverse("scheduler:dashboard"))
+
+        assert response.status_code == 200
+        assert portfolio[2].guest_name in response.content.decode()
@@ -0,0 +1,129 @@
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler import directory as directory_module
+from cleaning_scheduler.cleaning_scheduler.directory import find_apartment, get_directory, has_apartment
+from cleaning_scheduler.cleaning_scheduler.directory import ApartmentDirectory
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+class TestApartmentDirectory:
+    def test_lists_owner_apartments_in_id_order(self, user: User):
+        first = ApartmentFactory(owner=user)
+        second = ApartmentFactory(owner=user)
+        ApartmentFactory()
+
+        directory = get_directory(user.pk)
+
+        assert [entry.id for entry in directory] == [first.id, second.id]
+        assert directory.find(second.name).location == second.location
+        assert directory.find("Nowhere") is None
+        assert first.id in directory
+
+    def test_cached_in_both_tiers(self, user: User, django_assert_num_queries):
+        ApartmentFactory(owner=user)
+        get_directory(user.pk)
+
+        with django_assert_num_queries(0):
+            assert len(get_directory(user.pk)) == 1
+
+    def test_save_and_delete_invalidate(self, user: User):
+        apartment = ApartmentFactory(owner=user)
+        assert len(get_directory(user.pk)) == 1
+
+        apartment.name = "Renamed"
+        apartment.save()
+        assert get_directory(user.pk).find("Renamed").id == apartment.id
+
+        apartment.delete()
+        assert len(get_directory(user.pk)) == 0
+
+    def test_miss_of_a_stale_local_entry_reloads(self, user: User, django_assert_num_queries):
+        stale = get_directory(user.pk)
+        apartment = ApartmentFactory(owner=user)
+        # Another process created the apartment; this one still holds its old local entry
+        directory_module._local.set(user.pk, stale)
+
+        with django_assert_num_queries(1):
+            assert has_apartment(user.pk, apartment.id)
+        with django_assert_num_queries(0):
+            assert find_apartment(user.pk, apartment.name).id == apartment.id
+
+    def test_confirmed_miss(self, user: User, django_assert_num_queries):
+        other = ApartmentFactory()
+        get_directory(user.pk)
+
+        with django_assert_num_queries(1):
+            assert not has_apartment(user.pk, other.id)
+        with django_assert_num_queries(1):
+            assert find_apartment(user.pk, other.name) is None
+
+
+class TestOwnedApartmentViews:
+    def test_other_owners_apartment_is_rejected_without_loading_it(self, client: Client, user: User):
+        client.force_login(user)
+        other = ApartmentFactory()
+        get_directory(user.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("scheduler:apartments_detail", kwargs={"id": other.id}))
+
+        assert response.status_code == 404
+        tables = [query["sql"].split(" FROM ")[1].split()[0] for query in queries if query["sql"].startswith("SELECT")]
+        assert tables == ['"django_session"', '"users_user"', '"cleaning_scheduler_apartment"']
+        # The reload reads the requesting owner's directory, never the other apartment
+        selects = [query["sql"] for query in queries if query["sql"].startswith("SELECT")]
+        assert f'"owner_id" = {user.pk}' in selects[-1]
+
+    def test_owner_sees_apartment(self, client: Client, user: User):
+        client.force_login(user)
+        apartment = ApartmentFactory(owner=user)
+
+        response = client.get(reverse("scheduler:apartments_detail", kwargs={"id": apartment.id}))
+
+        assert response.status_code == 200
+
+    def test_apartment_created_by_another_process_is_found(self, client: Client, user: User):
+        client.force_login(user)
+        stale = get_directory(user.pk)
+        apartment = ApartmentFactory(owner=user)
+        directory_module._local.set(user.pk, stale)
+
+        response = client.get(reverse("scheduler:apartments_detail", kwargs={"id": apartment.id}))
+
+        assert response.status_code == 200
+
+
+class TestCleaningScheduleView:
+    def month(self, client: Client, day):
+        response = client.get(reverse("scheduler:cleaning_schedule"),
+                              {"year": day.year, "month": day.month, "format": "json"})
+        assert response.status_code == 200
+        return response.json()
+
+    def test_apartment_missing_from_a_stale_local_entry(self, client: Client, user: User):
+        client.force_login(user)
+        stale = get_directory(user.pk)
+        booking = BookingFactory(apartment=ApartmentFactory(owner=user, name="New"), check_in_date=check_in(3))
+        directory_module._local.set(user.pk, stale)
+
+        assert self.month(client, booking.check_in_date)["apartments"] == ["New"]
+
+    def test_apartment_missing_after_the_reload(self, client: Client, user: User, monkeypatch):
+        client.force_login(user)
+        booking = BookingFactory(apartment=ApartmentFactory(owner=user, name="Gone"), check_in_date=check_in(3))
+        # The directory read from the primary no longer has the apartment the bookings show
+        directory_module._local.set(user.pk, ApartmentDirectory([]))
+        monkeypatch.setattr("cleaning_scheduler.cleaning_scheduler.views.reload_directory",
+                            lambda owner_id: ApartmentDirectory([]))
+
+        month = self.month(client, booking.check_in_date)
+
+        assert month["apartments"] == ["Gone"]
+        assert month["schedule"][f"{booking.check_in_date:%Y-%m-%d}"] == ["Enter"]
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler.live import BOOKINGS, CLEANING, broker
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in, ics_file
+from cleaning_scheduler.cleaning_scheduler.utils import import_calendar
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+def received(subscriber):
+    messages = []
+    while not subscriber.empty():
+        messages.append(json.loads(subscriber.get_nowait()))
+    return messages
+
+
+def test_import_publishes_one_message_per_owner(user: User, django_capture_on_commit_callbacks):
+    apartment = ApartmentFactory(owner=user)
+    stays = [(check_in(3 + 3 * n).date(), check_in(5 + 3 * n).date(), f"Guest {n}") for n in range(20)]
+
+    with broker.subscribe(user.pk) as subscriber, broker.subscribe(user.pk + 1) as other:
+        with django_capture_on_commit_callbacks(execute=True):
+            import_calendar(user, ics_file(apartment.name, stays).read())
+
+        assert received(subscriber) == [{"kinds": [BOOKINGS, CLEANING]}]
+        assert received(other) == []
+
+
+def test_deleted_booking_is_published(user: User, django_capture_on_commit_callbacks):
+    booking = BookingFactory(apartment=ApartmentFactory(owner=user))
+
+    with broker.subscribe(user.pk) as subscriber:
+        with django_capture_on_commit_callbacks(execute=True):
+            booking.delete()
+
+        assert received(subscriber) == [{"kinds": [BOOKINGS]}]
+
+
+class TestLiveUpdatesView:
+    def test_stream(self, client: Client, user: User, settings):
+        settings.LIVE_HEARTBEAT_SECONDS = 0.05
+        settings.LIVE_STREAM_SECONDS = 0.5
+        client.force_login(user)
+
+        response = client.get(reverse("scheduler:live_updates"))
+        chunks = iter(response.streaming_content)
+
+        assert response["Content-Type"] == "text/event-stream"
+        assert next(chunks) == b"retry: 1000\n\n"
+        broker.publish(user.pk, json.dumps({"kinds": [CLEANING]}))
+        assert next(chunks) == b'event: change\ndata: {"kinds": ["cleaning"]}\n\n'
+        assert next(chunks) == b": keep-alive\n\n"
+        # The stream ends by itself and the browser reconnects
+        assert list(chunks)
+
+    def test_requires_login(self, client: Client):
+        response = client.get(reverse("scheduler:live_updates"))
+
+        assert response.status_code == 302
+
+
+class TestMonthJSON:
+    def test_calendar_cells(self, client: Client, user: User):
+        client.force_login(user)
+        booking = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(3), nights=2)
+        day = booking.check_in_date
+
+        response = client.get(reverse("scheduler:calendar"), {"year": day.year, "month": day.month, "format": "json"})
+
+        assert response.json()["days"][day.strftime("%Y-%m-%d")] == [booking.apartment.name]
+
+    def test_schedule_cells(self, client: Client, user: User):
+        client.force_login(user)
+        booking = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(3), nights=2)
+        day = booking.check_in_date
+
+        response = client.get(reverse("scheduler:cleaning_schedule"),
+                              {"year": day.year, "month": day.month, "format": "json"})
+
+        assert response.json()["apartments"] == [booking.apartment.name]
+        assert response.json()["schedule"][day.strftime("%Y-%m-%d")] == ["Enter"]
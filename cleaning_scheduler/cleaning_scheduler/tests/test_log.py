@@ -0,0 +1,39 @@
+import logging
+
+import pytest
+
+from cleaning_scheduler.cleaning_scheduler.log import get_logger, summarize
+
+LOGGER_NAME = "cleaning_scheduler.cleaning_scheduler.tests.test_log"
+
+
+class Unformattable:
+    def __str__(self):
+        raise AssertionError("formatted although the record was dropped")
+
+
+def test_summarize_renders_length_only():
+    assert str(summarize({1: "a", 2: "b"})) == "2"
+    assert "%s overlaps" % summarize([]) == "0 overlaps"
+
+
+def test_sampled_debug_is_skipped_when_debug_disabled(caplog: pytest.LogCaptureFixture):
+    caplog.set_level(logging.INFO, logger=LOGGER_NAME)
+
+    get_logger(LOGGER_NAME).sampled_debug("booking %s", Unformattable())
+
+    assert caplog.records == []
+
+
+@pytest.mark.parametrize(("rate", "expected"), [(1.0, 20), (0.0, 0)])
+def test_sampled_debug_rate(caplog: pytest.LogCaptureFixture, settings, rate: float, expected: int):
+    settings.SCHEDULER_LOG_SAMPLE_RATE = rate
+    caplog.set_level(logging.DEBUG, logger=LOGGER_NAME)
+    logger = get_logger(LOGGER_NAME)
+
+    for booking_id in range(20):
+        logger.sampled_debug("booking %s", booking_id)
+
+    assert len(caplog.records) == expected
+    if expected:
+        assert caplog.records[0].funcName == "test_sampled_debug_rate"
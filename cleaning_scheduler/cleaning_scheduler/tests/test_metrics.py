@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from cleaning_scheduler.cleaning_scheduler.cache import InstrumentedLocMemCache
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, ics_file
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetricsView:
+    def test_forbidden_for_regular_users(self, client: Client, user: User):
+        client.force_login(user)
+
+        assert client.get(reverse("metrics")).status_code == 403
+
+    def test_token_access(self, client: Client, settings):
+        settings.METRICS_TOKEN = "scrape-me"
+
+        response = client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-me")
+
+        assert response.status_code == 200
+        assert b"cleaning_scheduler_request_duration_seconds" in response.content
+
+    def test_request_latency_by_url_name(self, admin_client: Client):
+        before = sample("cleaning_scheduler_request_duration_seconds_count", url_name="scheduler:calendar", method="GET")
+
+        admin_client.get(reverse("scheduler:calendar"))
+
+        after = sample("cleaning_scheduler_request_duration_seconds_count", url_name="scheduler:calendar", method="GET")
+        assert after == before + 1
+        assert sample("cleaning_scheduler_request_db_queries_sum", url_name="scheduler:calendar") > 0
+
+
+def test_cache_hit_and_miss_counters():
+    cache = InstrumentedLocMemCache("metrics-test", {})
+    hits = sample("cleaning_scheduler_cache_requests_total", backend="locmem", result="hit")
+    misses = sample("cleaning_scheduler_cache_requests_total", backend="locmem", result="miss")
+
+    cache.set("present", 1)
+    assert cache.get("present") == 1
+    assert cache.get("absent", "default") == "default"
+    assert cache.get_many(["present", "absent"]) == {"present": 1}
+
+    assert sample("cleaning_scheduler_cache_requests_total", backend="locmem", result="hit") == hits + 2
+    assert sample("cleaning_scheduler_cache_requests_total", backend="locmem", result="miss") == misses + 2
+
+
+def test_ics_upload_records_import_size_and_stage_timings(client: Client, user: User):
+    apartment = ApartmentFactory(owner=user)
+    check_in = date.today() + timedelta(days=10)
+    upload = ics_file(apartment.name, [(check_in, check_in + timedelta(days=3), "Jane")])
+    imports = sample("cleaning_scheduler_ics_import_bytes_count")
+    stages = sample("cleaning_scheduler_scheduler_stage_duration_seconds_count", stage="assign")
+    client.force_login(user)
+
+    client.post(reverse("scheduler:calendar"), {"ics_file": upload})
+
+    assert sample("cleaning_scheduler_ics_import_bytes_count") == imports + 1
+    assert sample("cleaning_scheduler_ics_import_bytes_sum") >= upload.size
+    assert sample("cleaning_scheduler_scheduler_stage_duration_seconds_count", stage="assign") == stages + 1
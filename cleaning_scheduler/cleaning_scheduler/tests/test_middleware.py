@@ -0,0 +1,62 @@
+import marshal
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler.models import RequestProfile
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+class TestRequestProfilerMiddleware:
+    def test_untriggered_request_is_not_profiled(self, admin_client: Client):
+        response = admin_client.get(reverse("scheduler:calendar"))
+
+        assert response.status_code == 200
+        assert "X-Request-Profile" not in response
+        assert not RequestProfile.objects.exists()
+
+    def test_non_staff_flag_is_ignored(self, client: Client, user: User):
+        client.force_login(user)
+
+        client.get(reverse("scheduler:calendar"), HTTP_X_PROFILE_REQUEST="1")
+
+        assert not RequestProfile.objects.exists()
+
+    def test_cprofile_from_header(self, admin_client: Client):
+        response = admin_client.get(reverse("scheduler:calendar"), HTTP_X_PROFILE_REQUEST="1")
+
+        profile = RequestProfile.objects.get(id=response["X-Request-Profile"])
+        assert profile.mode == RequestProfile.MODE_CPROFILE
+        assert profile.status_code == 200
+        assert profile.query_count == len(profile.sql_timeline) > 0
+        assert isinstance(marshal.loads(bytes(profile.data)), dict)
+
+    def test_sampling_profile_from_query_flag(self, admin_client: Client, settings):
+        settings.REQUEST_PROFILER_SAMPLE_INTERVAL = 0.0001
+
+        response = admin_client.get(reverse("scheduler:calendar"), {"_profile": "sample"})
+
+        profile = RequestProfile.objects.get(id=response["X-Request-Profile"])
+        assert profile.mode == RequestProfile.MODE_SAMPLE
+        assert profile.filename.endswith(".folded")
+
+    def test_admin_download(self, admin_client: Client):
+        response = admin_client.get(reverse("scheduler:calendar"), HTTP_X_PROFILE_REQUEST="1")
+        profile = RequestProfile.objects.get(id=response["X-Request-Profile"])
+
+        download = admin_client.get(reverse("admin:cleaning_scheduler_requestprofile_download", args=[profile.id]))
+
+        assert download.status_code == 200
+        assert download.content == bytes(profile.data)
+
+    def test_admin_change_page(self, admin_client: Client):
+        response = admin_client.get(reverse("scheduler:calendar"), HTTP_X_PROFILE_REQUEST="1")
+        profile_id = response["X-Request-Profile"]
+
+        page = admin_client.get(reverse("admin:cleaning_scheduler_requestprofile_change", args=[profile_id]))
+
+        assert page.status_code == 200
+        assert f"request-profile-{profile_id}.prof" in page.content.decode()
@@ -0,0 +1,183 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cleaning_scheduler.cleaning_scheduler import utils
+from cleaning_scheduler.cleaning_scheduler.models import Booking, CleaningCrew, CleaningSchedule
+from cleaning_scheduler.cleaning_scheduler.preview import (
+    ADDED,
+    CANCELLED,
+    RESCHEDULED,
+    UPDATED,
+    ProposedBooking,
+    preview_calendar,
+    preview_schedule,
+)
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in, ics_file
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+def stored_state():
+    """Stored schedule of every booking, keyed by apartment and check-in."""
+    return {
+        (schedule.booking.apartment_id, schedule.booking.check_in_date): (
+            schedule.window_start, schedule.window_end, schedule.cleaning_date, schedule.crew_id,
+        )
+        for schedule in CleaningSchedule.objects.select_related("booking")
+    }
+
+
+def previewed_state(state, changes):
+    state = dict(state)
+    for change in changes:
+        if change.status in (CANCELLED, UPDATED):
+            state = {key: value for key, value in state.items() if value[:2] != change[9:11]}
+        if change.status != CANCELLED:
+            state[change.apartment_id, change.check_in_date] = change[5:9]
+    return state
+
+
+@pytest.fixture
+def portfolio(user: User):
+    """Two apartments with a few stays each, already scheduled."""
+    first, second = ApartmentFactory(owner=user), ApartmentFactory(owner=user)
+    bookings = [
+        BookingFactory(apartment=first, check_in_date=check_in(3), nights=2),
+        BookingFactory(apartment=first, check_in_date=check_in(8), nights=2),
+        BookingFactory(apartment=first, check_in_date=check_in(15), nights=3),
+        BookingFactory(apartment=second, check_in_date=check_in(4), nights=3),
+        BookingFactory(apartment=second, check_in_date=check_in(12), nights=2),
+    ]
+    utils.reschedule(user, check_in(-30), check_in(60))
+    return first, second, bookings
+
+
+@pytest.mark.parametrize("mode", [utils.MODE_OVERLAP, utils.MODE_CLUSTER, utils.MODE_CAPACITY])
+def test_calendar_preview_matches_the_import(user: User, portfolio, mode: str, settings):
+    settings.SCHEDULER_ASSIGNMENT_MODE = mode
+    CleaningCrew.objects.create(owner=user, name="Crew", daily_capacity=1)
+    first, _, _ = portfolio
+    upload = ics_file(first.name, [(check_in(5).date(), check_in(7).date(), "Ann"), (check_in(11).date(), check_in(13).date(), "Bob")])
+    before = stored_state()
+
+    with CaptureQueriesContext(connection) as queries:
+        changes = preview_calendar(user, upload.read())
+
+    assert [change.status for change in changes if change.booking_id is None] == [ADDED, ADDED]
+    assert all(query["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE")) for query in queries.captured_queries)
+    assert stored_state() == before
+
+    upload.seek(0)
+    utils.import_calendar(user, upload.read())
+
+    assert stored_state() == previewed_state(before, changes)
+
+
+def test_booking_without_a_schedule_row(user: User):
+    apartment = ApartmentFactory(owner=user)
+    pending = BookingFactory(apartment=apartment, check_in_date=check_in(3), nights=2)
+
+    changes = preview_schedule(user, added=[ProposedBooking(apartment.id, check_in(8), check_in(10))])
+
+    assert [(change.booking_id, change.status) for change in changes] == [(pending.id, RESCHEDULED), (None, ADDED)]
+    assert changes[0].window_end == check_in(8)
+    assert changes[0][9:] == (None, None, None, None)
+
+
+def test_preview_after_a_debounced_import(user: User, settings):
+    settings.SCHEDULER_DEBOUNCE_SECONDS = 60
+    apartment = ApartmentFactory(owner=user)
+    utils.import_calendar(user, ics_file(apartment.name, [(check_in(3).date(), check_in(5).date(), "Ann")]).read())
+    assert not CleaningSchedule.objects.exists()
+
+    changes = preview_calendar(user, ics_file(apartment.name, [(check_in(8).date(), check_in(10).date(), "Bob")]).read())
+
+    assert [change.status for change in changes] == [RESCHEDULED, ADDED]
+    assert changes[0].previous_window_start is None
+
+
+def test_cancellation_extends_the_previous_window(user: User, portfolio):
+    first, _, (stay, cancelled, following, *_) = portfolio
+    before = stored_state()
+
+    changes = preview_schedule(user, cancelled=[cancelled.id])
+
+    assert {change.booking_id: change.status for change in changes} == {stay.id: RESCHEDULED, cancelled.id: CANCELLED}
+    assert changes[0].window_end == following.check_in_date
+    assert changes[0].previous_window_end == cancelled.check_in_date
+    assert Booking.objects.filter(id=cancelled.id).exists()
+
+    cancelled.delete()
+    utils.update_cleaning_schedule(user, [cancelled])
+
+    assert stored_state() == previewed_state(before, changes)
+
+
+def test_move_to_another_apartment(user: User, portfolio):
+    first, second, (_, moved, *_) = portfolio
+    before = stored_state()
+    proposed = ProposedBooking(second.id, check_in(20), check_in(22) - timedelta(hours=4))
+
+    changes = preview_schedule(user, updated={moved.id: proposed})
+
+    assert [change.status for change in changes if change.booking_id == moved.id] == [UPDATED]
+
+    Booking.objects.filter(id=moved.id).update(apartment=second, check_in_date=proposed.check_in_date,
+                                               check_out_date=proposed.check_out_date)
+    utils.update_cleaning_schedule(user, [moved, Booking.objects.get(id=moved.id)])
+
+    assert stored_state() == previewed_state(before, changes)
+
+
+@pytest.mark.parametrize("days, nights, message", [(4, 2, "overlaps"), (-2, 1, "in the past")])
+def test_invalid_stays(user: User, portfolio, days: int, nights: int, message: str):
+    first, _, _ = portfolio
+
+    with pytest.raises(utils.CalendarImportError, match=message):
+        preview_schedule(user, added=[ProposedBooking(first.id, check_in(days), check_in(days + nights))])
+
+
+def test_other_owners_apartments(user: User):
+    apartment = ApartmentFactory()
+
+    with pytest.raises(utils.CalendarImportError, match="does not exist"):
+        preview_schedule(user, added=[ProposedBooking(apartment.id, check_in(3), check_in(5))])
+
+
+class TestPreviewAPI:
+    def test_calendar_preview(self, client: Client, user: User, portfolio):
+        client.force_login(user)
+        first, _, _ = portfolio
+        upload = ics_file(first.name, [(check_in(5).date(), check_in(7).date(), "Ann")])
+
+        response = client.post(reverse("calendar_preview"), {"ics_file": upload})
+
+        assert response.status_code == 200
+        assert [change["status"] for change in response.json() if change["booking"] is None] == [ADDED]
+        assert Booking.objects.count() == 5
+
+    def test_booking_preview(self, client: Client, user: User, portfolio):
+        client.force_login(user)
+        _, _, (_, cancelled, *_) = portfolio
+
+        response = client.post(reverse("calendar_preview_booking"), {"booking": cancelled.id, "cancel": True},
+                               content_type="application/json")
+
+        assert response.status_code == 200
+        assert {change["status"] for change in response.json()} == {CANCELLED, RESCHEDULED}
+
+    def test_invalid_booking(self, client: Client, user: User, portfolio):
+        client.force_login(user)
+        first, _, _ = portfolio
+
+        response = client.post(reverse("calendar_preview_booking"), {
+            "apartment": first.id, "check_in_date": check_in(4), "check_out_date": check_in(6),
+        }, content_type="application/json")
+
+        assert response.status_code == 400
@@ -0,0 +1,103 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from cleaning_scheduler.cleaning_scheduler.models import Booking
+from cleaning_scheduler.cleaning_scheduler.routers import (
+    ReplicaReadMixin,
+    is_pinned,
+    pin_to_primary,
+    read_from_replica,
+    replica_reads,
+)
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def replica(settings):
+    settings.DATABASES = {**settings.DATABASES, "replica": settings.DATABASES["default"]}
+    return "replica"
+
+
+@read_from_replica
+def booking_db_view(request):
+    return HttpResponse(Booking.objects.all().db)
+
+
+class BookingDbAPIView(ReplicaReadMixin, APIView):
+    def get(self, request):
+        return Response({"db": Booking.objects.all().db, "user": request.user.pk})
+
+
+def test_reads_use_default_outside_replica_block(replica):
+    assert Booking.objects.all().db == "default"
+
+
+def test_replica_block_routes_reads_but_not_writes(replica):
+    with replica_reads():
+        assert Booking.objects.all().db == replica
+        assert router.db_for_write(Booking) == "default"
+
+
+def test_no_replica_configured():
+    with replica_reads():
+        assert Booking.objects.all().db == "default"
+
+
+class TestReadFromReplica:
+    def test_safe_request_reads_from_replica(self, replica, rf: RequestFactory, user: User):
+        request = rf.get("/")
+        request.user = user
+
+        assert booking_db_view(request).content == b"replica"
+
+    def test_pinned_user_reads_own_writes(self, replica, rf: RequestFactory, user: User):
+        pin_to_primary(user)
+        request = rf.get("/")
+        request.user = user
+
+        assert booking_db_view(request).content == b"default"
+
+    def test_unsafe_request_uses_default(self, replica, rf: RequestFactory, user: User):
+        request = rf.post("/")
+        request.user = user
+
+        assert booking_db_view(request).content == b"default"
+
+
+def test_write_requests_pin_the_user(client, user: User):
+    client.force_login(user)
+    assert not is_pinned(user)
+
+    client.post(reverse("scheduler:calendar"))
+
+    assert is_pinned(user)
+    assert not is_pinned(AnonymousUser())
+
+
+class TestReplicaReadMixin:
+    def get(self, rf: RequestFactory, user: User):
+        token = Token.objects.create(user=user)
+        request = rf.get("/", HTTP_AUTHORIZATION=f"Token {token.key}")
+        return BookingDbAPIView.as_view()(request).data
+
+    def test_token_user_reads_from_replica(self, replica, rf: RequestFactory, user: User):
+        assert self.get(rf, user) == {"db": replica, "user": user.pk}
+
+    def test_pinned_token_user_reads_own_writes(self, replica, rf: RequestFactory, user: User):
+        pin_to_primary(user)
+
+        assert self.get(rf, user) == {"db": "default", "user": user.pk}
+
+    def test_replica_block_ends_with_the_view(self, replica, rf: RequestFactory, user: User):
+        self.get(rf, user)
+
+        assert Booking.objects.all().db == "default"
@@ -0,0 +1,389 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from django.db import DatabaseError, connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from cleaning_scheduler.cleaning_scheduler.directory import get_directory
+from cleaning_scheduler.cleaning_scheduler.models import Apartment, Booking, CleaningSchedule, RescheduleCheckpoint
+from cleaning_scheduler.cleaning_scheduler import utils
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in, ics_file
+from cleaning_scheduler.cleaning_scheduler.utils import (
+    BookingError,
+    CalendarImportError,
+    cancel_booking,
+    claim_due_checkpoints,
+    compute_cleaning_windows,
+    import_calendar,
+    lock_apartments,
+    queue_reschedule,
+    reschedule,
+    resume_checkpoints,
+    run_checkpoint,
+    update_cleaning_schedule,
+    update_booking,
+)
+from cleaning_scheduler.users.models import User
+from cleaning_scheduler.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_compute_cleaning_windows():
+    day = datetime(2030, 1, 1)
+    bookings = [
+        (1, 10, day.replace(day=1, hour=15), day.replace(day=3, hour=11)),
+        (2, 10, day.replace(day=5, hour=15), day.replace(day=7, hour=11)),
+        (3, 20, day.replace(day=2, hour=15), day.replace(day=4, hour=11)),
+    ]
+
+    windows = compute_cleaning_windows(bookings, next_check_ins={20: day.replace(day=9, hour=15)})
+
+    assert windows == {
+        1: (day.replace(day=3, hour=11), day.replace(day=5, hour=15)),
+        2: (day.replace(day=7, hour=11), None),
+        3: (day.replace(day=4, hour=11), day.replace(day=9, hour=15)),
+    }
+
+
+class TestReschedule:
+    def test_windows_and_cleaning_dates(self, user: User):
+        apartment = ApartmentFactory(owner=user)
+        first = BookingFactory(apartment=apartment, check_in_date=check_in(5), nights=2)
+        second = BookingFactory(apartment=apartment, check_in_date=check_in(9), nights=2)
+
+        changes = reschedule(user, check_in(-30), check_in(60))
+
+        assert changes["bookings"] == 2
+        assert changes["windows_created"] == 2
+        first_schedule = CleaningSchedule.objects.get(booking=first)
+        assert (first_schedule.window_start, first_schedule.window_end) == (
+            first.check_out_date,
+            second.check_in_date,
+        )
+        assert first_schedule.cleaning_date == second.check_in_date
+        assert CleaningSchedule.objects.get(booking=second).cleaning_date == second.check_out_date
+
+    def test_overlapping_windows_share_the_latest_start(self, user: User):
+        first = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(5), nights=2)
+        BookingFactory(apartment=first.apartment, check_in_date=check_in(12))
+        second = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(6), nights=2)
+        BookingFactory(apartment=second.apartment, check_in_date=check_in(10))
+
+        reschedule(user, check_in(-30), check_in(60))
+
+        assert CleaningSchedule.objects.get(booking=first).cleaning_date == second.check_out_date
+        assert CleaningSchedule.objects.get(booking=second).cleaning_date == second.check_out_date
+
+    def test_window_end_found_past_range(self, user: User):
+        apartment = ApartmentFactory(owner=user)
+        first = BookingFactory(apartment=apartment, check_in_date=check_in(5), nights=2)
+        later = BookingFactory(apartment=apartment, check_in_date=check_in(90))
+
+        reschedule(user, check_in(4), check_in(15))
+
+        assert CleaningSchedule.objects.get(booking=first).window_end == later.check_in_date
+
+    def test_other_owners_are_untouched(self, user: User):
+        BookingFactory(apartment=ApartmentFactory(owner=user))
+        other = BookingFactory()
+
+        reschedule(user, check_in(-30), check_in(30))
+
+        assert not CleaningSchedule.objects.filter(booking=other).exists()
+
+
+class TestImportCalendar:
+    def test_creates_bookings_and_schedule(self, user: User):
+        apartment = ApartmentFactory(owner=user)
+        first, second = check_in(3).date(), check_in(10).date()
+        upload = ics_file(apartment.name, [(first, first + timedelta(days=2), "Ann"), (second, second + timedelta(days=2), "Bob")])
+
+        bookings = import_calendar(user, upload.read())
+
+        assert [booking.guest_name for booking in bookings] == ["Ann", "Bob"]
+        assert CleaningSchedule.objects.get(booking=bookings[0]).cleaning_date == bookings[1].check_in_date
+        assert not RescheduleCheckpoint.objects.exists()
+
+    def test_checkpoint_commits_with_the_bookings(self, user: User, monkeypatch):
+        apartment = ApartmentFactory(owner=user)
+        day = check_in(3).date()
+
+        def crash(checkpoint, chunk_size=None):
+            raise DatabaseError("connection lost")
+
+        monkeypatch.setattr(utils, "run_checkpoint", crash)
+        with pytest.raises(DatabaseError):
+            import_calendar(user, ics_file(apartment.name, [(day, day + timedelta(days=2), "Ann")]).read())
+
+        booking = Booking.objects.get()
+        assert not CleaningSchedule.objects.exists()
+        checkpoint = RescheduleCheckpoint.objects.get()
+        assert checkpoint.due is None
+        assert checkpoint.apartment_ids == [apartment.id]
+
+        monkeypatch.undo()
+        RescheduleCheckpoint.objects.update(updated=datetime.now() - timedelta(hours=1))
+        assert resume_checkpoints(timedelta(minutes=5))["checkpoints"] == 1
+        assert CleaningSchedule.objects.get(booking=booking).cleaning_date == booking.check_out_date
+
+    def test_invalid_event_rolls_back_the_whole_calendar(self, user: User):
+        apartment = ApartmentFactory(owner=user)
+        day = check_in(3).date()
+        upload = ics_file(apartment.name, [(day, day + timedelta(days=2), "Ann"), (day, day + timedelta(days=1), "Bob")])
+
+        with pytest.raises(CalendarImportError, match="overlaps"):
+            import_calendar(user, upload.read())
+
+        assert not Booking.objects.exists()
+
+    def test_unknown_apartment(self, user: User):
+        with pytest.raises(CalendarImportError, match="does not exist"):
+            import_calendar(user, ics_file("Nowhere", []).read())
+
+    def test_locks_the_apartment_row(self, user: User):
+        apartment = ApartmentFactory(owner=user)
+        day = check_in(3).date()
+        get_directory(user.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            import_calendar(user, ics_file(apartment.name, [(day, day + timedelta(days=2), "Ann")]).read())
+
+        statements = [query["sql"] for query in queries if not query["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+        assert statements[0].endswith("FOR UPDATE")
+        assert any("pg_advisory_xact_lock" in sql for sql in statements)
+
+
+def scheduled(user):
+    """Stored window and cleaning date of every booking, after a full reschedule when ``user`` is given."""
+    if user is not None:
+        reschedule(user, check_in(-60), check_in(120))
+    return {
+        booking_id: (window_start, window_end, cleaning_date)
+        for booking_id, window_start, window_end, cleaning_date in CleaningSchedule.objects.values_list(
+            "booking_id", "window_start", "window_end", "cleaning_date")
+    }
+
+
+def make_stays(user, later_stays=0):
+    """Four stays in one apartment and one in another, plus ``later_stays`` in the first, fully scheduled."""
+    apartment, other = ApartmentFactory(owner=user), ApartmentFactory(owner=user)
+    bookings = [BookingFactory(apartment=apartment, check_in_date=check_in(days), nights=2) for days in (3, 7, 12, 20)]
+    bookings.append(BookingFactory(apartment=other, check_in_date=check_in(8), nights=3))
+    for days in range(later_stays):
+        BookingFactory(apartment=apartment, check_in_date=check_in(30 + 2 * days), nights=1)
+    reschedule(user, check_in(-60), check_in(120))
+    return bookings
+
+
+@pytest.fixture
+def stays(user: User):
+    return make_stays(user)
+
+
+class TestUpdateBooking:
+    def test_move_later_matches_a_full_reschedule(self, user: User, stays):
+        first, moved, third, fourth, _ = stays
+
+        update_booking(user, moved.id, check_in_date=check_in(16), check_out_date=check_in(18) - timedelta(hours=4))
+
+        assert CleaningSchedule.objects.get(booking=first).window_end == third.check_in_date
+        assert CleaningSchedule.objects.get(booking=third).window_end == check_in(16)
+        assert scheduled(None) == scheduled(user)
+
+    def test_move_to_another_apartment(self, user: User, stays):
+        moved, other = stays[1], stays[4]
+
+        update_booking(user, moved.id, apartment_id=other.apartment_id, check_in_date=check_in(14),
+                       check_out_date=check_in(16) - timedelta(hours=4))
+
+        assert CleaningSchedule.objects.get(booking=other).window_end == check_in(14)
+        assert scheduled(None) == scheduled(user)
+
+    def test_overlap_is_rejected(self, user: User, stays):
+        with pytest.raises(BookingError, match="overlaps"):
+            update_booking(user, stays[1].id, check_in_date=check_in(12), check_out_date=check_in(14))
+
+    def test_guest_change_does_not_reschedule(self, user: User, stays):
+        with CaptureQueriesContext(connection) as queries:
+            update_booking(user, stays[1].id, guest_name="Zoe")
+
+        assert not any("cleaningschedule" in query["sql"] for query in queries)
+        assert Booking.objects.get(id=stays[1].id).guest_name == "Zoe"
+
+    def test_queries_do_not_grow_with_the_bookings(self, user: User, stays):
+        busy = UserFactory()
+        busy_stays = make_stays(busy, later_stays=40)
+        queries = {}
+        for owner, bookings in ((user, stays), (busy, busy_stays)):
+            with CaptureQueriesContext(connection) as queries[owner]:
+                update_booking(owner, bookings[1].id, check_in_date=check_in(16), check_out_date=check_in(18))
+
+        assert len(queries[busy]) == len(queries[user])
+
+
+class TestCancelBooking:
+    def test_extends_the_previous_window(self, user: User, stays):
+        first, cancelled, third, *_ = stays
+
+        cancel_booking(user, cancelled.id)
+
+        assert not Booking.objects.filter(id=cancelled.id).exists()
+        assert CleaningSchedule.objects.get(booking=first).window_end == third.check_in_date
+        assert scheduled(None) == scheduled(user)
+
+    def test_other_owners_booking(self, user: User):
+        with pytest.raises(BookingError, match="does not exist"):
+            cancel_booking(user, BookingFactory().id)
+
+
+class TestBookingAPI:
+    def test_update(self, client: Client, user: User, stays):
+        client.force_login(user)
+        moved = stays[1]
+
+        response = client.patch(reverse("booking_update", kwargs={"id": moved.id}), {
+            "check_in_date": check_in(16), "check_out_date": check_in(18),
+        }, content_type="application/json")
+
+        assert response.status_code == 200
+        assert CleaningSchedule.objects.get(booking=stays[2]).window_end == check_in(16)
+
+    def test_update_into_another_owners_apartment(self, client: Client, user: User, stays):
+        client.force_login(user)
+
+        response = client.patch(reverse("booking_update", kwargs={"id": stays[1].id}), {
+            "apartment": ApartmentFactory().id,
+        }, content_type="application/json")
+
+        assert response.status_code == 400
+
+    def test_cancel(self, client: Client, user: User, stays):
+        client.force_login(user)
+
+        response = client.delete(reverse("booking_cancel", kwargs={"id": stays[1].id}))
+
+        assert response.status_code == 204
+        assert CleaningSchedule.objects.get(booking=stays[0]).window_end == stays[2].check_in_date
+
+    def test_cancel_another_owners_booking(self, client: Client, user: User):
+        client.force_login(user)
+
+        response = client.delete(reverse("booking_cancel", kwargs={"id": BookingFactory().id}))
+
+        assert response.status_code == 404
+
+
+class TestRunCheckpoint:
+    def test_chunks_record_progress(self, user: User, settings, monkeypatch: pytest.MonkeyPatch):
+        settings.SCHEDULER_APARTMENT_CHUNK_SIZE = 1
+        bookings = [BookingFactory(apartment=ApartmentFactory(owner=user)) for _ in range(3)]
+        checkpoint = RescheduleCheckpoint.objects.create(
+            owner=user,
+            date_min=check_in(-30),
+            date_max=check_in(30),
+            apartment_ids=[booking.apartment_id for booking in bookings],
+        )
+        saved = []
+        original_save = RescheduleCheckpoint.save
+
+        def save(self, *args, **kwargs):
+            saved.append(list(self.apartment_ids))
+            original_save(self, *args, **kwargs)
+
+        monkeypatch.setattr(RescheduleCheckpoint, "save", save)
+        changes = run_checkpoint(checkpoint)
+
+        assert saved == [[bookings[1].apartment_id, bookings[2].apartment_id], [bookings[2].apartment_id], []]
+        assert changes["windows_created"] == 3
+        assert changes["cleaning_dates_updated"] == 3
+        assert not RescheduleCheckpoint.objects.exists()
+
+    def test_resume_only_stale_checkpoints(self, user: User):
+        booking = BookingFactory(apartment=ApartmentFactory(owner=user))
+        checkpoint = RescheduleCheckpoint.objects.create(
+            owner=user, date_min=check_in(-30), date_max=check_in(30), apartment_ids=[booking.apartment_id]
+        )
+
+        assert resume_checkpoints(timedelta(minutes=5))["checkpoints"] == 0
+
+        RescheduleCheckpoint.objects.filter(id=checkpoint.id).update(updated=datetime.now() - timedelta(hours=1))
+        changes = resume_checkpoints(timedelta(minutes=5))
+
+        assert changes["checkpoints"] == 1
+        assert CleaningSchedule.objects.get(booking=booking).cleaning_date == booking.check_out_date
+        assert not RescheduleCheckpoint.objects.exists()
+
+
+class TestQueueReschedule:
+    @pytest.fixture(autouse=True)
+    def debounce(self, settings):
+        settings.SCHEDULER_DEBOUNCE_SECONDS = 5
+        settings.SCHEDULER_MAX_DELAY_SECONDS = 60
+
+    def test_burst_is_coalesced(self, user: User):
+        first = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(5))
+        second = BookingFactory(apartment=ApartmentFactory(owner=user), check_in_date=check_in(40))
+        coalesced = REGISTRY.get_sample_value("cleaning_scheduler_reschedule_requests_total", {"result": "coalesced"}) or 0
+
+        update_cleaning_schedule(user, [first])
+        update_cleaning_schedule(user, [second])
+
+        checkpoint = RescheduleCheckpoint.objects.get()
+        assert checkpoint.apartment_ids == [first.apartment_id, second.apartment_id]
+        assert (checkpoint.date_min, checkpoint.date_max) == (check_in(-25), second.check_out_date + timedelta(days=30))
+        assert not CleaningSchedule.objects.exists()
+        assert REGISTRY.get_sample_value("cleaning_scheduler_reschedule_requests_total", {"result": "coalesced"}) == coalesced + 1
+
+    def test_due_is_capped_by_the_maximum_delay(self, user: User):
+        apartment = ApartmentFactory(owner=user)
+        queue_reschedule(user, check_in(1), check_in(2), [apartment.id])
+        RescheduleCheckpoint.objects.update(created=datetime.now() - timedelta(seconds=58))
+
+        queue_reschedule(user, check_in(1), check_in(2), [apartment.id])
+
+        checkpoint = RescheduleCheckpoint.objects.get()
+        assert checkpoint.due == checkpoint.created + timedelta(seconds=60)
+
+    def test_claim_only_due_checkpoints(self, user: User):
+        apartment = ApartmentFactory(owner=user)
+        queue_reschedule(user, check_in(1), check_in(2), [apartment.id])
+        assert claim_due_checkpoints(limit=10) == []
+        RescheduleCheckpoint.objects.update(due=datetime.now())
+
+        claimed = claim_due_checkpoints(limit=10)
+
+        assert claimed == [(RescheduleCheckpoint.objects.get().id, user.id)]
+        assert claim_due_checkpoints(limit=10) == []
+        # Requests after the claim queue a new checkpoint
+        queue_reschedule(user, check_in(1), check_in(2), [apartment.id])
+        assert RescheduleCheckpoint.objects.filter(due__isnull=False).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lock_apartments_only_blocks_the_locked_rows():
+    locked, free = ApartmentFactory(), ApartmentFactory()
+    results = {}
+
+    def try_lock(apartment_id):
+        try:
+            with transaction.atomic():
+                results[apartment_id] = Apartment.objects.select_for_update(nowait=True).filter(id=apartment_id).exists()
+        except DatabaseError:
+            results[apartment_id] = "locked"
+        finally:
+            connection.close()
+
+    with transaction.atomic():
+        assert lock_apartments([locked.id]) == [locked.id]
+        threads = [threading.Thread(target=try_lock, args=(apartment.id,)) for apartment in (locked, free)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert results == {locked.id: "locked", free.id: True}
@@ -0,0 +1,97 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from cleaning_scheduler.cleaning_scheduler import utils, vectorized
+from cleaning_scheduler.cleaning_scheduler.models import Booking, CleaningSchedule
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, BookingFactory, check_in
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+START = datetime(2030, 1, 1, 11)
+
+
+def random_bookings(rng, apartments, overlapping=False):
+    """``(id, apartment_id, check_in, check_out)`` rows sorted like ``calculate_cleaning_windows`` loads them."""
+    rows = []
+    for apartment_id in range(1, apartments + 1):
+        day = rng.randint(0, 5)
+        for _ in range(rng.randint(0, 8)):
+            nights = rng.randint(1, 6)
+            check_in_date = START + timedelta(days=day, hours=4)
+            rows.append((len(rows) + 1, apartment_id, check_in_date, START + timedelta(days=day + nights)))
+            day += nights + (rng.randint(-3, 1) if overlapping else rng.randint(0, 3))
+    return sorted(rows, key=lambda row: (row[1], row[3]))
+
+
+def as_arrays(bookings):
+    booking_ids, apartment_ids, check_ins, check_outs = zip(*bookings)
+    return (
+        np.array(booking_ids),
+        np.array(apartment_ids),
+        np.array(check_ins, dtype="datetime64[us]").astype(np.int64),
+        np.array(check_outs, dtype="datetime64[us]").astype(np.int64),
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("overlapping", [False, True])
+def test_windows_match_reference(seed: int, overlapping: bool):
+    rng = random.Random(seed)
+    bookings = random_bookings(rng, apartments=30, overlapping=overlapping)
+    next_check_ins = {apartment_id: START + timedelta(days=90) for apartment_id in range(1, 30, 2)}
+
+    assert vectorized.cleaning_windows(*as_arrays(bookings), next_check_ins) == utils.compute_cleaning_windows(
+        bookings, next_check_ins
+    )
+
+
+def test_windows_loaded_as_epochs_match_reference(user: User):
+    apartment = ApartmentFactory(owner=user)
+    for days in (3, 9, 20):
+        BookingFactory(apartment=apartment, check_in_date=check_in(days), nights=2)
+    bookings = Booking.objects.order_by("apartment_id", "check_out_date").values_list(
+        "id", "apartment_id", "check_in_date", "check_out_date"
+    )
+    next_check_ins = {apartment.id: check_in(40)}
+
+    assert vectorized.compute_cleaning_windows(bookings, next_check_ins) == utils.compute_cleaning_windows(
+        bookings, next_check_ins
+    )
+
+
+def test_empty_windows():
+    assert vectorized.compute_cleaning_windows(Booking.objects.none()) == {}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_overlap_assignment_matches_reference(user: User, seed: int):
+    rng = random.Random(seed)
+    apartments = [ApartmentFactory(owner=user) for _ in range(4)]
+    for index in range(40):
+        booking = BookingFactory(apartment=rng.choice(apartments), check_in_date=check_in(index))
+        start = datetime.combine(check_in(rng.randint(0, 40)).date(), START.time())
+        end = None if rng.random() < 0.1 else start + timedelta(days=rng.randint(0, 6), hours=4)
+        CleaningSchedule.objects.create(booking=booking, window_start=start, window_end=end)
+    date_min, date_max = check_in(5), check_in(30)
+
+    overlaps = utils.find_cleaning_overlaps(user, date_min, date_max)
+    expected = utils.assign_cleaning_dates(user, overlaps, date_min, date_max)
+
+    assert vectorized.assign_overlapping_cleaning_dates(user, date_min, date_max) == expected
+
+
+def test_reschedule_with_numpy_backend(user: User, settings):
+    apartment = ApartmentFactory(owner=user)
+    first = BookingFactory(apartment=apartment, check_in_date=check_in(5), nights=2)
+    second = BookingFactory(apartment=apartment, check_in_date=check_in(9), nights=2)
+    settings.SCHEDULER_BACKEND = utils.BACKEND_NUMPY
+
+    changes = utils.reschedule(user, check_in(-30), check_in(60))
+
+    assert changes["windows_created"] == 2
+    assert CleaningSchedule.objects.get(booking=first).cleaning_date == second.check_in_date
+    assert CleaningSchedule.objects.get(booking=second).cleaning_date == second.check_out_date
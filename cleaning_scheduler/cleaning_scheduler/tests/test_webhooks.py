@@ -0,0 +1,292 @@
+import hashlib
+import hmac
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from cleaning_scheduler.cleaning_scheduler import webhooks
+from cleaning_scheduler.cleaning_scheduler.addresses import is_public
+from cleaning_scheduler.cleaning_scheduler.models import CleaningSchedule, WebhookEndpoint, WebhookEvent
+from cleaning_scheduler.cleaning_scheduler.tests.factories import ApartmentFactory, check_in, ics_file
+from cleaning_scheduler.cleaning_scheduler.utils import import_calendar
+from cleaning_scheduler.cleaning_scheduler.webhooks import claim_batches, deliver_batch
+from cleaning_scheduler.management.commands import deliver_webhooks
+from cleaning_scheduler.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+class Receiver(ThreadingHTTPServer):
+    """Local stand-in for a vendor's webhook URL, answering ``status`` and recording the requests."""
+
+    def __init__(self):
+        self.status = 200
+        self.requests = []
+        # Bytes sent instead of a well-formed answer when set
+        self.raw = None
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(handler):
+                body = handler.rfile.read(int(handler.headers["Content-Length"]))
+                self.requests.append((dict(handler.headers), body))
+                if self.raw is not None:
+                    handler.wfile.write(self.raw)
+                    return
+                handler.send_response(self.status)
+                if 300 <= self.status < 400:
+                    handler.send_header("Location", self.url)
+                handler.end_headers()
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/hook"
+
+
+@pytest.fixture
+def receiver():
+    server = Receiver()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def endpoint(user: User, receiver, settings):
+    # The local receiver listens on the loopback interface
+    settings.WEBHOOK_ALLOW_PRIVATE_HOSTS = True
+    return WebhookEndpoint.objects.create(owner=user, url=receiver.url)
+
+
+def import_stays(user, count, first_day=3):
+    apartment = ApartmentFactory(owner=user)
+    stays = [(check_in(first_day + 3 * n).date(), check_in(first_day + 3 * n + 2).date(), f"Guest {n}") for n in range(count)]
+    import_calendar(user, ics_file(apartment.name, stays).read())
+
+
+def test_large_import_is_sent_in_one_signed_request(user: User, endpoint, receiver):
+    import_stays(user, 40)
+
+    batches = claim_batches(limit=10)
+    delivered = [deliver_batch(batch.batch_id) for batch in batches]
+
+    assert delivered == [True]
+    (headers, body), = receiver.requests
+    expected = hmac.new(endpoint.secret.encode(), f"{headers['X-Webhook-Timestamp']}.".encode() + body,
+                        hashlib.sha256).hexdigest()
+    assert headers["X-Webhook-Signature"] == f"sha256={expected}"
+    changes = json.loads(body)["changes"]
+    assert sorted(change["id"] for change in changes) == sorted(CleaningSchedule.objects.values_list("id", flat=True))
+    assert not WebhookEvent.objects.exists()
+
+
+def test_other_owners_changes_are_not_queued(user: User, endpoint):
+    import_stays(ApartmentFactory().owner, 3)
+
+    assert not WebhookEvent.objects.exists()
+
+
+def test_batches_respect_endpoint_concurrency(user: User, endpoint, settings):
+    settings.WEBHOOK_BATCH_SIZE = 10
+    import_stays(user, 20)
+
+    first = claim_batches(limit=10)
+    assert len(first) == 1 and claim_batches(limit=10) == []
+
+    endpoint.max_concurrency = 3
+    endpoint.save()
+    assert len(claim_batches(limit=10)) == 2
+
+
+def test_failed_delivery_is_retried_with_backoff(user: User, endpoint, receiver):
+    import_stays(user, 3)
+    receiver.status = 500
+    failures = REGISTRY.get_sample_value("cleaning_scheduler_webhook_deliveries_total", {"result": "failed"}) or 0
+
+    batch, = claim_batches(limit=10)
+    assert deliver_batch(batch.batch_id) is False
+
+    endpoint.refresh_from_db()
+    assert endpoint.failures == 1 and endpoint.retry_at > datetime.now()
+    assert REGISTRY.get_sample_value("cleaning_scheduler_webhook_deliveries_total", {"result": "failed"}) == failures + 1
+    assert claim_batches(limit=10) == []
+    assert WebhookEvent.objects.filter(batch__isnull=True).count() == WebhookEvent.objects.count() > 0
+
+    receiver.status = 204
+    WebhookEndpoint.objects.filter(id=endpoint.id).update(retry_at=datetime.now() - timedelta(seconds=1))
+    batch, = claim_batches(limit=10)
+    assert deliver_batch(batch.batch_id) is True
+    endpoint.refresh_from_db()
+    assert (endpoint.failures, endpoint.retry_at) == (0, None)
+
+
+@pytest.mark.parametrize("broken", ["malformed_answer", "invalid_url"])
+def test_malformed_answers_and_urls_are_failed_deliveries(user: User, endpoint, receiver, broken: str):
+    import_stays(user, 2)
+    if broken == "malformed_answer":
+        receiver.raw = b"garbage\r\n\r\n"
+    else:
+        WebhookEndpoint.objects.filter(id=endpoint.id).update(url="http://[::1/hook")
+
+    batch, = claim_batches(limit=10)
+    assert deliver_batch(batch.batch_id) is False
+
+    endpoint.refresh_from_db()
+    assert endpoint.failures == 1 and endpoint.retry_at > datetime.now()
+    assert WebhookEvent.objects.filter(batch__isnull=True).count() == WebhookEvent.objects.count() > 0
+
+
+def test_redirects_are_not_followed(user: User, endpoint, receiver):
+    import_stays(user, 2)
+    receiver.status = 307
+
+    batch, = claim_batches(limit=10)
+
+    assert deliver_batch(batch.batch_id) is False
+    assert len(receiver.requests) == 1
+
+
+def test_private_hosts_are_refused_at_delivery(user: User, endpoint, receiver, settings):
+    import_stays(user, 2)
+    settings.WEBHOOK_ALLOW_PRIVATE_HOSTS = False
+
+    batch, = claim_batches(limit=10)
+
+    assert deliver_batch(batch.batch_id) is False
+    assert receiver.requests == []
+    endpoint.refresh_from_db()
+    assert endpoint.failures == 1
+
+
+@pytest.mark.parametrize("address, public", [
+    ("93.184.216.34", True),
+    ("2606:2800:220:1::1", True),
+    ("127.0.0.1", False),
+    ("10.1.2.3", False),
+    ("169.254.169.254", False),
+    ("::1", False),
+    ("fe80::1", False),
+    ("::ffff:127.0.0.1", False),
+    ("224.0.0.1", False),
+])
+def test_is_public(address: str, public: bool):
+    assert is_public(address) is public
+
+
+def test_endpoint_is_deactivated_after_repeated_failures(user: User, endpoint, receiver, settings):
+    settings.WEBHOOK_MAX_FAILURES = 2
+    import_stays(user, 2)
+    receiver.status = 503
+
+    for _ in range(2):
+        WebhookEndpoint.objects.filter(id=endpoint.id).update(retry_at=None)
+        batch, = claim_batches(limit=10)
+        deliver_batch(batch.batch_id)
+
+    endpoint.refresh_from_db()
+    assert not endpoint.active
+
+
+def test_expired_leases_are_claimed_again(user: User, endpoint):
+    import_stays(user, 2)
+    claim_batches(limit=10)
+
+    WebhookEvent.objects.update(leased_until=datetime.now() - timedelta(seconds=1))
+
+    assert len(claim_batches(limit=10)) == 1
+
+
+def test_deliver_webhooks_command(user: User, endpoint, receiver, settings):
+    settings.WEBHOOK_BATCH_SIZE = 5
+    endpoint.max_concurrency = 2
+    endpoint.save()
+    import_stays(user, 12)
+
+    call_command("deliver_webhooks", "--once", "--workers", "0")
+
+    assert len(receiver.requests) > 1
+    assert not WebhookEvent.objects.exists()
+
+
+def test_deliver_webhooks_command_survives_errors(user: User, endpoint, receiver, monkeypatch):
+    other = WebhookEndpoint.objects.create(owner=user, url=receiver.url)
+    import_stays(user, 2)
+    deliver = webhooks.deliver_batch
+
+    def deliver_batch(batch_id):
+        if WebhookEvent.objects.filter(batch=batch_id, endpoint=endpoint).exists():
+            raise RuntimeError("payload bug")
+        return deliver(batch_id)
+
+    monkeypatch.setattr(deliver_webhooks, "deliver_batch", deliver_batch)
+    out = StringIO()
+
+    call_command("deliver_webhooks", "--once", "--workers", "0", stdout=out)
+
+    assert "delivered 1 webhook batches, 1 failed" in out.getvalue()
+    assert not WebhookEvent.objects.filter(endpoint=other).exists()
+    assert WebhookEvent.objects.filter(endpoint=endpoint).exists()
+
+
+class TestWebhookAPI:
+    def test_create_and_list(self, client: Client, user: User):
+        client.force_login(user)
+
+        created = client.post(reverse("webhooks_list_create"), {"url": "https://vendor.example/hook"},
+                              content_type="application/json")
+        listed = client.get(reverse("webhooks_list_create")).json()
+
+        assert created.status_code == 201
+        assert len(created.json()["secret"]) == 64
+        assert [endpoint["url"] for endpoint in listed["results"]] == ["https://vendor.example/hook"]
+
+    @pytest.mark.parametrize("url", [
+        "ftp://vendor.example/hook",
+        "file:///etc/passwd",
+        "http://127.0.0.1:8000/hook",
+        "http://169.254.169.254/latest/meta-data/",
+        "http://[::1]/hook",
+        "http://10.0.0.5/hook",
+        "http://localhost/hook",
+    ])
+    def test_unsafe_urls_are_refused(self, client: Client, user: User, url: str):
+        client.force_login(user)
+
+        response = client.post(reverse("webhooks_list_create"), {"url": url}, content_type="application/json")
+
+        assert response.status_code == 400
+        assert "url" in response.json()
+        assert not WebhookEndpoint.objects.exists()
+
+    def test_reactivation_clears_backoff(self, client: Client, user: User):
+        client.force_login(user)
+        endpoint = WebhookEndpoint.objects.create(owner=user, url="https://vendor.example/hook", active=False,
+                                                  failures=20, retry_at=datetime.now() + timedelta(hours=1))
+
+        response = client.patch(reverse("webhook_detail", kwargs={"id": endpoint.id}), {"active": True},
+                                content_type="application/json")
+
+        assert response.status_code == 200
+        assert response.json()["failures"] == 0 and response.json()["retry_at"] is None
+
+    def test_other_users_endpoints(self, client: Client, user: User):
+        client.force_login(user)
+        endpoint = WebhookEndpoint.objects.create(owner=ApartmentFactory().owner, url="https://vendor.example/hook")
+
+        response = client.get(reverse("webhook_detail", kwargs={"id": endpoint.id}))
+
+        assert response.status_code == 404
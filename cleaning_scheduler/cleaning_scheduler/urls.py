@@ -7,7 +7,9 @@ from cleaning_scheduler.cleaning_scheduler.views import (
     apartment_list_view,
     apartment_create_view,
     calendar_view,
-    cleaning_schedule_view
+    cleaning_schedule_view,
+    dashboard_view,
+    live_updates_view,
     )
 app_name = "scheduler"
 urlpatterns = [
@@ -18,4 +20,6 @@ urlpatterns = [
     path("apartments/<int:id>", view=apartment_detail_view, name="apartments_detail"),
     path("calendar/", view=calendar_view, name="calendar"),
     path('cleaning-schedule/', cleaning_schedule_view, name='cleaning_schedule'),
+    path('dashboard/', dashboard_view, name='dashboard'),
+    path('live/', live_updates_view, name='live_updates'),
 ]
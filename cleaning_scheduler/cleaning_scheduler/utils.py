@@ -1,11 +1,29 @@
-from .models import Apartment, Booking, CleaningSchedule
-from datetime import datetime, timedelta
+from .availability import invalidate_occupancy
+from .capacity import assign_with_capacity
+from .changelog import INSERT, UPDATE, deferred_changes, record_changes
+from .clustering import assign_clustered
+from .directory import find_apartment, has_apartment
+from .metrics import (
+    RESCHEDULE_QUEUE_DELAY, RESCHEDULE_REQUESTS, observe_ics_import, observe_scheduler_run, scheduler_stage,
+)
+from .models import Apartment, Booking, CleaningSchedule, RescheduleCheckpoint
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime, time, timedelta
+from itertools import islice
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Min, Q
+from icalendar import Calendar
 import intervaltree
 import logging
 
-logger = logging.getLogger(__name__)
+from .log import get_logger, summarize
 
-def validate_booking_dates(apartment, dtstart, dtend):
+logger = get_logger(__name__)
+
+def check_booking_dates(dtstart, dtend):
+    """Error message for stay dates that are invalid on their own, or None."""
     # Check that the start date is not in the past
     if dtstart.date() < datetime.now().date():
         return 'Start date cannot be in the past'
@@ -14,158 +32,635 @@ def validate_booking_dates(apartment, dtstart, dtend):
     if dtend < dtstart:
         return 'End date cannot be before start date'
 
-    # Check for overlapping bookings
+    return None
+
+def validate_booking_dates(apartment, dtstart, dtend, exclude=None):
+    error = check_booking_dates(dtstart, dtend)
+    if error is not None:
+        return error
+
+    # Check for overlapping bookings, other than the booking being moved
     overlapping_bookings = Booking.objects.filter(apartment=apartment, check_in_date__lt=dtend, check_out_date__gt=dtstart)
+    if exclude is not None:
+        overlapping_bookings = overlapping_bookings.exclude(id=exclude)
     if overlapping_bookings.exists():
         return f'Booking from {dtstart} to {dtend} overlaps with an existing booking'
 
     return None
 
-def update_cleaning_schedule(user, new_bookings):
-
+class CalendarImportError(Exception):
+    """An uploaded calendar could not be imported; the message is shown to the user."""
+
+class BookingError(Exception):
+    """A booking could not be changed or cancelled; the message is shown to the user."""
+
+def import_calendar(user, ics_content):
+    """Create the bookings of an ICS calendar and reschedule its apartment.
+
+    The calendar's PRODID names the apartment. The calendar is parsed before
+    any transaction starts, then the bookings are validated and inserted in
+    one short transaction holding the apartment's row lock, so concurrent
+    uploads for the same apartment are applied one after the other while
+    uploads for other apartments proceed in parallel. The reschedule
+    checkpoint is created, or queued, in the same transaction, so committed
+    bookings always have one for ``resume_rescheduling`` to pick up;
+    rescheduling runs after the commit in its own chunked transactions.
+    Returns the new bookings or raises ``CalendarImportError``.
+    """
+    apartment_name, stays = parse_calendar(ics_content)
+    observe_ics_import(len(ics_content), len(stays))
+    logger.info("Importing calendar %s (%s bytes) for user %s", apartment_name, len(ics_content), user)
+
+    new_bookings = []
+    checkpoint = None
+    with transaction.atomic():
+        entry = find_apartment(user.pk, apartment_name)
+        apartment = entry and Apartment.objects.select_for_update().filter(id=entry.id, owner=user).first()
+        if not apartment:
+            raise CalendarImportError(f'Apartment with name {apartment_name} does not exist')
+
+        for check_in_date, check_out_date, summary in stays:
+            error = validate_booking_dates(apartment, check_in_date, check_out_date)
+            if error is not None:
+                raise CalendarImportError(error)
+
+            # Create a new booking without updating the cleaning schedule yet
+            new_bookings.append(Booking.objects.create(
+                check_in_date=check_in_date,
+                check_out_date=check_out_date,
+                guest_name=summary,
+                apartment=apartment
+            ))
+
+        if new_bookings:
+            checkpoint = plan_cleaning_schedule(user, new_bookings)
+
+    # Update the cleaning schedule after all bookings are committed
+    if checkpoint is not None:
+        run_checkpoint(checkpoint)
+    return new_bookings
+
+def parse_calendar(ics_content):
+    """Apartment name and ``(check_in_date, check_out_date, guest_name)`` stays of an ICS calendar."""
+    cal = Calendar.from_ical(ics_content)
+    apartment_name = cal.get('prodid')
+    stays = []
+    for component in cal.walk('VEVENT'):
+        dtstart = component.get('dtstart')
+        dtend = component.get('dtend')
+        if dtstart is None or dtend is None:
+            raise CalendarImportError('Missing or invalid DTSTART or DTEND in one of the events in the calendar file')
+
+        summary = component.get('summary')
+        if not summary:
+            raise CalendarImportError('Missing or invalid SUMMARY in one of the events in the calendar file')
+
+        check_in_date = datetime.combine(dtstart.dt, time(15, 0))
+        check_out_date = datetime.combine(dtend.dt, time(11, 0))
+        logger.sampled_debug("dtstart: %s, dtend: %s, summary: %s, apartment: %s",
+                             check_in_date, check_out_date, summary, apartment_name)
+        stays.append((check_in_date, check_out_date, str(summary)))
+    return apartment_name, stays
+
+def update_booking(user, booking_id, **fields):
+    """Change the ``apartment_id``, dates or guest of a booking and reschedule only its neighbours.
+
+    Moving a stay changes three windows at most: its own, the one of the
+    stay before its old check-in, which now ends at the next check-in, and
+    the one of the stay before its new check-in, which now ends at it. They
+    are found with ordered index lookups, and cleaning dates are reassigned
+    over the old and new windows only. Returns the booking or raises
+    ``BookingError``.
+    """
+    with transaction.atomic():
+        booking = Booking.objects.filter(id=booking_id, apartment__owner=user).first()
+        if booking is None:
+            raise BookingError(f'Booking {booking_id} does not exist')
+        apartment_id = fields.get('apartment_id', booking.apartment_id)
+        if not has_apartment(user.pk, apartment_id):
+            raise BookingError(f'Apartment {apartment_id} does not exist')
+        locked = lock_apartments({booking.apartment_id, apartment_id})
+        booking.refresh_from_db()
+        if booking.apartment_id not in locked:
+            raise BookingError(f'Booking {booking_id} was moved meanwhile, try again')
+
+        previous = (booking.apartment_id, booking.check_in_date, booking.check_out_date)
+        for name, value in fields.items():
+            setattr(booking, name, value)
+        if (booking.apartment_id, booking.check_in_date, booking.check_out_date) == previous:
+            booking.save()
+            return booking
+
+        error = validate_booking_dates(apartment_id, booking.check_in_date, booking.check_out_date, exclude=booking.id)
+        if error is not None:
+            raise BookingError(error)
+
+        stays = [
+            previous_stay(previous[0], previous[1], exclude=booking.id),
+            previous_stay(booking.apartment_id, booking.check_in_date, exclude=booking.id),
+        ]
+        stays = [stay for stay in stays if stay] + [(booking.id, booking.apartment_id, booking.check_out_date)]
+        previous_windows = stored_windows([stay[0] for stay in stays])
+        booking.save()
+        if booking.apartment_id != previous[0]:
+            # The save signal only drops the new apartment's availability
+            invalidate_occupancy(previous[0])
+            transaction.on_commit(lambda: invalidate_occupancy(previous[0]))
+
+        reschedule_neighbours(user, stays, previous_windows)
+    return booking
+
+def cancel_booking(user, booking_id):
+    """Delete a booking and reschedule only the stay before it, like ``update_booking``."""
+    with transaction.atomic():
+        booking = Booking.objects.filter(id=booking_id, apartment__owner=user).first()
+        if booking is None:
+            raise BookingError(f'Booking {booking_id} does not exist')
+        lock_apartments([booking.apartment_id])
+
+        stays = [stay for stay in [previous_stay(booking.apartment_id, booking.check_in_date)] if stay]
+        previous_windows = stored_windows([booking.id] + [stay[0] for stay in stays])
+        booking.delete()
+        reschedule_neighbours(user, stays, previous_windows)
+
+def previous_stay(apartment_id, check_in_date, exclude=None):
+    """``(booking_id, apartment_id, check_out_date)`` of the stay whose window ends at ``check_in_date``, or None.
+
+    That is the apartment's latest check-out before ``check_in_date``, found
+    with one lookup on the (apartment, check_out_date) index.
+    """
+    stays = Booking.objects.filter(apartment_id=apartment_id, check_out_date__lt=check_in_date)
+    if exclude is not None:
+        stays = stays.exclude(id=exclude)
+    return stays.order_by('-check_out_date').values_list('id', 'apartment_id', 'check_out_date').first()
+
+def next_check_in(apartment_id, check_out_date):
+    """The apartment's first check-in after ``check_out_date``, from the (apartment, check_in_date) index."""
+    return Booking.objects.filter(apartment_id=apartment_id, check_in_date__gt=check_out_date).order_by(
+        'check_in_date').values_list('check_in_date', flat=True).first()
+
+def stored_windows(booking_ids):
+    """Stored ``(window_start, window_end)`` windows of ``booking_ids``."""
+    return list(CleaningSchedule.objects.filter(booking_id__in=booking_ids).values_list('window_start', 'window_end'))
+
+def reschedule_neighbours(user, stays, previous_windows):
+    """Recompute the windows of ``(booking_id, apartment_id, check_out_date)`` stays and reassign around them.
+
+    Cleaning dates are reassigned over the new windows and the
+    ``previous_windows`` they replace. Returns the number of rows changed.
+    """
+    with scheduler_stage('windows'):
+        windows = {
+            booking_id: (check_out_date, next_check_in(apartment_id, check_out_date))
+            for booking_id, apartment_id, check_out_date in stays
+        }
+        save_cleaning_windows(windows)
+    bounds = [*windows.values(), *previous_windows]
+    if not bounds:
+        return 0
+    date_min = min(start for start, _ in bounds)
+    date_max = max(end or start for start, end in bounds)
+    return reassign_cleaning_dates(user, date_min, date_max)
+
+def lock_apartments(apartment_ids):
+    """Lock the rows of ``apartment_ids`` until the end of the current transaction.
+
+    Rows are locked in id order so that transactions locking several
+    apartments cannot deadlock each other. Returns the locked ids.
+    """
+    return list(Apartment.objects.select_for_update().filter(id__in=apartment_ids).order_by('id').values_list('id', flat=True))
+
+# Namespace of the advisory locks taken by lock_owner_schedule
+SCHEDULE_LOCK_NAMESPACE = 7_245
+
+def lock_owner_schedule(owner_id):
+    """Serialize cleaning date assignment of one owner until the end of the current transaction.
+
+    Cleaning dates depend on the windows of all the owner's apartments, so
+    this lock is taken after any apartment locks, just before the dates are
+    reassigned or the change log written, and never blocks work on other
+    owners.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [SCHEDULE_LOCK_NAMESPACE, owner_id])
+
+def update_cleaning_schedule(user, new_bookings, mode=None):
+    checkpoint = plan_cleaning_schedule(user, new_bookings, mode=mode)
+    return Counter() if checkpoint is None else run_checkpoint(checkpoint)
+
+def plan_cleaning_schedule(user, new_bookings, mode=None):
+    """Create or queue the checkpoint rescheduling around ``new_bookings``, like ``record_reschedule``."""
     # Determine the date range of interest based on new bookings
     date_min = min(booking.check_in_date for booking in new_bookings) - timedelta(days=30)
     date_max = max(booking.check_out_date for booking in new_bookings) + timedelta(days=30)
 
-    # Step 1: Determine Cleaning Windows
-    calculate_cleaning_windows(user, date_min, date_max)
+    # Only the windows of the apartments that received bookings can change
+    apartment_ids = sorted({booking.apartment_id for booking in new_bookings})
+    return record_reschedule(user, date_min, date_max, apartment_ids, mode=mode)
+
+def request_reschedule(user, date_min, date_max, apartment_ids, mode=None):
+    """Reschedule ``apartment_ids`` over a date range now, or queue it when rescheduling is debounced."""
+    checkpoint = record_reschedule(user, date_min, date_max, apartment_ids, mode=mode)
+    return Counter() if checkpoint is None else run_checkpoint(checkpoint)
+
+def record_reschedule(user, date_min, date_max, apartment_ids, mode=None):
+    """Create the checkpoint of a reschedule request, or queue the request when rescheduling is debounced.
+
+    Called inside the transaction that changed the bookings, so the request
+    commits with them. Returns the checkpoint to run once committed, or None
+    when the request was queued.
+    """
+    if settings.SCHEDULER_DEBOUNCE_SECONDS:
+        queue_reschedule(user, date_min, date_max, apartment_ids, mode=mode)
+        return None
+
+    checkpoint = RescheduleCheckpoint.objects.create(
+        owner=user,
+        date_min=date_min,
+        date_max=date_max,
+        apartment_ids=apartment_ids,
+        mode=mode or '',
+    )
+    RESCHEDULE_REQUESTS.labels(result='immediate').inc()
+    return checkpoint
+
+def queue_reschedule(user, date_min, date_max, apartment_ids, mode=None):
+    """Merge a reschedule request into the owner's queued checkpoint, or queue a new one.
+
+    The queued checkpoint becomes due ``SCHEDULER_DEBOUNCE_SECONDS`` after the
+    latest request merged into it, but no later than
+    ``SCHEDULER_MAX_DELAY_SECONDS`` after the first, so a burst of imports is
+    rescheduled once over the union of their apartments and date ranges.
+    Returns an empty Counter, as nothing is rescheduled yet.
+    """
+    while True:
+        with transaction.atomic():
+            now = datetime.now()
+            due = now + timedelta(seconds=settings.SCHEDULER_DEBOUNCE_SECONDS)
+            checkpoint = RescheduleCheckpoint.objects.select_for_update().filter(
+                owner=user, mode=mode or '', due__isnull=False).first()
+            if checkpoint is None:
+                try:
+                    with transaction.atomic():
+                        RescheduleCheckpoint.objects.create(owner=user, date_min=date_min, date_max=date_max,
+                                                            apartment_ids=apartment_ids, mode=mode or '', due=due)
+                except IntegrityError:
+                    # Another request queued one meanwhile; merge into it
+                    continue
+                RESCHEDULE_REQUESTS.labels(result='queued').inc()
+                return Counter()
+
+            checkpoint.date_min = min(checkpoint.date_min, date_min)
+            checkpoint.date_max = max(checkpoint.date_max, date_max)
+            checkpoint.apartment_ids = sorted(set(checkpoint.apartment_ids).union(apartment_ids))
+            checkpoint.due = min(due, checkpoint.created + timedelta(seconds=settings.SCHEDULER_MAX_DELAY_SECONDS))
+            checkpoint.save()
+            RESCHEDULE_REQUESTS.labels(result='coalesced').inc()
+            return Counter()
+
+def claim_due_checkpoints(limit, exclude_owners=()):
+    """Start up to ``limit`` queued checkpoints that are due, returning their ``(id, owner_id)``.
+
+    Claimed checkpoints are no longer queued, so new requests queue another
+    one. Rows claimed by another worker are skipped rather than waited for.
+    """
+    with transaction.atomic():
+        now = datetime.now()
+        due = list(RescheduleCheckpoint.objects.select_for_update(skip_locked=True).filter(due__lte=now).exclude(
+            owner_id__in=exclude_owners).order_by('due').values_list('id', 'owner_id', 'created')[:limit])
+        RescheduleCheckpoint.objects.filter(id__in=[checkpoint_id for checkpoint_id, _, _ in due]).update(
+            due=None, updated=now)
+    for _, _, created in due:
+        RESCHEDULE_QUEUE_DELAY.observe((now - created).total_seconds())
+    return [(checkpoint_id, owner_id) for checkpoint_id, owner_id, _ in due]
+
+def run_checkpoint(checkpoint, chunk_size=None):
+    """Finish a RescheduleCheckpoint in short transactions.
+
+    Each transaction recalculates the windows of at most ``chunk_size``
+    apartments (``SCHEDULER_APARTMENT_CHUNK_SIZE`` by default) and records the
+    progress on the checkpoint, so an interrupted run resumes where it
+    stopped. A last transaction reassigns the cleaning dates and deletes the
+    checkpoint. Returns a Counter like ``reschedule``.
+    """
+    chunk_size = chunk_size or settings.SCHEDULER_APARTMENT_CHUNK_SIZE
+    user = checkpoint.owner
+    changes = Counter()
+    # Inside an outer transaction the owner's schedule lock would be held while
+    # the next chunks are locked, so the change log is written once at the end
+    with deferred_changes() if transaction.get_connection().in_atomic_block else nullcontext():
+        while True:
+            with transaction.atomic():
+                # Re-read the progress under lock in case another process resumed this checkpoint
+                checkpoint = RescheduleCheckpoint.objects.select_for_update().filter(id=checkpoint.id).first()
+                if checkpoint is None:
+                    return changes
+                if not checkpoint.apartment_ids:
+                    changes['cleaning_dates_updated'] += reassign_cleaning_dates(
+                        user, checkpoint.date_min, checkpoint.date_max, mode=checkpoint.mode or None)
+                    checkpoint.delete()
+                    observe_scheduler_run(changes)
+                    return changes
+
+                chunk = checkpoint.apartment_ids[:chunk_size]
+                with scheduler_stage('windows'):
+                    changes += calculate_cleaning_windows(
+                        user, checkpoint.date_min, checkpoint.date_max, apartment_ids=lock_apartments(chunk))
+                checkpoint.apartment_ids = checkpoint.apartment_ids[chunk_size:]
+                checkpoint.save(update_fields=['apartment_ids', 'updated'])
+
+def resume_checkpoints(stale_after):
+    """Finish the started checkpoints that have made no progress for ``stale_after``."""
+    changes = Counter()
+    stale = RescheduleCheckpoint.objects.filter(
+        due__isnull=True, updated__lt=datetime.now() - stale_after).select_related('owner')
+    for checkpoint in stale.iterator():
+        changes += run_checkpoint(checkpoint)
+        changes['checkpoints'] += 1
+    return changes
+
+def reschedule(user, date_min, date_max, apartment_chunk_size=None, apartment_ids=None, mode=None):
+    """Recompute cleaning windows and dates of the user's bookings in a date range.
+
+    Windows are recalculated for ``apartment_ids`` (all of the user's
+    apartments when None), one chunk of ``apartment_chunk_size`` apartments at a
+    time. Each chunk is locked with ``lock_apartments`` before it is read.
+    Returns a Counter with the number of bookings processed and schedule rows
+    created or updated.
+    """
+    changes = Counter()
+    apartments = Apartment.objects.filter(owner=user)
+    if apartment_ids is not None:
+        apartments = apartments.filter(id__in=apartment_ids)
+    apartment_ids = apartments.order_by('id').values_list('id', flat=True)
+    if apartment_chunk_size:
+        chunks = chunked(apartment_ids.iterator(chunk_size=apartment_chunk_size), apartment_chunk_size)
+    else:
+        chunks = chunked(apartment_ids, None)
+
+    with transaction.atomic(), deferred_changes():
+        # Step 1: Determine Cleaning Windows
+        with scheduler_stage('windows'):
+            for chunk in chunks:
+                changes += calculate_cleaning_windows(user, date_min, date_max, apartment_ids=lock_apartments(chunk))
+
+        changes['cleaning_dates_updated'] += reassign_cleaning_dates(user, date_min, date_max, mode=mode)
+    return changes
+
+# Cleaning date assignment modes
+MODE_OVERLAP = 'overlap'
+MODE_CAPACITY = 'capacity'
+MODE_CLUSTER = 'cluster'
+
+# Implementations of the windows and overlap stages
+BACKEND_PYTHON = 'python'
+BACKEND_NUMPY = 'numpy'
+
+def reassign_cleaning_dates(user, date_min, date_max, mode=None):
+    """Assign cleaning dates from the stored windows, returning the number of rows changed.
+
+    ``mode`` defaults to ``SCHEDULER_ASSIGNMENT_MODE``: ``overlap`` cleans
+    overlapping windows together, ``capacity`` spreads cleanings within the
+    daily capacity of the owner's crews and ``cluster`` picks the fewest
+    cleaning days hitting every window (per location when
+    ``SCHEDULER_CLUSTER_BY_LOCATION`` is set). Must run inside a transaction,
+    which holds the owner's schedule lock.
+    """
+    lock_owner_schedule(user.pk)
+
+    mode = mode or settings.SCHEDULER_ASSIGNMENT_MODE
+    if mode == MODE_CAPACITY:
+        with scheduler_stage('assign'):
+            return assign_with_capacity(user, date_min, date_max)
+    if mode == MODE_CLUSTER:
+        with scheduler_stage('assign'):
+            cleaning_dates = assign_clustered(user, date_min, date_max, by_location=settings.SCHEDULER_CLUSTER_BY_LOCATION)
+        with scheduler_stage('write'):
+            return save_cleaning_dates(cleaning_dates)
+
+    if settings.SCHEDULER_BACKEND == BACKEND_NUMPY:
+        from .vectorized import assign_overlapping_cleaning_dates
+
+        with scheduler_stage('assign'):
+            cleaning_dates = assign_overlapping_cleaning_dates(user, date_min, date_max)
+        with scheduler_stage('write'):
+            return save_cleaning_dates(cleaning_dates)
 
     # Step 2: Identify Overlaps
-    overlaps = find_cleaning_overlaps(date_min, date_max)
+    with scheduler_stage('overlaps'):
+        overlaps = find_cleaning_overlaps(user, date_min, date_max)
 
     # Step 3: Assign Cleaning Dates
-    cleaning_dates = assign_cleaning_dates(overlaps)
+    with scheduler_stage('assign'):
+        cleaning_dates = assign_cleaning_dates(user, overlaps, date_min, date_max)
 
     # Step 4: Update Database Accordingly
+    with scheduler_stage('write'):
+        return save_cleaning_dates(cleaning_dates)
+
+def chunked(iterable, size):
+    """Yield lists of at most ``size`` items from ``iterable`` (a single list when ``size`` is None)."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def compute_cleaning_windows(bookings, next_check_ins=None):
+    """Compute cleaning windows in memory.
+
+    ``bookings`` are ``(booking_id, apartment_id, check_in_date, check_out_date)``
+    tuples ordered by apartment and check-out date. A window starts at the
+    check-out and ends at the check-in of the apartment's next booking, or at
+    ``next_check_ins[apartment_id]`` for the last booking of an apartment (the
+    first check-in after the loaded bookings), or is open-ended (None).
+    Returns ``{booking_id: (window_start, window_end)}``.
+    """
+    next_check_ins = next_check_ins or {}
+    bookings = list(bookings)
+    windows = {}
+    for index, (booking_id, apartment_id, _, check_out_date) in enumerate(bookings):
+        # Find the next booking for the same apartment; bookings do not overlap,
+        # so it is normally the very next row.
+        window_end = next_check_ins.get(apartment_id)
+        for next_index in range(index + 1, len(bookings)):
+            _, next_apartment_id, next_check_in_date, _ = bookings[next_index]
+            if next_apartment_id != apartment_id:
+                break
+            if next_check_in_date > check_out_date:
+                window_end = next_check_in_date
+                break
+        windows[booking_id] = (check_out_date, window_end)
+    return windows
 
-    # Fetch the current cleaning dates from the database
-    current_cleaning_dates = CleaningSchedule.objects.filter(booking_id__in=cleaning_dates.keys()).values('booking_id', 'cleaning_date')
-    
-
-    # Convert the queryset to a dictionary for easy comparison
-    current_cleaning_dates_dict = {item['booking_id']: item['cleaning_date'] for item in current_cleaning_dates}
-    logger.info(f"current_cleaning_dates_dict: {current_cleaning_dates_dict}")
-
-    # Iterate over the new cleaning dates
-    for booking_id, new_cleaning_date in cleaning_dates.items():
-        # If the new cleaning date is different from the current cleaning date, update or create the record
-        if current_cleaning_dates_dict.get(booking_id) != new_cleaning_date:
-            CleaningSchedule.objects.filter(booking_id=booking_id).update(cleaning_date=new_cleaning_date)
-
-
-def calculate_cleaning_windows(user, date_min, date_max):
-    logger.info("Calculating cleaning windows for each booking.")
+def load_bookings(user, date_min, date_max, apartment_ids=None):
+    """Bookings whose windows can change in a date range, and the first check-in of each apartment after it.
 
+    Returns the ``(booking_id, apartment_id, check_in_date, check_out_date)``
+    rows ordered for ``compute_cleaning_windows`` and its ``next_check_ins``.
+    """
     # Fetch bookings that are either within the date range or might influence cleaning windows around it
     all_bookings = Booking.objects.filter(
         apartment__owner=user,
         check_out_date__gte=date_min,
         check_in_date__lte=date_max
-    ).order_by('apartment_id', 'check_out_date')
-
-    for booking in all_bookings:
-        apartment_id = booking.apartment_id
-        check_out_date = booking.check_out_date
-
-        # Start date of the cleaning window is the check-out date of the current booking
-        window_start = check_out_date
-
-        # Find the next booking for the same apartment
-        next_booking = None
-        for next_booking_candidate in all_bookings:
-            if next_booking_candidate.apartment_id == apartment_id and next_booking_candidate.check_in_date > check_out_date:
-                next_booking = next_booking_candidate
-                break
+    )
+    if apartment_ids is not None:
+        all_bookings = all_bookings.filter(apartment_id__in=apartment_ids)
+    all_bookings = all_bookings.order_by('apartment_id', 'check_out_date').values_list(
+        'id', 'apartment_id', 'check_in_date', 'check_out_date')
+
+    # The booking following the last one in range starts after date_max
+    next_bookings = Booking.objects.filter(apartment__owner=user, check_in_date__gt=date_max)
+    if apartment_ids is not None:
+        next_bookings = next_bookings.filter(apartment_id__in=apartment_ids)
+    next_check_ins = dict(next_bookings.values('apartment_id').annotate(
+        next_check_in=Min('check_in_date')).values_list('apartment_id', 'next_check_in'))
+    return all_bookings, next_check_ins
+
+def calculate_cleaning_windows(user, date_min, date_max, apartment_ids=None):
+    logger.info("Calculating cleaning windows for each booking.")
 
-        # Set the end date of the cleaning window
-        if next_booking:
-            window_end = next_booking.check_in_date
-        else:
-            # If there is no next booking for the same apartment, set the window end to None (open-ended)
-            window_end = None
-
-        # Save the cleaning window to the database
-        CleaningSchedule.objects.update_or_create(
-            booking_id=booking.id,
-            defaults={
-                'window_start': window_start,
-                'window_end': window_end
-            }
-        )
-        # Log the cleaning window for the current booking
-        logger.info(f"Booking ID {booking.id} for Apartment {apartment_id} has a cleaning window from {window_start} to {'open-ended' if window_end is None else window_end}")
-    
-def find_cleaning_overlaps(date_min, date_max):
+    all_bookings, next_check_ins = load_bookings(user, date_min, date_max, apartment_ids)
+    if settings.SCHEDULER_BACKEND == BACKEND_NUMPY:
+        from .vectorized import compute_cleaning_windows as compute_windows
+    else:
+        compute_windows = compute_cleaning_windows
+    windows = compute_windows(all_bookings, next_check_ins)
+    if logger.isEnabledFor(logging.DEBUG):
+        for booking_id, (window_start, window_end) in windows.items():
+            logger.sampled_debug("Booking ID %s has a cleaning window from %s to %s",
+                                 booking_id, window_start, window_end or 'open-ended')
+
+    changes = save_cleaning_windows(windows)
+    changes['bookings'] = len(windows)
+    return changes
+
+def save_cleaning_windows(windows):
+    """Create or update the CleaningSchedule rows of ``{booking_id: (start, end)}``."""
+    changes = Counter()
+    existing = CleaningSchedule.objects.filter(booking_id__in=windows.keys()).only('id', 'booking_id', 'window_start', 'window_end')
+    changed = []
+    seen = set()
+    for schedule in existing:
+        seen.add(schedule.booking_id)
+        window = windows[schedule.booking_id]
+        if (schedule.window_start, schedule.window_end) != window:
+            schedule.window_start, schedule.window_end = window
+            changed.append(schedule)
+    CleaningSchedule.objects.bulk_update(changed, ['window_start', 'window_end'], batch_size=500)
+    missing = [
+        CleaningSchedule(booking_id=booking_id, window_start=window_start, window_end=window_end)
+        for booking_id, (window_start, window_end) in windows.items() if booking_id not in seen
+    ]
+    CleaningSchedule.objects.bulk_create(missing, batch_size=500)
+    record_changes(UPDATE, [schedule.id for schedule in changed])
+    record_changes(INSERT, [schedule.id for schedule in missing])
+    changes['windows_updated'] = len(changed)
+    changes['windows_created'] = len(missing)
+    return changes
+
+def save_cleaning_dates(cleaning_dates):
+    """Write ``{booking_id: cleaning_date}``, returning the number of rows changed."""
+    # Fetch the current cleaning dates from the database
+    current = CleaningSchedule.objects.filter(booking_id__in=cleaning_dates.keys()).only('id', 'booking_id', 'cleaning_date')
+    logger.info("Loaded current cleaning dates for %s bookings", summarize(cleaning_dates))
+
+    # Only rows whose cleaning date differs are written
+    changed = []
+    for schedule in current:
+        new_cleaning_date = cleaning_dates[schedule.booking_id]
+        if schedule.cleaning_date != new_cleaning_date:
+            schedule.cleaning_date = new_cleaning_date
+            changed.append(schedule)
+    CleaningSchedule.objects.bulk_update(changed, ['cleaning_date'], batch_size=500)
+    record_changes(UPDATE, [schedule.id for schedule in changed])
+    return len(changed)
+
+def find_cleaning_overlaps(user, date_min, date_max):
 
     logger.info("Finding cleaning overlaps within the specified date range.")
 
     # Fetch all cleaning schedules that could potentially overlap with the date range
     cleaning_schedules = CleaningSchedule.objects.filter(
-        window_start__lte=date_max, 
+        booking__apartment__owner=user,
+        window_start__lte=date_max,
         window_end__gte=date_min
-    )
+    ).values_list('booking_id', 'window_start', 'window_end')
+
+    windows = list(cleaning_schedules)
+    overlaps = overlapping_windows(windows)
 
+    # Log each unique overlap
+    if logger.isEnabledFor(logging.DEBUG):
+        for booking_ids, overlap_start, overlap_end in overlaps:
+            logger.sampled_debug('Found overlap between bookings %s from %s to %s', booking_ids, overlap_start, overlap_end)
+
+    logger.info("Found %s overlaps among %s cleaning windows", summarize(overlaps), summarize(windows))
+    return list(overlaps)
+
+def overlapping_windows(windows):
+    """Overlaps of closed ``(booking_id, window_start, window_end)`` windows, as ``(booking_ids, start, end)``."""
     # Create an interval tree
     tree = intervaltree.IntervalTree()
 
     # Populate the interval tree with cleaning windows
-    for schedule in cleaning_schedules:
-        booking_id = schedule.booking_id
-        start = schedule.window_start
+    for booking_id, start, window_end in windows:
         # Treat None as a time that is later than all other times
-        end = schedule.window_end if schedule.window_end is not None else datetime.max
+        end = window_end if window_end is not None else datetime.max
         tree[start:end] = booking_id
-        logger.debug(f'Added booking {booking_id} to the interval tree')
+        logger.sampled_debug('Added booking %s to the interval tree', booking_id)
 
     # Initialize a set to store unique overlaps
     overlaps = set()
 
     # Check for overlaps
     for interval in tree:
-        overlapping_intervals = [i for i in tree if i.overlaps(interval)]
+        overlapping_intervals = tree.overlap(interval.begin, interval.end)
         if len(overlapping_intervals) > 1:
             booking_ids = sorted(overlap.data for overlap in overlapping_intervals)
             # Find the smallest overlapping time frame
             overlap_start = max(overlap.begin for overlap in overlapping_intervals)
             overlap_end = min(overlap.end for overlap in overlapping_intervals)
             overlaps.add((tuple(booking_ids), overlap_start, overlap_end))
+    return overlaps
 
-    # Log each unique overlap
-    for booking_ids, overlap_start, overlap_end in overlaps:
-        logger.info(f'Found overlap between bookings {booking_ids} from {overlap_start} to {overlap_end}')
+def assign_cleaning_dates(user, overlaps, date_min, date_max):
 
-    logger.info(f"overlaps: {list(overlaps)}")
-    return list(overlaps)
-
-def assign_cleaning_dates(overlaps):
+    # Fetch the user's cleaning schedules in the date range
+    cleaning_schedules = CleaningSchedule.objects.filter(
+        Q(window_end__gte=date_min) | Q(window_end__isnull=True),
+        booking__apartment__owner=user,
+        window_start__lte=date_max,
+    ).values_list('booking_id', 'window_start', 'window_end')
 
-    # Fetch all cleaning schedules
-    cleaning_schedules = CleaningSchedule.objects.all()
+    logger.info('Starting to assign cleaning dates.')
+    cleaning_dates = cleaning_dates_from_overlaps(cleaning_schedules, overlaps)
+    logger.info('Assigned cleaning dates for %s bookings', summarize(cleaning_dates))
+    return cleaning_dates
 
+def cleaning_dates_from_overlaps(windows, overlaps):
+    """Cleaning date of each ``(booking_id, window_start, window_end)`` window, given their overlaps."""
     # Create a dictionary to store the cleaning windows
-    cleaning_windows = {schedule.booking_id: (schedule.window_start, schedule.window_end) for schedule in cleaning_schedules}
+    cleaning_windows = {booking_id: (start, end) for booking_id, start, end in windows}
+
+    # Earliest overlap start of every booking that overlaps another one
+    earliest_overlap_starts = {}
+    for booking_ids, overlap_start, _ in overlaps:
+        for booking_id in booking_ids:
+            if booking_id not in earliest_overlap_starts or overlap_start < earliest_overlap_starts[booking_id]:
+                earliest_overlap_starts[booking_id] = overlap_start
 
     # Create a dictionary to store the cleaning dates for each booking
     cleaning_dates = {}
-    logger.info('Starting to assign cleaning dates.')
 
     # Iterate over the cleaning windows
     for booking_id, (start, end) in cleaning_windows.items():
-        logger.debug(f'Processing booking {booking_id} with cleaning window from {start} to {end}.')
+        logger.sampled_debug('Processing booking %s with cleaning window from %s to %s.', booking_id, start, end)
         # If there are no overlaps for this booking, assign the end date as the cleaning date
-        if not any(booking_id in booking_ids for booking_ids, _, _ in overlaps):
+        if booking_id not in earliest_overlap_starts:
             cleaning_dates[booking_id] = end if end is not None else start
-            logger.debug(f'No overlaps found for booking {booking_id}. Assigned cleaning date: {end}.')
+            logger.sampled_debug('No overlaps found for booking %s. Assigned cleaning date: %s.', booking_id, cleaning_dates[booking_id])
         else:
-            # If there are overlaps, find the earliest start date among the overlaps and assign it as the cleaning date
-            overlap_start_dates = [overlap_start for booking_ids, overlap_start, _ in overlaps if booking_id in booking_ids]
-            earliest_overlap_start_date = min(overlap_start_dates) if overlap_start_dates else None
-            cleaning_dates[booking_id] = earliest_overlap_start_date
-            logger.debug(f'Overlaps found for booking {booking_id}. Assigned cleaning date: {earliest_overlap_start_date}.')
-
-    # Log the cleaning dates
-    for booking_id, cleaning_date in cleaning_dates.items():
-        logger.info(f'Assigned cleaning date for booking {booking_id}: {cleaning_date}')
-
-    logger.info(f'cleaning_dates: {cleaning_dates}')
+            # If there are overlaps, assign the earliest start date among the overlaps as the cleaning date
+            cleaning_dates[booking_id] = earliest_overlap_starts[booking_id]
+            logger.sampled_debug('Overlaps found for booking %s. Assigned cleaning date: %s.', booking_id, cleaning_dates[booking_id])
     return cleaning_dates
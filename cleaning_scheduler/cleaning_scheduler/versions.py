@@ -0,0 +1,33 @@
+"""
+Per-owner data versions.
+
+An owner's version changes after every committed transaction that changed
+the owner's apartments, bookings or cleaning schedule: ``live.notify`` is
+called for all of these, and its commit callback bumps the version. Derived
+data cached under a key holding the version is then never served stale, and
+needs no invalidation of its own.
+
+Versions are random rather than counters, so an entry evicted from the
+cache can never come back with a value an older cache entry was keyed by.
+"""
+import uuid
+
+from django.core.cache import cache
+
+
+def _cache_key(owner_id):
+    return f'data-version:{owner_id}'
+
+
+def data_version(owner_id):
+    """Current data version of ``owner_id``."""
+    version = cache.get(_cache_key(owner_id))
+    if version is None:
+        # Concurrent first readers agree on the version one of them adds
+        cache.add(_cache_key(owner_id), uuid.uuid4().hex, None)
+        version = cache.get(_cache_key(owner_id))
+    return version
+
+
+def bump_data_version(owner_id):
+    cache.set(_cache_key(owner_id), uuid.uuid4().hex, None)
@@ -5,27 +5,31 @@ from django.views.generic import DetailView, UpdateView, ListView, DeleteView, C
 from django.shortcuts import render
 from django.contrib import messages
 from django.shortcuts import redirect
-from django.db.models import Q, F, Exists, OuterRef
+from django.db.models import Exists, OuterRef
 from django.db import transaction
-from django.http import Http404
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.core.exceptions import ValidationError
 
 
 
 import calendar
 import intervaltree
-from icalendar import Calendar
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta
 from collections import defaultdict
 
 from .forms import ApartmentUpdateForm, ApartmentCreationForm
-from cleaning_scheduler.cleaning_scheduler.models import Apartment, Booking
-from .utils import update_cleaning_schedule,validate_booking_dates
+from cleaning_scheduler.cleaning_scheduler.models import Apartment
+from .archive import month_stays
+from .dashboard import OCCUPANCY_DAYS, get_dashboard
+from .directory import ApartmentEntry, get_directory, has_apartment, reload_directory
+from .live import stream
+from .routers import read_from_replica
+from .utils import CalendarImportError, import_calendar
 
 
-import logging
+from .log import get_logger, summarize
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 def root(request):
     if request.user.is_authenticated:
@@ -33,19 +37,25 @@ def root(request):
     else:
         return redirect('account_login')
 
-class ApartmentDetailView(LoginRequiredMixin, DetailView):
-    model = Apartment
-    pk_url_kwarg = 'id'
+class OwnedApartmentMixin:
+    """Restrict an apartment view to the requesting user's apartments."""
 
     def get_object(self, queryset=None):
+        # Other owners' apartments are rejected from the directory, confirmed by one query
+        if not has_apartment(self.request.user.pk, int(self.kwargs[self.pk_url_kwarg])):
+            raise Http404()
         obj = super().get_object(queryset)
-        if obj.owner != self.request.user:
+        if obj.owner_id != self.request.user.pk:
             raise Http404()
         return obj
 
+class ApartmentDetailView(LoginRequiredMixin, OwnedApartmentMixin, DetailView):
+    model = Apartment
+    pk_url_kwarg = 'id'
+
 apartment_detail_view = ApartmentDetailView.as_view()
 
-class ApartmentUpdateView(LoginRequiredMixin, UpdateView):
+class ApartmentUpdateView(LoginRequiredMixin, OwnedApartmentMixin, UpdateView):
     model = Apartment
     form_class = ApartmentUpdateForm
     pk_url_kwarg = 'id'
@@ -56,14 +66,8 @@ class ApartmentUpdateView(LoginRequiredMixin, UpdateView):
         kwargs.update({'request': self.request})
         return kwargs
 
-    def get_object(self, queryset=None):
-        obj = super().get_object(queryset)
-        if obj.owner != self.request.user:
-            raise Http404()
-        return obj
-    
     def get_success_url(self):
-        logger.info(f"ApartmentUpdateView.get_success_url: {self.object.id}")
+        logger.debug("ApartmentUpdateView.get_success_url: %s", self.object.id)
         return reverse_lazy('scheduler:apartments_detail', kwargs={'id': self.object.id})
 
 apartment_update_view = ApartmentUpdateView.as_view()
@@ -74,26 +78,16 @@ class ApartmentListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         # This line ensures that only apartments belonging to the logged-in user are returned
-        logger.info(f"User: {self.request.user}")
-        apartments=Apartment.objects.filter(owner=self.request.user)
-        logger.info(f"apartments: {apartments}")
+        logger.debug("Listing apartments for user %s", self.request.user)
         return Apartment.objects.filter(owner=self.request.user)
 
-apartment_list_view = ApartmentListView.as_view()
+apartment_list_view = read_from_replica(ApartmentListView.as_view())
 
-class ApartmentDeleteView(LoginRequiredMixin, DeleteView):
+class ApartmentDeleteView(LoginRequiredMixin, OwnedApartmentMixin, DeleteView):
     model = Apartment
     pk_url_kwarg = 'id'
     success_url = reverse_lazy('scheduler:apartments_list')
 
-    def get_object(self, queryset=None):
-        """ Override the method to check object permissions. """
-        logger.info(f"ApartmentDeleteView.get_object: {self.request.user}")
-        obj = super().get_object(queryset)
-        if obj.owner != self.request.user:
-            raise Http404()
-        return obj
-
 apartment_delete_view = ApartmentDeleteView.as_view()
 
 class ApartmentCreateView(LoginRequiredMixin, CreateView):
@@ -109,7 +103,7 @@ class ApartmentCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
     def get_success_url(self):
-        logger.info(f"ApartmentCreateView.get_success_url: {self.object.id}")
+        logger.debug("ApartmentCreateView.get_success_url: %s", self.object.id)
         return reverse_lazy('scheduler:apartments_list')
 
 apartment_create_view = ApartmentCreateView.as_view()
@@ -121,56 +115,10 @@ class CalendarView(LoginRequiredMixin, View):
             messages.error(request, 'No file selected for upload')
             return redirect('scheduler:calendar')
 
-        ics_file = request.FILES['ics_file']
-        cal = Calendar.from_ical(ics_file.read())
-        logger.info(f"cal: {cal}")
-        apartment_name = cal.get('prodid')
         try:
-            apartment = Apartment.objects.get(name=apartment_name, owner=request.user)
-        except Apartment.DoesNotExist:
-            messages.error(request, f'Apartment with name {apartment_name} does not exist')
-            return redirect('scheduler:calendar')
-
-        new_bookings = []
-        with transaction.atomic():
-            for component in cal.walk():
-                if component.name == "VEVENT":
-                    dtstart = component.get('dtstart')
-                    dtend = component.get('dtend')
-                    
-                    if dtstart is None or dtend is None:
-                        messages.error(request, 'Missing or invalid DTSTART or DTEND in one of the events in the calendar file')
-                        return redirect('scheduler:calendar')
-                    
-                    check_in_date = datetime.combine(dtstart.dt, time(15, 0))
-                    check_out_date = datetime.combine(dtend.dt, time(11, 0))
-
-
-                    summary = component.get('summary')
-
-                    if not summary:
-                        messages.error(request, 'Missing or invalid SUMMARY in one of the events in the calendar file')
-                        return redirect('scheduler:calendar')
-                
-                    logger.info(f"dtstart: {check_in_date}, dtend: {check_out_date}, summary: {summary}, apartment: {apartment_name}")
-
-                    error = validate_booking_dates(apartment, check_in_date, check_out_date)
-                    if error is not None:
-                        messages.error(request, error)
-                        return redirect('scheduler:calendar')
-                    
-                    # Create a new booking without updating the cleaning schedule yet
-                    new_booking = Booking.objects.create(
-                        check_in_date=check_in_date, 
-                        check_out_date=check_out_date, 
-                        guest_name=summary, 
-                        apartment=apartment
-                    )
-                    new_bookings.append(new_booking)
-        
-        # Update the cleaning schedule after processing all bookings
-        if new_bookings:
-            update_cleaning_schedule(request.user, new_bookings)
+            import_calendar(request.user, request.FILES['ics_file'].read())
+        except CalendarImportError as error:
+            messages.error(request, str(error))
 
         return redirect('scheduler:calendar')
                
@@ -183,17 +131,11 @@ class CalendarView(LoginRequiredMixin, View):
 
 
         # Fetch the reserved dates and cleaning dates from your database
-        bookings = Booking.objects.filter(
-            Q(check_in_date__year=year, check_in_date__month=month) |
-            Q(check_out_date__year=year, check_out_date__month=month),
-            apartment__owner=request.user
-        ).select_related('cleaningschedule').annotate(
-            cleaning_date=F('cleaningschedule__cleaning_date')
-        ).values_list('apartment__name', 'check_in_date', 'check_out_date', 'cleaning_date')
+        bookings = month_stays(request.user, year, month)
 
         # Generate a dictionary where each key is a date and the value is a list of apartment names
         reserved_dates_dict = defaultdict(list)
-        for apartment_name, start_date, end_date, cleaning_date in bookings:
+        for _, apartment_name, start_date, end_date, cleaning_date in bookings:
             delta = end_date - start_date
             for i in range(delta.days + 1):
                 day = start_date + timedelta(days=i)
@@ -203,6 +145,11 @@ class CalendarView(LoginRequiredMixin, View):
             if cleaning_date and cleaning_date.year == year and cleaning_date.month == month:
                 reserved_dates_dict[cleaning_date.strftime('%Y-%m-%d')].append(f"{apartment_name} *Cleaning Needed*")
 
+        if request.GET.get('format') == 'json':
+            # Cells of the month, fetched by the page when a live update arrives
+            prefix = f"{year}-{str(month).zfill(2)}-"
+            return JsonResponse({'days': {day: names for day, names in reserved_dates_dict.items() if day.startswith(prefix)}})
+
         # Generate a list of dictionaries for the calendar
         calendar_data = []
         for week in my_calendar:
@@ -212,13 +159,14 @@ class CalendarView(LoginRequiredMixin, View):
                     date = f"{year}-{str(month).zfill(2)}-{str(day).zfill(2)}"
                     week_data.append({
                         'day': day,
+                        'date': date,
                         'apartments': reserved_dates_dict.get(date, [])
                     })
                 else:
                     week_data.append({'day': 0, 'apartments': []})
             calendar_data.append(week_data)
         
-        logger.info(f"calendar_data: {calendar_data}")
+        logger.debug("Rendered calendar %s-%s with %s booked days", year, month, summarize(reserved_dates_dict))
         
         context = {
             'calendar': calendar_data,
@@ -234,7 +182,8 @@ class CalendarView(LoginRequiredMixin, View):
         }
         return render(request, self.template_name, context)
 
-calendar_view = CalendarView.as_view()
+# Uploads manage their own short transactions instead of ATOMIC_REQUESTS
+calendar_view = transaction.non_atomic_requests(read_from_replica(CalendarView.as_view()))
 
 class CleaningScheduleView(LoginRequiredMixin, View):
     template_name = 'cleaning_scheduler/cleaning_schedule.html'
@@ -247,24 +196,29 @@ class CleaningScheduleView(LoginRequiredMixin, View):
         next_year, next_month = (year, month + 1) if month < 12 else (year + 1, 1)
 
         # Fetch the reserved dates and cleaning dates from your database
-        bookings = Booking.objects.filter(
-            Q(check_in_date__year=year, check_in_date__month=month) |
-            Q(check_out_date__year=year, check_out_date__month=month),
-            apartment__owner=request.user
-        ).select_related('cleaningschedule').annotate(
-            cleaning_date=F('cleaningschedule__cleaning_date')
-        ).values_list('apartment__name', 'check_in_date', 'check_out_date', 'cleaning_date')
-
-        # Fetch apartments of the logged-in user
-        apartments = Apartment.objects.filter(owner=request.user)
-
-        # Create a mapping from apartment names to indices
-        apartment_indices = {apartment.name: i for i, apartment in enumerate(apartments)}
+        bookings = month_stays(request.user, year, month)
+
+        # Apartments of the logged-in user, from the cached directory
+        apartments = get_directory(request.user.pk)
+        if any(apartment_id not in apartments for apartment_id, *_ in bookings):
+            # A local entry from before an apartment was created or renamed; reload it once
+            apartments = reload_directory(request.user.pk)
+        # Apartments the bookings still show after the reload, as a lagging replica may,
+        # get a column of their own under the name read with the bookings
+        known = set(apartments.by_id)
+        apartments = list(apartments)
+        for apartment_id, apartment_name, *_ in bookings:
+            if apartment_id not in known:
+                known.add(apartment_id)
+                apartments.append(ApartmentEntry(apartment_id, apartment_name, ''))
+
+        # Create a mapping from apartment ids to indices
+        apartment_indices = {apartment.id: i for i, apartment in enumerate(apartments)}
 
         # Initialize the schedule_dict with empty lists for each apartment
         schedule_dict = defaultdict(lambda: ['Empty'] * len(apartments))
 
-        for apartment_name, start_date, end_date, cleaning_date in bookings:
+        for apartment_id, _, start_date, end_date, cleaning_date in bookings:
             start_date = start_date.date()
             end_date = end_date.date()
             cleaning_date = cleaning_date.date() if cleaning_date else None
@@ -273,22 +227,28 @@ class CleaningScheduleView(LoginRequiredMixin, View):
                 day = start_date + timedelta(days=i)
                 if day == start_date:
                     # This is the first day of the booking
-                    schedule_dict[day.strftime('%Y-%m-%d')][apartment_indices[apartment_name]] = 'Enter'
+                    schedule_dict[day.strftime('%Y-%m-%d')][apartment_indices[apartment_id]] = 'Enter'
                 elif day == end_date:
                     # This is the last day of the booking
                     if cleaning_date == end_date:
-                        schedule_dict[day.strftime('%Y-%m-%d')][apartment_indices[apartment_name]] = 'Exit/Cleaning'
+                        schedule_dict[day.strftime('%Y-%m-%d')][apartment_indices[apartment_id]] = 'Exit/Cleaning'
                     else:
-                        schedule_dict[day.strftime('%Y-%m-%d')][apartment_indices[apartment_name]] = 'Exit'
+                        schedule_dict[day.strftime('%Y-%m-%d')][apartment_indices[apartment_id]] = 'Exit'
                 else:
                     # This is a day in between
-                    schedule_dict[day.strftime('%Y-%m-%d')][apartment_indices[apartment_name]] = 'Occupied'
+                    schedule_dict[day.strftime('%Y-%m-%d')][apartment_indices[apartment_id]] = 'Occupied'
 
             # Check the cleaning date separately
             if cleaning_date and cleaning_date not in [start_date, end_date]:
-                schedule_dict[cleaning_date.strftime('%Y-%m-%d')][apartment_indices[apartment_name]] = 'Cleaning Needed'
+                schedule_dict[cleaning_date.strftime('%Y-%m-%d')][apartment_indices[apartment_id]] = 'Cleaning Needed'
+
+        logger.debug("Rendered cleaning schedule %s-%s with %s days", year, month, summarize(schedule_dict))
 
-        logger.info(f"schedule_dict: {schedule_dict}")
+        if request.GET.get('format') == 'json':
+            return JsonResponse({
+                'apartments': [apartment.name for apartment in apartments],
+                'schedule': dict(sorted(schedule_dict.items())),
+            })
 
         # Fetch apartments of the logged-in user
         context = {
@@ -307,4 +267,28 @@ class CleaningScheduleView(LoginRequiredMixin, View):
 
         return render(request, self.template_name, context)
 
-cleaning_schedule_view = CleaningScheduleView.as_view()
+cleaning_schedule_view = read_from_replica(CleaningScheduleView.as_view())
+
+class DashboardView(LoginRequiredMixin, View):
+    """Current and next stay, next cleaning and occupancy of each of the user's apartments."""
+    template_name = 'cleaning_scheduler/dashboard.html'
+
+    def get(self, request, *args, **kwargs):
+        context = {'apartments': get_dashboard(request.user.pk), 'occupancy_days': OCCUPANCY_DAYS}
+        return render(request, self.template_name, context)
+
+dashboard_view = DashboardView.as_view()
+
+class LiveUpdatesView(LoginRequiredMixin, View):
+    """Server-Sent Events telling the calendar pages that the user's bookings or cleaning dates changed."""
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(stream(request.user.pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Tell nginx not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+# No transaction may stay open for the life of the stream
+live_updates_view = transaction.non_atomic_requests(LiveUpdatesView.as_view())
+
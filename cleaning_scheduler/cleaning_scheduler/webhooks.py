@@ -0,0 +1,224 @@
+"""
+Batched webhooks of cleaning schedule changes.
+
+Change log entries of an owner with active WebhookEndpoints also go into the
+WebhookEvent outbox, in the same transaction, so no committed change is lost
+and none is sent for a rolled back one. ``deliver_webhooks`` leases pending
+events in batches of up to ``WEBHOOK_BATCH_SIZE`` per endpoint and sends
+each batch as one signed POST, so a large import costs a few requests rather
+than one per cleaning. An endpoint never has more than its
+``max_concurrency`` batches in flight.
+
+The payload carries the current state of the changed rows, read when the
+batch is sent. A row changed several times is sent once, and a batch that is
+retried, or delivered after a newer one, never sends an outdated state. After
+a failure the batch's events are freed and the endpoint waits with
+exponential backoff before its next delivery.
+
+Requests only go to http(s) URLs on public addresses, checked after DNS
+resolution, and redirects are not followed; see ``addresses``.
+
+Receivers check ``X-Webhook-Signature``, the hex HMAC-SHA256 of
+``<X-Webhook-Timestamp>.<body>`` with the endpoint's secret, and can use
+``X-Webhook-Id`` to drop duplicate deliveries.
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import random
+import ssl
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .addresses import check_url, create_public_connection
+from .log import get_logger
+from .metrics import WEBHOOK_BATCH_EVENTS, WEBHOOK_DELIVERIES
+from .models import CleaningSchedule, WebhookEndpoint, WebhookEvent
+
+logger = get_logger(__name__)
+
+# A leased batch of events
+Batch = namedtuple('Batch', ['batch_id', 'endpoint_id'])
+
+
+def enqueue_events(entries):
+    """Add the outbox events of ChangeLogEntry ``entries`` for their owners' active endpoints."""
+    endpoints = {}
+    for endpoint_id, owner_id in WebhookEndpoint.objects.filter(
+            owner_id__in={entry.owner_id for entry in entries}, active=True).values_list('id', 'owner_id'):
+        endpoints.setdefault(owner_id, []).append(endpoint_id)
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(endpoint_id=endpoint_id, schedule_id=entry.entity_id, operation=entry.operation)
+        for entry in entries for endpoint_id in endpoints.get(entry.owner_id, ())
+    ], batch_size=500)
+
+
+def claim_batches(limit):
+    """Lease up to ``limit`` batches of pending events, returning them as Batch tuples.
+
+    Endpoints that are waiting for a retry, or already have
+    ``max_concurrency`` batches in flight, are skipped, as are endpoints
+    another worker is claiming from.
+    """
+    now = datetime.now()
+    pending = Q(batch__isnull=True) | Q(leased_until__lt=now)
+    batches = []
+    with transaction.atomic():
+        endpoints = WebhookEndpoint.objects.select_for_update(skip_locked=True).filter(
+            Q(retry_at__isnull=True) | Q(retry_at__lte=now),
+            Exists(WebhookEvent.objects.filter(pending, endpoint_id=OuterRef('id'))),
+            active=True,
+        ).order_by('id').values_list('id', 'max_concurrency')
+        for endpoint_id, max_concurrency in endpoints:
+            events = WebhookEvent.objects.filter(endpoint_id=endpoint_id)
+            in_flight = events.filter(leased_until__gte=now).values('batch').distinct().count()
+            for _ in range(min(max_concurrency - in_flight, limit - len(batches))):
+                event_ids = list(events.filter(pending).order_by('id').values_list('id', flat=True)[
+                    :settings.WEBHOOK_BATCH_SIZE])
+                if not event_ids:
+                    break
+                batch_id = uuid.uuid4()
+                WebhookEvent.objects.filter(id__in=event_ids).update(
+                    batch=batch_id, leased_until=now + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS))
+                batches.append(Batch(batch_id, endpoint_id))
+            if len(batches) >= limit:
+                break
+    return batches
+
+
+def deliver_batch(batch_id):
+    """Send a leased batch, returning whether the endpoint accepted it.
+
+    Must not run inside a transaction, so no rows stay locked while the
+    endpoint answers.
+    """
+    events = list(WebhookEvent.objects.filter(batch=batch_id).select_related('endpoint').order_by('id'))
+    if not events:
+        # The lease ran out and the events were claimed again
+        return False
+    endpoint = events[0].endpoint
+    body = json.dumps(payload(endpoint, events), cls=DjangoJSONEncoder).encode()
+    try:
+        post(endpoint, body, batch_id)
+        delivered = True
+    except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as error:
+        # ValueError covers URLs urllib cannot send to; they fail like an unreachable endpoint
+        logger.warning("Webhook delivery of %s events to %s failed: %s", len(events), endpoint.url, error)
+        delivered = False
+
+    with transaction.atomic():
+        endpoint = WebhookEndpoint.objects.select_for_update().get(id=endpoint.id)
+        batch = WebhookEvent.objects.filter(batch=batch_id)
+        if delivered:
+            batch.delete()
+            endpoint.failures, endpoint.retry_at = 0, None
+        else:
+            batch.update(batch=None, leased_until=None)
+            endpoint.failures += 1
+            endpoint.retry_at = datetime.now() + retry_delay(endpoint.failures)
+            if endpoint.failures >= settings.WEBHOOK_MAX_FAILURES:
+                logger.warning("Deactivating webhook %s after %s failures", endpoint.url, endpoint.failures)
+                endpoint.active = False
+        endpoint.save(update_fields=['failures', 'retry_at', 'active'])
+    WEBHOOK_DELIVERIES.labels(result='delivered' if delivered else 'failed').inc()
+    WEBHOOK_BATCH_EVENTS.observe(len(events))
+    return delivered
+
+
+def payload(endpoint, events):
+    """Body of a batch: the current state of every changed row, once, and the ids of removed rows."""
+    schedule_ids = list(dict.fromkeys(event.schedule_id for event in events))
+    rows = CleaningSchedule.objects.filter(id__in=schedule_ids, booking__apartment__owner_id=endpoint.owner_id).values(
+        'id', 'booking_id', 'booking__apartment_id', 'cleaning_date', 'window_start', 'window_end', 'crew_id')
+    current = {row['id']: row for row in rows}
+    return {
+        'owner': endpoint.owner_id,
+        'changes': [
+            {
+                'id': row['id'],
+                'booking': row['booking_id'],
+                'apartment': row['booking__apartment_id'],
+                'cleaning_date': row['cleaning_date'],
+                'window_start': row['window_start'],
+                'window_end': row['window_end'],
+                'crew': row['crew_id'],
+            }
+            for row in (current[schedule_id] for schedule_id in schedule_ids if schedule_id in current)
+        ],
+        'removed': [schedule_id for schedule_id in schedule_ids if schedule_id not in current],
+    }
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_public_connection
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = create_public_connection
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, request):
+        return self.do_open(PublicHTTPConnection, request)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, request):
+        return self.do_open(PublicHTTPSConnection, request, context=ssl.create_default_context())
+
+
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        # The 3xx answer is raised as an HTTPError, and the delivery fails
+        return None
+
+
+# No proxies, so the checked address is the one connected to
+opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}), PublicHTTPHandler, PublicHTTPSHandler, NoRedirectHandler)
+
+
+def sign(secret, timestamp, body):
+    return hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+
+
+def post(endpoint, body, batch_id):
+    """POST a signed body, raising unless the answer is 2xx.
+
+    Raises ``urllib.error.URLError`` or ``OSError`` for unreachable endpoints
+    and error answers, ``http.client.HTTPException`` for malformed answers and
+    ``ValueError`` for invalid URLs, including ``addresses.UnsafeURLError``
+    for URLs that are not http(s) or reach a non-public address.
+    """
+    check_url(endpoint.url)
+    timestamp = str(int(time.time()))
+    request = urllib.request.Request(endpoint.url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'User-Agent': 'cleaning-scheduler-webhooks',
+        'X-Webhook-Id': str(batch_id),
+        'X-Webhook-Timestamp': timestamp,
+        'X-Webhook-Signature': f'sha256={sign(endpoint.secret, timestamp, body)}',
+    })
+    # Raises HTTPError for answers outside 2xx, as redirects are not followed
+    with opener.open(request, timeout=settings.WEBHOOK_TIMEOUT) as response:
+        response.read()
+
+
+def retry_delay(failures):
+    """Exponential backoff with jitter after ``failures`` failures in a row."""
+    delay = min(settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** (failures - 1), settings.WEBHOOK_RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
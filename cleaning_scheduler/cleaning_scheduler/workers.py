@@ -0,0 +1,53 @@
+"""
+Entry points for scheduler worker processes.
+
+Pools use the ``spawn`` start method so workers never share the parent's
+database connections. A spawned worker imports this module before Django is
+set up, so models are only imported inside the task functions.
+"""
+from collections import Counter
+
+import django
+
+
+def init_worker():
+    django.setup()
+
+
+def rebuild_owner(owner_id, date_min, date_max, dry_run, chunk_size, mode=None):
+    """Recompute one owner's schedule in its own transaction."""
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.db.models import Max, Min
+
+    from .models import Booking
+    from .utils import reschedule
+
+    owner = get_user_model().objects.get(id=owner_id)
+    if date_min is None or date_max is None:
+        span = Booking.objects.filter(apartment__owner=owner).aggregate(
+            first=Min('check_in_date'), last=Max('check_out_date'))
+        if span['first'] is None:
+            return Counter()
+        date_min = date_min or span['first']
+        date_max = date_max or span['last']
+
+    with transaction.atomic():
+        changes = reschedule(owner, date_min, date_max, apartment_chunk_size=chunk_size, mode=mode)
+        if dry_run:
+            transaction.set_rollback(True)
+    changes['owners'] = 1
+    return changes
+
+
+def run_queued(checkpoint_id):
+    """Run one RescheduleCheckpoint claimed from the queue."""
+    from .models import RescheduleCheckpoint
+    from .utils import run_checkpoint
+
+    checkpoint = RescheduleCheckpoint.objects.select_related('owner').filter(id=checkpoint_id).first()
+    if checkpoint is None:
+        return Counter()
+    changes = run_checkpoint(checkpoint)
+    changes['checkpoints'] = 1
+    return changes
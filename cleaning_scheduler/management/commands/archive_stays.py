@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cleaning_scheduler.cleaning_scheduler.archive import archivable, archive_stays
+
+# Rescheduling reads bookings this many days back
+MIN_HORIZON_DAYS = 31
+
+
+class Command(BaseCommand):
+    help = "Move stays whose cleaning window closed before the horizon into the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon-days', type=int, default=settings.ARCHIVE_HORIZON_DAYS,
+                            help="Stays whose cleaning window closed this many days ago are archived.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Stays moved per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the stays that would be archived.")
+
+    def handle(self, *args, **options):
+        if options['horizon_days'] < MIN_HORIZON_DAYS:
+            raise CommandError(f"--horizon-days must be at least {MIN_HORIZON_DAYS}")
+        cutoff = datetime.now() - timedelta(days=options['horizon_days'])
+        if options['dry_run']:
+            self.stdout.write(f"{archivable(cutoff).count()} stays before {cutoff:%Y-%m-%d} would be archived")
+            return
+        run = archive_stays(cutoff, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"archived {run.stays} stays before {cutoff:%Y-%m-%d}"))
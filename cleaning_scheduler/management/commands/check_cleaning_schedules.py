@@ -0,0 +1,50 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from cleaning_scheduler.cleaning_scheduler.consistency import check_apartments, repair
+from cleaning_scheduler.cleaning_scheduler.models import Apartment
+from cleaning_scheduler.cleaning_scheduler.utils import chunked
+
+
+class Command(BaseCommand):
+    help = "Verify CleaningSchedule windows against bookings and optionally repair them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', action='append', default=[], help="Only check this username (repeatable).")
+        parser.add_argument('--repair', action='store_true', help="Fix differences and reassign cleaning dates.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Apartments checked per chunk.")
+
+    def handle(self, *args, **options):
+        apartments = Apartment.objects.order_by('id')
+        if options['owner']:
+            apartments = apartments.filter(owner__username__in=options['owner'])
+        apartment_ids = apartments.values_list('id', flat=True).iterator(chunk_size=options['chunk_size'])
+
+        started = time.monotonic()
+        totals = Counter()
+        for chunk in chunked(apartment_ids, options['chunk_size']):
+            report = check_apartments(chunk)
+            totals += report.counts
+            if options['verbosity'] > 1 and report:
+                self.stdout.write(
+                    f"apartments {chunk[0]}-{chunk[-1]}: missing {sorted(report.missing)}, "
+                    f"mismatched {sorted(report.mismatched)}, duplicates {sorted(report.duplicates)}"
+                )
+            if options['repair'] and report:
+                totals['cleaning_dates_updated'] += repair(report)
+        elapsed = max(time.monotonic() - started, 1e-6)
+
+        self.stdout.write(
+            f"Checked {totals['apartments']} apartments and {totals['bookings']} bookings in {elapsed:.1f}s "
+            f"({totals['bookings'] / elapsed:.0f} bookings/s)"
+        )
+        summary = (
+            f"inconsistent apartments: {totals['inconsistent_apartments']}, missing rows: {totals['missing']}, "
+            f"mismatched windows: {totals['mismatched']}, duplicate rows: {totals['duplicates']}"
+        )
+        if options['repair']:
+            summary += f", cleaning dates updated: {totals['cleaning_dates_updated']} (repaired)"
+        style = self.style.SUCCESS if not totals['inconsistent_apartments'] or options['repair'] else self.style.WARNING
+        self.stdout.write(style(summary))
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cleaning_scheduler.cleaning_scheduler.changelog import compact_change_log
+
+
+class Command(BaseCommand):
+    help = "Drop superseded cleaning schedule change log entries and old removals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.CHANGE_LOG_RETENTION_DAYS,
+                            help="Days removals are kept; clients behind them get a full snapshot.")
+
+    def handle(self, *args, **options):
+        dropped = compact_change_log(timedelta(days=options['retention_days']))
+        self.stdout.write(self.style.SUCCESS(f"dropped {dropped} change log entries"))
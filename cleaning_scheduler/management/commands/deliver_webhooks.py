@@ -0,0 +1,78 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from cleaning_scheduler.cleaning_scheduler.log import get_logger
+from cleaning_scheduler.cleaning_scheduler.webhooks import claim_batches, deliver_batch
+
+logger = get_logger(__name__)
+
+
+def deliver_safely(batch_id):
+    """``deliver_batch``, counting an unexpected error as a failed delivery so other endpoints go on.
+
+    The batch's lease runs out and its events are claimed again.
+    """
+    try:
+        return deliver_batch(batch_id)
+    except Exception:
+        logger.exception("Webhook batch %s could not be delivered", batch_id)
+        return False
+
+
+def deliver_in_thread(batch_id):
+    try:
+        return deliver_safely(batch_id)
+    finally:
+        # Each worker thread has its own connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Send the webhook outbox in signed batches, within each endpoint's concurrency limit."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help="Batches delivered at the same time; 0 delivers them one by one in this thread.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds between looks at the outbox when nothing can be sent.")
+        parser.add_argument('--once', action='store_true', help="Exit once nothing can be sent instead of polling.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['workers'] == 0:
+            results = self.run_inline(options['poll_interval'], options['once'])
+        else:
+            results = self.run_pool(options['workers'], options['poll_interval'], options['once'])
+        self.stdout.write(self.style.SUCCESS(
+            f"delivered {results.count(True)} webhook batches, {results.count(False)} failed, "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
+
+    def run_inline(self, poll_interval, once):
+        results = []
+        while True:
+            batches = claim_batches(limit=1)
+            for batch in batches:
+                results.append(deliver_safely(batch.batch_id))
+            if not batches:
+                if once:
+                    return results
+                time.sleep(poll_interval)
+
+    def run_pool(self, workers, poll_interval, once):
+        results = []
+        pending = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                for batch in claim_batches(limit=workers - len(pending)):
+                    pending.add(executor.submit(deliver_in_thread, batch.batch_id))
+                if not pending:
+                    if once:
+                        return results
+                    time.sleep(poll_interval)
+                    continue
+                done, pending = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                results += [future.result() for future in done]
@@ -0,0 +1,89 @@
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from cleaning_scheduler.cleaning_scheduler.log import get_logger
+from cleaning_scheduler.cleaning_scheduler.metrics import RESCHEDULE_FAILURES
+from cleaning_scheduler.cleaning_scheduler.utils import claim_due_checkpoints
+from cleaning_scheduler.cleaning_scheduler.workers import init_worker, run_queued
+
+logger = get_logger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run queued reschedules once their quiet period is over, one owner per worker task."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help="Worker processes; 0 runs reschedules in this process.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds between looks at the queue when it has nothing due.")
+        parser.add_argument('--once', action='store_true', help="Exit once nothing is due instead of polling.")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+        if options['workers'] == 0:
+            totals = self.run_inline(options['poll_interval'], options['once'])
+        else:
+            totals = self.run_pool(options['workers'], options['poll_interval'], options['once'])
+        self.stdout.write(self.style.SUCCESS(
+            f"ran {totals['checkpoints']} queued reschedules, {totals['failed']} failed, "
+            f"in {time.monotonic() - started:.1f}s: "
+            f"windows created: {totals['windows_created']}, windows updated: {totals['windows_updated']}, "
+            f"cleaning dates updated: {totals['cleaning_dates_updated']}"
+        ))
+
+    def run_inline(self, poll_interval, once):
+        totals = Counter()
+        while True:
+            claimed = claim_due_checkpoints(limit=1)
+            for checkpoint_id, owner_id in claimed:
+                try:
+                    changes = run_queued(checkpoint_id)
+                except Exception:
+                    changes = self.failed(owner_id, checkpoint_id)
+                totals += self.report(owner_id, changes)
+            if not claimed:
+                if once:
+                    return totals
+                time.sleep(poll_interval)
+
+    def run_pool(self, workers, poll_interval, once):
+        totals = Counter()
+        # future -> (owner id, checkpoint id); an owner is never rescheduled by two tasks at a time
+        pending = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker) as executor:
+            while True:
+                claimed = claim_due_checkpoints(limit=workers - len(pending),
+                                                exclude_owners={owner_id for owner_id, _ in pending.values()})
+                for checkpoint_id, owner_id in claimed:
+                    pending[executor.submit(run_queued, checkpoint_id)] = (owner_id, checkpoint_id)
+                if not pending:
+                    if once:
+                        return totals
+                    time.sleep(poll_interval)
+                    continue
+                done, _ = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    owner_id, checkpoint_id = pending.pop(future)
+                    try:
+                        changes = future.result()
+                    except Exception:
+                        changes = self.failed(owner_id, checkpoint_id)
+                    totals += self.report(owner_id, changes)
+
+    def failed(self, owner_id, checkpoint_id):
+        # The claimed checkpoint stays in place for resume_rescheduling; other owners go on
+        logger.exception("Queued reschedule %s of owner %s failed", checkpoint_id, owner_id)
+        RESCHEDULE_FAILURES.inc()
+        return Counter(failed=1)
+
+    def report(self, owner_id, changes):
+        if self.verbosity > 1:
+            self.stdout.write(f"owner {owner_id}: {dict(changes)}")
+        return changes
@@ -0,0 +1,95 @@
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, time as dt_time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from cleaning_scheduler.cleaning_scheduler.utils import MODE_CAPACITY, MODE_CLUSTER, MODE_OVERLAP
+from cleaning_scheduler.cleaning_scheduler.workers import init_worker, rebuild_owner
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Recompute cleaning windows and dates for every owner, one owner per worker task."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', action='append', default=[], help="Only rebuild this username (repeatable).")
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD); defaults to each owner's first booking.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD); defaults to each owner's last booking.")
+        parser.add_argument('--dry-run', action='store_true', help="Compute and report changes, then roll back.")
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help="Worker processes; 0 rebuilds in this process.")
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Owners fetched and apartments rescheduled per chunk.")
+        parser.add_argument('--mode', choices=[MODE_OVERLAP, MODE_CAPACITY, MODE_CLUSTER],
+                            help="Cleaning date assignment mode; defaults to SCHEDULER_ASSIGNMENT_MODE.")
+
+    def parse_day(self, value, day_time):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        return datetime.combine(day, day_time)
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        date_min = self.parse_day(options['start'], dt_time.min)
+        date_max = self.parse_day(options['end'], dt_time.max)
+        if date_min and date_max and date_min > date_max:
+            raise CommandError("--start must not be after --end")
+
+        owners = User.objects.filter(apartments__isnull=False).distinct().order_by('id')
+        if options['owner']:
+            owners = owners.filter(username__in=options['owner'])
+        owner_ids = owners.values_list('id', flat=True).iterator(chunk_size=options['chunk_size'])
+        task_args = (date_min, date_max, options['dry_run'], options['chunk_size'], options['mode'])
+
+        started = time.monotonic()
+        totals = Counter()
+        if options['workers'] == 0:
+            for owner_id in owner_ids:
+                totals += self.report_owner(owner_id, rebuild_owner(owner_id, *task_args))
+        else:
+            totals = self.run_pool(owner_ids, task_args, options['workers'])
+        elapsed = max(time.monotonic() - started, 1e-6)
+
+        self.stdout.write(
+            f"{'Dry run: ' if options['dry_run'] else ''}"
+            f"rebuilt {totals['owners']} owners and {totals['bookings']} bookings in {elapsed:.1f}s "
+            f"({totals['owners'] / elapsed:.1f} owners/s, {totals['bookings'] / elapsed:.0f} bookings/s)"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"windows created: {totals['windows_created']}, windows updated: {totals['windows_updated']}, "
+            f"cleaning dates updated: {totals['cleaning_dates_updated']}"
+        ))
+
+    def run_pool(self, owner_ids, task_args, workers):
+        totals = Counter()
+        pending = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_worker) as executor:
+            for owner_id in owner_ids:
+                pending[executor.submit(rebuild_owner, owner_id, *task_args)] = owner_id
+                # Bound the number of queued tasks so memory stays flat for large portfolios
+                if len(pending) >= workers * 2:
+                    totals += self.collect(pending, FIRST_COMPLETED)
+            totals += self.collect(pending, ALL_COMPLETED)
+        return totals
+
+    def collect(self, pending, return_when):
+        totals = Counter()
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            totals += self.report_owner(pending.pop(future), future.result())
+        return totals
+
+    def report_owner(self, owner_id, changes):
+        if self.verbosity > 1:
+            self.stdout.write(f"owner {owner_id}: {dict(changes)}")
+        return changes
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from cleaning_scheduler.cleaning_scheduler.utils import resume_checkpoints
+
+
+class Command(BaseCommand):
+    help = "Finish reschedules that were interrupted before all their chunks committed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help="Only resume checkpoints without progress for this many seconds.")
+
+    def handle(self, *args, **options):
+        changes = resume_checkpoints(timedelta(seconds=options['stale_after']))
+        self.stdout.write(self.style.SUCCESS(
+            f"resumed {changes['checkpoints']} checkpoints: windows created: {changes['windows_created']}, "
+            f"windows updated: {changes['windows_updated']}, cleaning dates updated: {changes['cleaning_dates_updated']}"
+        ))
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.9 on 2026-10-19 15:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("cleaning_scheduler", "0008_alter_cleaningschedule_cleaning_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.CharField(max_length=2048)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                ("mode", models.CharField(choices=[("cprofile", "cProfile"), ("sample", "Sampling")], max_length=10)),
+                ("duration_ms", models.FloatField()),
+                ("query_count", models.PositiveIntegerField()),
+                ("query_time_ms", models.FloatField()),
+                ("sql_timeline", models.JSONField(default=list)),
+                ("summary", models.TextField(blank=True)),
+                ("data", models.BinaryField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created"],
+            },
+        ),
+    ]
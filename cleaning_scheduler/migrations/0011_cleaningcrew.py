@@ -0,0 +1,43 @@
+# Generated by Django 4.2.9 on 2026-10-19 15:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("cleaning_scheduler", "0010_reschedulecheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CleaningCrew",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255, verbose_name="Name of Crew")),
+                ("daily_capacity", models.PositiveSmallIntegerField(default=4, verbose_name="Cleanings per day")),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="crews", to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("name", "owner")},
+            },
+        ),
+        migrations.AddField(
+            model_name="cleaningschedule",
+            name="crew",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="cleanings",
+                to="cleaning_scheduler.cleaningcrew",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-19 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cleaning_scheduler", "0011_cleaningcrew"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reschedulecheckpoint",
+            name="mode",
+            field=models.CharField(blank=True, max_length=20),
+        ),
+    ]
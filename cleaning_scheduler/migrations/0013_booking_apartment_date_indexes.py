@@ -0,0 +1,20 @@
+# Generated by Django 4.2.9 on 2026-10-19 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cleaning_scheduler", "0012_reschedulecheckpoint_mode"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["apartment", "check_in_date"], name="cleaning_sc_apartme_b32875_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["apartment", "check_out_date"], name="cleaning_sc_apartme_b23744_idx"),
+        ),
+    ]
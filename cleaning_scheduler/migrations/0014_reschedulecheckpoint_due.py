@@ -0,0 +1,25 @@
+# Generated by Django 4.2.9 on 2026-10-19 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cleaning_scheduler", "0013_booking_apartment_date_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reschedulecheckpoint",
+            name="due",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="reschedulecheckpoint",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("due__isnull", False)),
+                fields=("owner", "mode"),
+                name="one_queued_checkpoint_per_owner",
+            ),
+        ),
+    ]
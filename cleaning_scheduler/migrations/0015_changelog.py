@@ -0,0 +1,57 @@
+# Generated by Django 4.2.9 on 2026-10-19 16:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("cleaning_scheduler", "0014_reschedulecheckpoint_due"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLogCompaction",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("compacted_through", models.BigIntegerField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ChangeLogEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("entity", models.CharField(choices=[("cleaning", "Cleaning")], default="cleaning", max_length=20)),
+                ("entity_id", models.BigIntegerField()),
+                (
+                    "operation",
+                    models.CharField(
+                        choices=[("insert", "Insert"), ("update", "Update"), ("delete", "Delete")], max_length=10
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(fields=["owner", "id"], name="cleaning_sc_owner_i_2fa734_idx"),
+                    models.Index(fields=["owner", "entity", "entity_id"], name="cleaning_sc_owner_i_f2e570_idx"),
+                ],
+            },
+        ),
+    ]
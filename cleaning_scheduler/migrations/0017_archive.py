@@ -0,0 +1,52 @@
+# Generated by Django 4.2.9 on 2026-10-19 16:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cleaning_scheduler", "0016_webhooks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchiveRun",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("cutoff", models.DateTimeField()),
+                ("stays", models.PositiveIntegerField(default=0)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["-cutoff"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedStay",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("guest_name", models.CharField(max_length=100)),
+                ("check_in_date", models.DateTimeField()),
+                ("check_out_date", models.DateTimeField()),
+                ("cleaning_date", models.DateTimeField(blank=True, null=True)),
+                ("window_start", models.DateTimeField(blank=True, null=True)),
+                ("window_end", models.DateTimeField(blank=True, null=True)),
+                ("crew_id", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "apartment",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cleaning_scheduler.apartment",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["apartment", "check_in_date"], name="cleaning_sc_apartme_9d2d21_idx")
+                ],
+            },
+        ),
+    ]
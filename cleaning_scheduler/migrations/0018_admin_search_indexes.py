@@ -0,0 +1,40 @@
+# Generated by Django 4.2.9 on 2026-10-19 16:21
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cleaning_scheduler", "0017_archive"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="apartment",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("name"), name="text_pattern_ops"
+                ),
+                name="apartment_name_prefix_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["check_in_date"], name="cleaning_sc_check_i_18b76d_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("guest_name"), name="text_pattern_ops"
+                ),
+                name="booking_guest_name_prefix_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cleaningschedule",
+            index=models.Index(fields=["cleaning_date"], name="cleaning_sc_cleanin_28875b_idx"),
+        ),
+    ]
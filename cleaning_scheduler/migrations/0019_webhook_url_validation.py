@@ -0,0 +1,22 @@
+# Generated by Django 4.2.9 on 2026-10-19 16:37
+
+import cleaning_scheduler.cleaning_scheduler.addresses
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cleaning_scheduler", "0018_admin_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="webhookendpoint",
+            name="url",
+            field=models.URLField(
+                max_length=500,
+                validators=[cleaning_scheduler.cleaning_scheduler.addresses.validate_public_url],
+                verbose_name="URL",
+            ),
+        ),
+    ]
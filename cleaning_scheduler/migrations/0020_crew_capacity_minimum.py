@@ -0,0 +1,20 @@
+# Generated by Django 4.2.9 on 2026-10-19 16:49
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cleaning_scheduler", "0019_webhook_url_validation"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cleaningcrew",
+            name="daily_capacity",
+            field=models.PositiveSmallIntegerField(
+                default=4, validators=[django.core.validators.MinValueValidator(1)], verbose_name="Cleanings per day"
+            ),
+        ),
+    ]
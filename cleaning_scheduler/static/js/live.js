@@ -0,0 +1,72 @@
+/* Live updates of the calendar pages.
+ *
+ * Listens to the user's change stream and, on each change, fetches the shown
+ * month as JSON and rewrites only the cells whose content differs. The page
+ * is reloaded when its layout changes (new apartment columns or schedule rows).
+ */
+(() => {
+  const root = document.querySelector('[data-live-stream]');
+  if (!root || !window.EventSource) {
+    return;
+  }
+
+  const texts = (cell, selector) => Array.from(cell.querySelectorAll(selector), (node) => node.textContent.trim());
+  const same = (first, second) => first.length === second.length && first.every((value, i) => value === second[i]);
+
+  function patchCalendar(data) {
+    root.querySelectorAll('td[data-day]').forEach((cell) => {
+      const apartments = data.days[cell.dataset.day] || [];
+      if (same(texts(cell, '.apartment'), apartments)) {
+        return;
+      }
+      cell.querySelectorAll('.apartment').forEach((node) => node.remove());
+      apartments.forEach((name) => {
+        const node = document.createElement('div');
+        node.className = name.includes('*Cleaning Needed*') ? 'apartment cleaning-needed' : 'apartment';
+        node.textContent = name;
+        cell.appendChild(node);
+      });
+    });
+  }
+
+  function patchSchedule(data) {
+    const rows = root.querySelectorAll('tr[data-day]');
+    const days = Object.keys(data.schedule);
+    if (!same(texts(root, 'thead th').slice(1), data.apartments) || !same(Array.from(rows, (row) => row.dataset.day), days)) {
+      window.location.reload();
+      return;
+    }
+    rows.forEach((row) => {
+      const statuses = data.schedule[row.dataset.day];
+      Array.from(row.cells).slice(1).forEach((cell, i) => {
+        const status = statuses[i] || '-';
+        if (cell.textContent.trim() !== status) {
+          cell.textContent = status;
+        }
+      });
+    });
+  }
+
+  async function refresh() {
+    const params = new URLSearchParams(window.location.search);
+    params.set('format', 'json');
+    const response = await fetch(`${window.location.pathname}?${params}`, { credentials: 'same-origin' });
+    if (!response.ok) {
+      return;
+    }
+    const data = await response.json();
+    if (root.dataset.liveKind === 'calendar') {
+      patchCalendar(data);
+    } else {
+      patchSchedule(data);
+    }
+  }
+
+  let timer = null;
+  const source = new EventSource(root.dataset.liveStream);
+  source.addEventListener('change', () => {
+    // Changes arriving close together are fetched once
+    clearTimeout(timer);
+    timer = setTimeout(refresh, 300);
+  });
+})();
@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration.
+
+Live update streams stay open for up to ``LIVE_STREAM_SECONDS``, see
+``cleaning_scheduler.live``. With the default single sync worker every
+stream would hold the whole server and be killed by the 30 second worker
+timeout, so requests are served by threaded workers: a stream holds one
+thread, and the worker keeps signalling the arbiter while it runs. The
+timeout is still kept above the stream length, so a stream ending on time
+never looks like a hung worker.
+
+prometheus_client multiprocess mode needs a hook to drop the files of worker
+processes that exit, see
+https://prometheus.github.io/client_python/multiprocess/
+"""
+import os
+
+from prometheus_client import multiprocess
+
+LIVE_STREAM_SECONDS = int(os.environ.get('LIVE_STREAM_SECONDS', 300))
+
+# Worker processes still default to WEB_CONCURRENCY, or 1
+worker_class = 'gthread'
+# Requests, open streams included, served at the same time by each worker
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', LIVE_STREAM_SECONDS + 60))
+# Streams still open when a worker restarts are cut after this; their browsers reconnect
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
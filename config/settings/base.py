@@ -49,6 +49,10 @@ APPEND_SLASH = False
 # https://docs.djangoproject.com/en/dev/ref/settings/#databases
 DATABASES = {"default": env.db("DATABASE_URL")}
 DATABASES["default"]["ATOMIC_REQUESTS"] = True
+# Read replicas, used by views decorated with read_from_replica.
+for index, replica_url in enumerate(env.list("DATABASE_REPLICA_URLS", default=[])):
+    DATABASES[f"replica_{index}"] = env.db_url_config(replica_url)
+DATABASE_ROUTERS = ["cleaning_scheduler.cleaning_scheduler.routers.ReplicaRouter"]
 # https://docs.djangoproject.com/en/stable/ref/settings/#std:setting-DEFAULT_AUTO_FIELD
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -68,6 +72,7 @@ DJANGO_APPS = [
     "django.contrib.sites",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # "django.contrib.humanize", # Handy template tags
     "django.contrib.admin",
     "django.forms",
@@ -133,6 +138,7 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "cleaning_scheduler.cleaning_scheduler.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -141,6 +147,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "cleaning_scheduler.cleaning_scheduler.middleware.RequestProfilerMiddleware",
+    "cleaning_scheduler.cleaning_scheduler.middleware.ReplicaPinMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
@@ -306,3 +314,73 @@ SPECTACULAR_SETTINGS = {
     "VERSION": "1.0.0",
     "SERVE_PERMISSIONS": ["rest_framework.permissions.IsAdminUser"],
 }
+
+# cleaning_scheduler
+# ------------------------------------------------------------------------------
+# Staff requests carrying this header (X-Profile-Request) or query flag are profiled
+# by RequestProfilerMiddleware. Use the value "sample" for the sampling profiler.
+REQUEST_PROFILER_HEADER = "HTTP_X_PROFILE_REQUEST"
+REQUEST_PROFILER_QUERY_PARAM = "_profile"
+# Seconds between stack samples when the sampling profiler is used.
+REQUEST_PROFILER_SAMPLE_INTERVAL = env.float("REQUEST_PROFILER_SAMPLE_INTERVAL", default=0.005)
+# Fraction of per-booking DEBUG records emitted by the scheduler and calendar views.
+SCHEDULER_LOG_SAMPLE_RATE = env.float("SCHEDULER_LOG_SAMPLE_RATE", default=1.0)
+# Apartments whose cleaning windows are recalculated per transaction after an upload.
+SCHEDULER_APARTMENT_CHUNK_SIZE = env.int("SCHEDULER_APARTMENT_CHUNK_SIZE", default=50)
+# Seconds a user reads from the primary database after a write, covering replication lag.
+SCHEDULER_REPLICA_PIN_SECONDS = env.int("SCHEDULER_REPLICA_PIN_SECONDS", default=10)
+# Seconds an owner's apartment directory stays in the shared cache and in each process.
+APARTMENT_DIRECTORY_CACHE_TIMEOUT = env.int("APARTMENT_DIRECTORY_CACHE_TIMEOUT", default=3600)
+APARTMENT_DIRECTORY_LOCAL_TTL = env.float("APARTMENT_DIRECTORY_LOCAL_TTL", default=5.0)
+# Owners kept in each process' directory LRU.
+APARTMENT_DIRECTORY_LOCAL_SIZE = env.int("APARTMENT_DIRECTORY_LOCAL_SIZE", default=1024)
+# How cleaning dates are assigned: "overlap" cleans overlapping windows together,
+# "capacity" spreads cleanings within the daily capacity of each owner's crews and
+# "cluster" picks the fewest cleaning days that hit every window.
+SCHEDULER_ASSIGNMENT_MODE = env("SCHEDULER_ASSIGNMENT_MODE", default="overlap")
+# Queue rescheduling after imports and run it once no import of the owner arrived for this
+# many seconds, merging the requests in between; 0 reschedules right after each import.
+SCHEDULER_DEBOUNCE_SECONDS = env.float("SCHEDULER_DEBOUNCE_SECONDS", default=0)
+# Run a queued reschedule at most this many seconds after its first request, even if imports keep arriving.
+SCHEDULER_MAX_DELAY_SECONDS = env.float("SCHEDULER_MAX_DELAY_SECONDS", default=60)
+# Implementation of the scheduler's windows and overlap stages: "python" or "numpy",
+# which is faster for large portfolios and gives the same results.
+SCHEDULER_BACKEND = env("SCHEDULER_BACKEND", default="python")
+# Cluster cleaning days separately for each apartment location.
+SCHEDULER_CLUSTER_BY_LOCATION = env.bool("SCHEDULER_CLUSTER_BY_LOCATION", default=False)
+# Days ahead covered by the availability search, and how long occupancy bitsets are cached.
+AVAILABILITY_HORIZON_DAYS = env.int("AVAILABILITY_HORIZON_DAYS", default=730)
+AVAILABILITY_CACHE_TIMEOUT = env.int("AVAILABILITY_CACHE_TIMEOUT", default=86400)
+# Bearer token accepted by the Prometheus /metrics endpoint in addition to staff sessions.
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+# Change log entries returned per delta sync request, and days removals stay in the log
+# before compact_change_log drops them and clients behind them get a full snapshot.
+CHANGE_LOG_PAGE_SIZE = env.int("CHANGE_LOG_PAGE_SIZE", default=1000)
+CHANGE_LOG_RETENTION_DAYS = env.int("CHANGE_LOG_RETENTION_DAYS", default=30)
+# Outbox events sent per webhook request, seconds a worker may take to deliver a batch
+# before its events are sent again, and the timeout of each request.
+WEBHOOK_BATCH_SIZE = env.int("WEBHOOK_BATCH_SIZE", default=500)
+WEBHOOK_LEASE_SECONDS = env.int("WEBHOOK_LEASE_SECONDS", default=60)
+WEBHOOK_TIMEOUT = env.float("WEBHOOK_TIMEOUT", default=10)
+# Backoff after failed webhook deliveries: doubled from the base up to the maximum, in seconds.
+# Endpoints are deactivated after this many failures in a row.
+WEBHOOK_RETRY_BASE_SECONDS = env.float("WEBHOOK_RETRY_BASE_SECONDS", default=10)
+WEBHOOK_RETRY_MAX_SECONDS = env.float("WEBHOOK_RETRY_MAX_SECONDS", default=3600)
+WEBHOOK_MAX_FAILURES = env.int("WEBHOOK_MAX_FAILURES", default=20)
+# Let webhooks reach loopback and private network hosts, for receivers on a development machine.
+WEBHOOK_ALLOW_PRIVATE_HOSTS = env.bool("WEBHOOK_ALLOW_PRIVATE_HOSTS", default=False)
+# Redis carrying live calendar updates between web processes; without it updates only
+# reach pages streaming from the process that made the change.
+LIVE_UPDATES_REDIS_URL = env("REDIS_URL", default="")
+# Seconds a live update stream stays open before the browser reconnects, and between keep-alives.
+LIVE_STREAM_SECONDS = env.int("LIVE_STREAM_SECONDS", default=300)
+LIVE_HEARTBEAT_SECONDS = env.int("LIVE_HEARTBEAT_SECONDS", default=15)
+# Days after which closed stays are moved out of the booking and cleaning schedule tables by archive_stays.
+ARCHIVE_HORIZON_DAYS = env.int("ARCHIVE_HORIZON_DAYS", default=365)
+# Most apartments accepted by one batch import request.
+APARTMENT_BATCH_MAX_ROWS = env.int("APARTMENT_BATCH_MAX_ROWS", default=5000)
+# Seconds a portfolio dashboard stays cached at most; any change to the owner's data refreshes it sooner.
+DASHBOARD_CACHE_TIMEOUT = env.int("DASHBOARD_CACHE_TIMEOUT", default=3600)
+# Longest date range of an analytics report, and seconds a report stays cached at most.
+ANALYTICS_MAX_DAYS = env.int("ANALYTICS_MAX_DAYS", default=731)
+ANALYTICS_CACHE_TIMEOUT = env.int("ANALYTICS_CACHE_TIMEOUT", default=3600)
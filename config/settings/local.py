@@ -13,12 +13,18 @@ SECRET_KEY = env(
 # https://docs.djangoproject.com/en/dev/ref/settings/#allowed-hosts
 ALLOWED_HOSTS = ["localhost", "0.0.0.0", "127.0.0.1"]
 
+# DATABASES
+# ------------------------------------------------------------------------------
+# A second alias on the same database, to try the read-replica routing locally.
+if env.bool("DJANGO_LOCAL_REPLICA", default=False):
+    DATABASES["replica"] = {**DATABASES["default"], "ATOMIC_REQUESTS": False}  # noqa: F405
+
 # CACHES
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#caches
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "BACKEND": "cleaning_scheduler.cleaning_scheduler.cache.InstrumentedLocMemCache",
         "LOCATION": "",
     }
 }
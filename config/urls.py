@@ -6,6 +6,7 @@ from django.views import defaults as default_views
 from django.views.generic import TemplateView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework.authtoken.views import obtain_auth_token
+from cleaning_scheduler.cleaning_scheduler.metrics import metrics_view
 from cleaning_scheduler.cleaning_scheduler.views import root
 
 urlpatterns = [
@@ -17,6 +18,7 @@ urlpatterns = [
     path("users/", include("cleaning_scheduler.users.urls", namespace="users")),
     path("scheduler/", include("cleaning_scheduler.cleaning_scheduler.urls", namespace="scheduler")),
     path("accounts/", include("allauth.urls")),
+    path("metrics", metrics_view, name="metrics"),
     # Your stuff: custom urls includes go here
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
@@ -0,0 +1,291 @@
+"""
+Asyncio load generator for the cleaning scheduler web app.
+
+Runs scripted host journeys (log in, browse calendar months, hit the
+``/api/calendar/*`` endpoints, upload ICS feeds) against a running instance,
+e.g. ``runserver`` or the local compose stack, and reports throughput and
+p50/p95/p99 latency per endpoint. Only the standard library is used so the
+script can run from any machine that can reach the app::
+
+    python load_test.py --base-url http://localhost:8000 \\
+        --account host:secret --users 20 --duration 60 --apartment "Apartment 1"
+"""
+import argparse
+import asyncio
+import random
+import re
+import ssl
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+LOGIN_PATH = "/accounts/login/"
+CALENDAR_PATH = "/scheduler/calendar/"
+CLEANING_SCHEDULE_PATH = "/scheduler/cleaning-schedule/"
+API_BOOKINGS_PATH = "/api/calendar/bookings/"
+API_CLEANING_PATH = "/api/calendar/cleaning/"
+
+CSRF_INPUT_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+# Relative weight of each journey step once a virtual user is logged in.
+DEFAULT_WEIGHTS = {
+    "calendar": 4,
+    "cleaning-schedule": 3,
+    "api:bookings": 2,
+    "api:cleaning": 2,
+    "api:upload": 1,
+}
+
+
+@dataclass
+class Response:
+    status: int
+    headers: dict[str, list[str]]
+    body: bytes
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty sequence)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def build_ics(prodid: str, stays: Sequence[tuple[date, date, str]]) -> bytes:
+    """Render a minimal VCALENDAR with one VEVENT per ``(check_in, check_out, guest)``."""
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{prodid}"]
+    for check_in, check_out, guest in stays:
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{uuid.uuid4()}",
+            f"DTSTART;VALUE=DATE:{check_in:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{check_out:%Y%m%d}",
+            f"SUMMARY:{guest}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode()
+
+
+def encode_multipart(field_name: str, filename: str, content: bytes) -> tuple[str, bytes]:
+    """Encode a single file upload as ``multipart/form-data``."""
+    boundary = uuid.uuid4().hex
+    body = b"".join(
+        [
+            f"--{boundary}\r\n".encode(),
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'.encode(),
+            b"Content-Type: text/calendar\r\n\r\n",
+            content,
+            f"\r\n--{boundary}--\r\n".encode(),
+        ]
+    )
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+def decode_chunked(payload: bytes) -> bytes:
+    body = bytearray()
+    while payload:
+        size_line, _, payload = payload.partition(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            break
+        body += payload[:size]
+        payload = payload[size + 2 :]
+    return bytes(body)
+
+
+class HttpClient:
+    """Tiny HTTP/1.1 client with a cookie jar, one connection per request."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.secure = parts.scheme == "https"
+        self.port = parts.port or (443 if self.secure else 80)
+        self.origin = f"{parts.scheme}://{parts.netloc}"
+        self.timeout = timeout
+        self.cookies: dict[str, str] = {}
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers: dict[str, str] | None = None):
+        ssl_context = ssl.create_default_context() if self.secure else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context), self.timeout
+        )
+        try:
+            request_headers = {
+                "Host": self.host if self.port in (80, 443) else f"{self.host}:{self.port}",
+                "User-Agent": "cleaning-scheduler-load-test",
+                "Accept": "*/*",
+                "Connection": "close",
+                "Content-Length": str(len(body)),
+            }
+            if self.cookies:
+                request_headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+            request_headers.update(headers or {})
+            head = f"{method} {path} HTTP/1.1\r\n"
+            head += "".join(f"{k}: {v}\r\n" for k, v in request_headers.items())
+            writer.write(head.encode() + b"\r\n" + body)
+            await writer.drain()
+            raw = await asyncio.wait_for(reader.read(), self.timeout)
+        finally:
+            writer.close()
+        return self._parse(raw)
+
+    def _parse(self, raw: bytes) -> Response:
+        head, _, payload = raw.partition(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        headers: dict[str, list[str]] = defaultdict(list)
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()].append(value.strip())
+        for set_cookie in headers.get("set-cookie", []):
+            cookie = SimpleCookie()
+            cookie.load(set_cookie)
+            for name, morsel in cookie.items():
+                self.cookies[name] = morsel.value
+        if "chunked" in ",".join(headers.get("transfer-encoding", [])).lower():
+            payload = decode_chunked(payload)
+        return Response(status=int(status_line.split()[1]), headers=headers, body=payload)
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.stats: dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.deadline = 0.0
+        self.weights = DEFAULT_WEIGHTS if args.apartment else {**DEFAULT_WEIGHTS, "api:upload": 0}
+
+    async def timed(self, label: str, client: HttpClient, method: str, path: str, **kwargs) -> Response | None:
+        stats = self.stats[label]
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+            stats.errors += 1
+            return None
+        stats.latencies.append(time.perf_counter() - started)
+        stats.statuses[response.status] += 1
+        if response.status >= 500:
+            stats.errors += 1
+        return response
+
+    def csrf_headers(self, client: HttpClient) -> dict[str, str]:
+        return {"X-CSRFToken": client.cookies.get("csrftoken", ""), "Referer": client.origin + "/"}
+
+    async def login(self, client: HttpClient, username: str, password: str) -> bool:
+        page = await self.timed("login", client, "GET", LOGIN_PATH)
+        if page is None:
+            return False
+        match = CSRF_INPUT_RE.search(page.body)
+        form = {"login": username, "password": password}
+        if match:
+            form["csrfmiddlewaretoken"] = match.group(1).decode()
+        response = await self.timed(
+            "login",
+            client,
+            "POST",
+            LOGIN_PATH,
+            body=urlencode(form).encode(),
+            headers={"Content-Type": "application/x-www-form-urlencoded", "Referer": client.origin + LOGIN_PATH},
+        )
+        return response is not None and response.status == 302 and "sessionid" in client.cookies
+
+    def random_month(self) -> tuple[int, int]:
+        today = date.today()
+        offset = random.randint(-self.args.months, self.args.months)
+        month_index = today.year * 12 + today.month - 1 + offset
+        return month_index // 12, month_index % 12 + 1
+
+    async def step(self, client: HttpClient, action: str) -> None:
+        year, month = self.random_month()
+        if action in ("calendar", "cleaning-schedule"):
+            path = CALENDAR_PATH if action == "calendar" else CLEANING_SCHEDULE_PATH
+            await self.timed(action, client, "GET", f"{path}?{urlencode({'year': year, 'month': month})}")
+        elif action in ("api:bookings", "api:cleaning"):
+            start = date(year, month, 1)
+            end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            path = API_BOOKINGS_PATH if action == "api:bookings" else API_CLEANING_PATH
+            query = urlencode({"start_date": start.isoformat(), "end_date": end.isoformat()})
+            await self.timed(action, client, "GET", f"{path}?{query}")
+        elif action == "api:upload":
+            # Random far-future stays keep overlap rejections rare on repeated runs.
+            check_in = date.today() + timedelta(days=random.randint(365, 365 * 20))
+            stay = (check_in, check_in + timedelta(days=random.randint(1, 7)), f"Load test {uuid.uuid4().hex[:8]}")
+            content_type, body = encode_multipart(
+                "ics_file", "load-test.ics", build_ics(random.choice(self.args.apartment), [stay])
+            )
+            headers = {"Content-Type": content_type, **self.csrf_headers(client)}
+            await self.timed(action, client, "POST", API_BOOKINGS_PATH, body=body, headers=headers)
+
+    async def virtual_user(self, number: int) -> None:
+        username, _, password = self.args.account[number % len(self.args.account)].partition(":")
+        client = HttpClient(self.args.base_url, timeout=self.args.timeout)
+        if not await self.login(client, username, password):
+            return
+        actions, weights = zip(*self.weights.items())
+        while time.monotonic() < self.deadline:
+            await self.step(client, random.choices(actions, weights)[0])
+            if self.args.think_time:
+                await asyncio.sleep(random.uniform(0, self.args.think_time))
+
+    async def run(self) -> float:
+        started = time.monotonic()
+        self.deadline = started + self.args.duration
+        users = []
+        for number in range(self.args.users):
+            users.append(asyncio.create_task(self.virtual_user(number)))
+            await asyncio.sleep(self.args.ramp_up / max(self.args.users, 1))
+        await asyncio.gather(*users)
+        return time.monotonic() - started
+
+    def report(self, elapsed: float) -> str:
+        header = f"{'endpoint':<20}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        lines = [header, "-" * len(header)]
+        total = 0
+        for label, stats in sorted(self.stats.items()):
+            count = len(stats.latencies)
+            total += count
+            p50, p95, p99 = (percentile(stats.latencies, pct) * 1000 for pct in (50, 95, 99))
+            lines.append(
+                f"{label:<20}{count:>9}{stats.errors:>8}{count / elapsed:>9.1f}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}"
+            )
+        lines.append("-" * len(header))
+        lines.append(f"{'total':<20}{total:>9}{'':>8}{total / elapsed:>9.1f}   over {elapsed:.1f}s")
+        return "\n".join(lines)
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument(
+        "--account", action="append", required=True, help="USERNAME:PASSWORD, repeat to spread virtual users"
+    )
+    parser.add_argument(
+        "--apartment", action="append", default=[], help="apartment name used as PRODID for ICS uploads"
+    )
+    parser.add_argument("--users", type=int, default=10, help="number of concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run after ramp-up starts")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which users are started")
+    parser.add_argument("--months", type=int, default=6, help="browse this many months around today")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between steps")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    load_test = LoadTest(parse_args())
+    print(load_test.report(asyncio.run(load_test.run())))
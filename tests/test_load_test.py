@@ -0,0 +1,46 @@
+from datetime import date
+
+import pytest
+from icalendar import Calendar
+
+from load_test import build_ics, decode_chunked, encode_multipart, percentile
+
+
+@pytest.mark.parametrize(
+    ("values", "pct", "expected"),
+    [
+        ([], 50, 0.0),
+        ([3.0], 99, 3.0),
+        ([4.0, 1.0, 3.0, 2.0], 50, 2.0),
+        ([float(n) for n in range(1, 101)], 95, 95.0),
+        ([float(n) for n in range(1, 101)], 99, 99.0),
+    ],
+)
+def test_percentile(values: list[float], pct: float, expected: float):
+    assert percentile(values, pct) == expected
+
+
+def test_build_ics_is_importable():
+    content = build_ics("Apartment 1", [(date(2030, 1, 1), date(2030, 1, 4), "Jane")])
+
+    cal = Calendar.from_ical(content)
+    events = [component for component in cal.walk() if component.name == "VEVENT"]
+
+    assert cal.get("prodid") == "Apartment 1"
+    assert len(events) == 1
+    assert events[0].get("dtstart").dt == date(2030, 1, 1)
+    assert events[0].get("dtend").dt == date(2030, 1, 4)
+    assert events[0].get("summary") == "Jane"
+
+
+def test_encode_multipart():
+    content_type, body = encode_multipart("ics_file", "feed.ics", b"BEGIN:VCALENDAR")
+    boundary = content_type.split("boundary=")[1]
+
+    assert body.startswith(f"--{boundary}\r\n".encode())
+    assert b'name="ics_file"; filename="feed.ics"' in body
+    assert body.endswith(f"--{boundary}--\r\n".encode())
+
+
+def test_decode_chunked():
+    assert decode_chunked(b"4\r\nWiki\r\n5;ext=1\r\npedia\r\n0\r\n\r\n") == b"Wikipedia"